@@ -0,0 +1,75 @@
+# coding: utf-8
+
+import time
+import statistics
+
+try:
+    from orderbook.core import OrderBook
+    from orderbook.structure import Order
+except ImportError:
+    import sys
+    import os
+
+    CURRENT_DIR = os.path.dirname(sys.argv[0])
+
+    sys.path.append(os.path.join(CURRENT_DIR, "../"))
+
+    from orderbook.core import OrderBook
+    from orderbook.structure import Order
+
+
+TICK_PRICE = 0.5
+BASE_PRICE = 10000.0
+
+
+def make_book(depth, orders_per_level=1):
+    book = OrderBook(symbol="XBTUSD", tick_price=TICK_PRICE)
+
+    orders = [Order(orderID="{}-{}".format(level, idx),
+                    price=BASE_PRICE + level * TICK_PRICE,
+                    orderQty=-(idx + 1))
+              for level in range(1, depth + 1)
+              for idx in range(orders_per_level)]
+
+    book.sell_mbl.add_orders(orders)
+
+    return book
+
+
+def pop_one_by_one(book, price):
+    mbl = book.sell_mbl
+    levels = list()
+
+    while mbl.depth and mbl.best_price <= price:
+        levels.append(mbl.pop_level())
+
+    return levels
+
+
+def pop_through(book, price):
+    return book.sell_mbl.pop_levels_through(price)
+
+
+if __name__ == "__main__":
+    rounds = 20
+
+    for depth in (1000, 5000, 20000):
+        cross_price = BASE_PRICE + depth * TICK_PRICE
+
+        for name, func in (("pop_level loop", pop_one_by_one),
+                           ("pop_levels_through", pop_through)):
+            spans = list()
+
+            for _ in range(rounds):
+                book = make_book(depth)
+
+                start = time.perf_counter()
+                levels = func(book, cross_price)
+                spans.append(time.perf_counter() - start)
+
+                assert len(levels) == depth
+
+            print("{:>6d} levels {:<20s} median[{:>9.3f} ms] "
+                  "rate[{:>12.2f} levels/sec]".format(
+                    depth, name, statistics.median(spans) * 1000,
+                    depth / statistics.median(spans)))
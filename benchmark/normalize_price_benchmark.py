@@ -0,0 +1,104 @@
+# coding: utf-8
+
+import time
+import random
+
+from decimal import Decimal, Context
+
+try:
+    from orderbook.utils import PriceNormalizer, normalize_price
+except ImportError:
+    import sys
+    import os
+
+    CURRENT_DIR = os.path.dirname(sys.argv[0])
+
+    sys.path.append(os.path.join(CURRENT_DIR, "../"))
+
+    from orderbook.utils import PriceNormalizer, normalize_price
+
+
+def legacy_normalize_price(price: float, tick_price: float) -> float:
+    """
+    normalize_price implementation before PriceNormalizer, kept as baseline
+    """
+    decimal_origin = Decimal(price)
+
+    decimal_tick = Decimal(tick_price)
+
+    int_len = len("{:f}".format(price).split(".")[0])
+
+    prec_str = str(tick_price).rstrip("0")
+    if "." in prec_str:
+        prec_len = len(prec_str.split(".")[-1])
+    else:
+        prec_len = abs(int(prec_str.split("e")[-1]))
+
+    ticks = round(decimal_origin / decimal_tick)
+
+    normalized = ticks * Decimal(tick_price)
+
+    converted = float(normalized.normalize(Context(prec=int_len+prec_len)))
+
+    "normalize price: origin[{}], tick_price[{}], normalized[{}].".format(
+        price, tick_price, converted)
+
+    return converted
+
+
+def price_stream(count, base_price, tick_price, spread_ticks):
+    """
+    Random walk prices around base price, with sub-tick noise
+    """
+    prices = list()
+    price = base_price
+
+    for _ in range(count):
+        price += random.randint(-2, 2) * tick_price
+
+        if abs(price - base_price) > spread_ticks * tick_price:
+            price = base_price
+
+        prices.append(price + random.choice((0, 0, 0, tick_price / 3)))
+
+    return prices
+
+
+def measure(name, func, prices, rounds):
+    rates = list()
+
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for p in prices:
+            func(p)
+        rates.append(len(prices) / (time.perf_counter() - start))
+
+    print("{:<36s} best[{:>12.2f}] calls/sec".format(name, max(rates)))
+
+    return max(rates)
+
+
+if __name__ == "__main__":
+    tick = 0.5
+    count = 100000
+
+    stream = price_stream(count, 10000.0, tick, 500)
+
+    print("{} prices, {} distinct, tick_price[{}]".format(
+        count, len(set(stream)), tick))
+
+    before = measure("legacy normalize_price",
+                     lambda p: legacy_normalize_price(p, tick), stream, 3)
+
+    measure("PriceNormalizer(cache_size=0)",
+            PriceNormalizer(tick, cache_size=0).normalize, stream, 3)
+
+    measure("normalize_price", lambda p: normalize_price(p, tick), stream, 3)
+
+    after = measure("PriceNormalizer.normalize",
+                    PriceNormalizer(tick).normalize, stream, 3)
+
+    measure("PriceNormalizer.ticks",
+            PriceNormalizer(tick).ticks, stream, 3)
+
+    print("speed up: {:.1f}x".format(after / before))
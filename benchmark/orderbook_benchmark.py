@@ -1,16 +1,36 @@
 # coding: utf-8
+"""
+Orderbook benchmark suite.
 
+Every case is run once for warmup, then timed per operation with
+perf_counter_ns for several rounds, and finally run once more under
+tracemalloc to record peak memory. Results are printed as JSON, so runs
+can be compared across commits:
+
+    python benchmark/orderbook_benchmark.py -o before.json
+    python benchmark/orderbook_benchmark.py --baseline before.json
+
+Comparing with a baseline exits with status 1 if any case's throughput
+dropped more than --threshold.
+"""
+
+import argparse
+import gc
+import json
+import logging
+import platform
+import random
+import sys
 import time
-import statistics
+import tracemalloc
 
-from collections import defaultdict
-from random import shuffle
+from collections import OrderedDict
 
 try:
     from orderbook.core import OrderBook, PriceLevel
     from orderbook.structure import Order
+    from orderbook.utils import normalize_price
 except ImportError:
-    import sys
     import os
 
     CURRENT_DIR = os.path.dirname(sys.argv[0])
@@ -19,74 +39,364 @@ except ImportError:
 
     from orderbook.core import OrderBook, PriceLevel
     from orderbook.structure import Order
+    from orderbook.utils import normalize_price
 
 
-if __name__ == "__main__":
-    order_price = 100.0
+SYMBOL = "XBTUSD"
+TICK_PRICE = 0.5
+BASE_PRICE = 10000.0
+
+CASES = OrderedDict()
+
+
+class SkipCase(Exception):
+    pass
+
+
+def case(name):
+    """
+    Register benchmark case.
+    Case function receives parsed arguments and returns (func, args_list),
+    each item in args_list is one operation: func(*args).
+    """
+    def register(func):
+        CASES[name] = func
+        return func
+
+    return register
+
+
+def level_price(level, side="Buy"):
+    if side == "Buy":
+        return BASE_PRICE - level * TICK_PRICE
+
+    return BASE_PRICE + (level + 1) * TICK_PRICE
+
+
+def make_orders(params, prefix="", sides=("Buy", "Sell")):
+    orders = list()
+
+    for idx in range(params.orders):
+        side = sides[idx % len(sides)]
+        qty = random.randint(1, 100)
+
+        orders.append(Order(
+            orderID="{}{}".format(prefix, idx), symbol=SYMBOL, side=side,
+            orderQty=qty if side == "Buy" else -qty,
+            price=level_price(random.randrange(params.depth), side)))
+
+    return orders
+
+
+def filled_book(params):
+    book = OrderBook(symbol=SYMBOL, tick_price=TICK_PRICE)
+
+    for order in make_orders(params):
+        book.add_order(order)
+
+    return book
+
+
+@case("order_create")
+def order_create(params):
+    rows = [{"orderID": "{:032x}".format(idx), "clOrdID": "", "account": 1,
+             "symbol": SYMBOL, "side": "Buy" if idx % 2 else "Sell",
+             "orderQty": 10 if idx % 2 else -10, "price": 10000.5,
+             "ordType": "Limit", "timeInForce": "GoodTillCancel",
+             "ordStatus": "New", "leavesQty": 10, "cumQty": 0,
+             "transactTime": "2019-05-24T17:07:16.123Z",
+             "timestamp": "2019-05-24T17:07:16.123Z"}
+            for idx in range(params.orders)]
+
+    return lambda row: Order(**row), [(row,) for row in rows]
+
+
+@case("normalize_price")
+def normalize_price_case(params):
+    prices = [level_price(random.randrange(params.depth)) +
+              random.choice((0, 0.1, 0.26))
+              for _ in range(params.orders)]
+
+    return normalize_price, [(price, TICK_PRICE) for price in prices]
+
+
+@case("price_level_push")
+def price_level_push(params):
+    level = PriceLevel(price=BASE_PRICE)
+
+    orders = [Order(orderID=str(idx), price=BASE_PRICE, orderQty=1)
+              for idx in range(params.orders)]
+
+    return level.push_order, [(order,) for order in orders]
+
+
+@case("orderbook_add")
+def orderbook_add(params):
+    book = OrderBook(symbol=SYMBOL, tick_price=TICK_PRICE)
+
+    return book.add_order, [(order,) for order in make_orders(params)]
+
+
+@case("orderbook_cancel")
+def orderbook_cancel(params):
+    book = filled_book(params)
+
+    order_ids = [str(idx) for idx in range(params.orders)]
+    random.shuffle(order_ids)
+
+    return book.cancel, [(order_id,) for order_id in order_ids]
+
+
+@case("mbl_trade")
+def mbl_trade(params):
+    book = filled_book(params)
+
+    volumes = list()
+    remained = book.buy_mbl.leaves_through()
+    while remained > 0:
+        volume = min(remained, random.randint(1, 200))
+        volumes.append((volume,))
+        remained -= volume
+
+    return book.buy_mbl.trade_volume, volumes
+
 
-    order_count = 10000
+@case("orderbook_submit")
+def orderbook_submit(params):
+    book = filled_book(params)
 
-    metrics = defaultdict(list)
+    orders = make_orders(params, prefix="t")
+    for order in orders:
+        # half of incoming orders cross the spread
+        if random.random() < 0.5:
+            order["price"] = level_price(random.randrange(params.depth),
+                                         order["side"].flap().name)
 
-    for idx in range(100):
-        level = PriceLevel(price=order_price)
+    return book.submit, [(order,) for order in orders]
 
-        orders_volumes = list(range(1, order_count + 1, 1))
 
-        add_order_start = time.time()
-        for vol in orders_volumes:
-            level.push_order(
-                Order(orderID=str(vol), price=order_price,
-                      orderQty=vol)
-            )
-        order_time_span = time.time() - add_order_start
+@case("ws_update_handler")
+def ws_update_handler(params):
+    try:
+        from clients.nge_websocket import NGEWebsocket
+    except ImportError as e:
+        raise SkipCase(str(e))
 
-        metrics["order"].append(order_count / order_time_span)
+    # handler only, without connecting
+    ws = NGEWebsocket.__new__(NGEWebsocket)
+    ws.logger = logging.getLogger("benchmark")
+    ws.init_tables()
+    ws.l2_feed = None
 
-        print("{:d}# PriceLevel order input rate: {:.2f} ops".format(
-            idx + 1, metrics["order"][-1]))
+    rows = [{"symbol": SYMBOL, "id": idx,
+             "side": "Buy" if idx < params.depth else "Sell",
+             "size": random.randint(1, 1000),
+             "price": level_price(idx % params.depth,
+                                  "Buy" if idx < params.depth else "Sell")}
+            for idx in range(params.depth * 2)]
 
-        shuffle(orders_volumes)
+    ws.partial_handler("orderBookL2", {
+        "table": "orderBookL2", "action": "partial",
+        "keys": ["symbol", "id", "side"], "data": rows})
 
-        split = int(order_count * 0.8)
+    messages = list()
+    for _ in range(params.orders):
+        row = random.choice(rows)
+        messages.append(("orderBookL2", {
+            "table": "orderBookL2", "action": "update",
+            "data": [{"symbol": SYMBOL, "id": row["id"],
+                      "side": row["side"],
+                      "size": random.randint(1, 1000)}]}))
 
-        cancel_volumes = orders_volumes[:split]
-        trade_volumes = orders_volumes[split:]
+    return ws.update_handler, messages
 
-        cancel_start = time.time()
-        for order_idx in cancel_volumes:
-            level.remove_order_by_id(str(order_idx))
-        cancel_time_span = time.time() - cancel_start
 
-        metrics["cancel"].append(len(cancel_volumes) / cancel_time_span)
-        print("{:d}# PriceLevel order cancel rate: {:.2f} ops".format(
-            idx + 1, metrics["cancel"][-1]))
+@case("l2_feed_update")
+def l2_feed_update(params):
+    from orderbook.feed import L2BookFeed
 
-        trade_count = 0
-        trade_vol_start = time.time()
-        for vol in trade_volumes:
-            remained, traded = level.trade_volume(vol)
-            trade_count += len(traded)
-        trade_time_span = time.time() - trade_vol_start
+    feed = L2BookFeed(tick_price=TICK_PRICE)
 
-        metrics["trade"].append(trade_count / trade_time_span)
+    rows = [{"symbol": SYMBOL, "id": idx,
+             "side": "Buy" if idx < params.depth else "Sell",
+             "size": random.randint(1, 1000),
+             "price": level_price(idx % params.depth,
+                                  "Buy" if idx < params.depth else "Sell")}
+            for idx in range(params.depth * 2)]
 
-        print("{:d}# PriceLevel order trade rate: {:.2f} ops".format(
-            idx + 1, metrics["trade"][-1]))
+    feed.partial(rows)
 
-        print()
+    updates = list()
+    for _ in range(params.orders):
+        row = random.choice(rows)
+        updates.append(("update", [{"symbol": SYMBOL, "id": row["id"],
+                                    "side": row["side"],
+                                    "size": random.randint(1, 1000)}]))
 
-        del level
+    return feed.apply, updates
 
-    for key, value_list in metrics.items():
-        max_rate = max(value_list)
-        min_rate = min(value_list)
-        mean_rate = statistics.mean(value_list)
-        stdev_rate = statistics.stdev(value_list)
 
-        print(
-            "{} rate metrics: Max[{:.2f}], Min[{:.2f}], "
-            "Avg[{:.2f}], Std[{:.2f}@{:.2f} %]".format(
-                key, max_rate, min_rate, mean_rate, stdev_rate,
-                stdev_rate / mean_rate * 100)
-        )
+def run_ops(func, args_list, timer=time.perf_counter_ns):
+    latencies = [0] * len(args_list)
+
+    for idx, args in enumerate(args_list):
+        start = timer()
+        func(*args)
+        latencies[idx] = timer() - start
+
+    return latencies
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0
+
+    idx = min(len(sorted_values) - 1,
+              int(round(pct / 100 * (len(sorted_values) - 1))))
+
+    return sorted_values[idx]
+
+
+def run_case(name, params):
+    setup = CASES[name]
+
+    random.seed(params.seed)
+    func, args_list = setup(params)
+    warmup = args_list[:max(1, len(args_list) * params.warmup // 100)]
+    run_ops(func, warmup)
+
+    latencies = list()
+    total_ns = 0
+
+    for _ in range(params.rounds):
+        random.seed(params.seed)
+        func, args_list = setup(params)
+
+        gc.collect()
+        start = time.perf_counter_ns()
+        latencies.extend(run_ops(func, args_list))
+        total_ns += time.perf_counter_ns() - start
+
+    random.seed(params.seed)
+    func, args_list = setup(params)
+
+    tracemalloc.start()
+    run_ops(func, args_list)
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies.sort()
+    op_count = len(latencies)
+
+    return OrderedDict((
+        ("ops", op_count),
+        ("ops_per_sec", round(op_count / total_ns * 1e9, 2)
+         if total_ns else 0),
+        ("mean_ns", round(sum(latencies) / op_count, 2) if op_count else 0),
+        ("p50_ns", percentile(latencies, 50)),
+        ("p99_ns", percentile(latencies, 99)),
+        ("p999_ns", percentile(latencies, 99.9)),
+        ("max_ns", latencies[-1] if latencies else 0),
+        ("peak_memory_bytes", peak_memory)
+    ))
+
+
+def compare(results, baseline, threshold):
+    """
+    Compare throughput with baseline results
+    :return: list of regression descriptions
+    """
+    regressions = list()
+
+    for name, result in results.items():
+        base = baseline.get(name)
+
+        if not base or "ops_per_sec" not in base or \
+                "ops_per_sec" not in result:
+            continue
+
+        ratio = result["ops_per_sec"] / base["ops_per_sec"]
+        result["baseline_ratio"] = round(ratio, 4)
+
+        if ratio < 1 - threshold:
+            regressions.append(
+                "{}: {:.2f} ops/sec, baseline {:.2f} ops/sec ({:+.1f} %)"
+                .format(name, result["ops_per_sec"], base["ops_per_sec"],
+                        (ratio - 1) * 100))
+
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="orderbook benchmark suite")
+
+    parser.add_argument("--depth", type=int, default=50,
+                        help="price level depth per side")
+    parser.add_argument("--orders", type=int, default=10000,
+                        help="operation count per round")
+    parser.add_argument("--rounds", type=int, default=5,
+                        help="timed rounds per case")
+    parser.add_argument("--warmup", type=int, default=10,
+                        help="warmup operations, in percent of --orders")
+    parser.add_argument("--seed", type=int, default=20190524)
+    parser.add_argument("--case", action="append", choices=list(CASES),
+                        help="run specified case only, can be repeated")
+    parser.add_argument("-o", "--output", help="write JSON result to file")
+    parser.add_argument("--baseline", help="baseline JSON result to compare")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="allowed throughput drop against baseline")
+
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    params = parse_args(argv)
+
+    results = OrderedDict()
+
+    for name in params.case or CASES:
+        try:
+            results[name] = run_case(name, params)
+        except SkipCase as e:
+            results[name] = {"skipped": str(e)}
+
+        print("{}: {}".format(name, dict(results[name])), file=sys.stderr)
+
+    report = OrderedDict((
+        ("meta", OrderedDict((
+            ("python", platform.python_version()),
+            ("implementation", platform.python_implementation()),
+            ("platform", platform.platform()),
+            ("timestamp", int(time.time())),
+            ("params", {key: value for key, value in vars(params).items()
+                        if key not in ("output", "baseline")})
+        ))),
+        ("results", results)
+    ))
+
+    regressions = list()
+
+    if params.baseline:
+        with open(params.baseline) as f:
+            baseline = json.load(f)
+
+        regressions = compare(results, baseline.get("results", {}),
+                              params.threshold)
+        report["regressions"] = regressions
+
+    output = json.dumps(report, indent=2)
+
+    if params.output:
+        with open(params.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+    for regression in regressions:
+        print("REGRESSION {}".format(regression), file=sys.stderr)
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,204 @@
+# coding: utf-8
+"""
+Replay captured websocket frames through WebsocketTables and report
+messages/sec of each available JSON decoder, against the legacy message
+path as baseline.
+
+Capture file has one raw frame per line. Without --file, a synthetic
+orderBookL2 / trade capture is generated, use --save to keep it:
+
+    python benchmark/ws_replay_benchmark.py --save capture.txt
+    python benchmark/ws_replay_benchmark.py --file capture.txt
+"""
+
+import argparse
+import json
+import logging
+import random
+import sys
+import time
+
+try:
+    from clients import nge_websocket
+    from clients.nge_websocket import WebsocketTables
+except ImportError:
+    import os
+
+    CURRENT_DIR = os.path.dirname(sys.argv[0])
+
+    sys.path.append(os.path.join(CURRENT_DIR, "../"))
+
+    from clients import nge_websocket
+    from clients.nge_websocket import WebsocketTables
+
+
+SYMBOL = "XBTUSD"
+TICK_PRICE = 0.5
+BASE_PRICE = 10000.0
+
+
+def l2_row(idx, side, size):
+    ticks = -idx if side == "Buy" else idx + 1
+
+    return {"symbol": SYMBOL, "id": 8800000000 + idx * 2 + (
+        side == "Sell"), "side": side, "size": size,
+            "price": BASE_PRICE + ticks * TICK_PRICE}
+
+
+def generate_frames(count, depth):
+    """
+    Synthetic capture: orderBookL2 / trade partials, followed by mostly
+    size updates, with level deletes / inserts and trades.
+    """
+    frames = [{"subscribe": "orderBookL2:" + SYMBOL, "success": True},
+              {"table": "orderBookL2", "action": "partial",
+               "keys": ["symbol", "id", "side"],
+               "data": [l2_row(idx, side, random.randint(1, 1000))
+                        for side in ("Sell", "Buy")
+                        for idx in range(depth)]},
+              {"table": "trade", "action": "partial", "keys": [],
+               "data": []}]
+
+    for _ in range(count):
+        dice = random.random()
+        side = random.choice(("Buy", "Sell"))
+        row = l2_row(random.randrange(depth), side, random.randint(1, 1000))
+
+        if dice < 0.8:
+            del row["price"]
+            frames.append({"table": "orderBookL2", "action": "update",
+                           "data": [row]})
+        elif dice < 0.9:
+            frames.append({"table": "orderBookL2", "action": "delete",
+                           "data": [{"symbol": SYMBOL, "id": row["id"],
+                                     "side": side}]})
+            frames.append({"table": "orderBookL2", "action": "insert",
+                           "data": [row]})
+        else:
+            frames.append({"table": "trade", "action": "insert", "data": [
+                {"timestamp": "2019-05-24T08:00:00.000Z", "symbol": SYMBOL,
+                 "side": side, "size": row["size"], "price": row["price"],
+                 "tickDirection": "ZeroPlusTick",
+                 "trdMatchID": "%032x" % random.getrandbits(128)}]})
+
+    return [json.dumps(frame) for frame in frames]
+
+
+def make_tables():
+    tables = WebsocketTables()
+    tables.logger = logging.getLogger("benchmark")
+    tables.symbol = SYMBOL
+    tables.init_tables()
+
+    return tables
+
+
+def legacy_on_message(tables, frame):
+    """
+    Message path before pluggable decoder, kept as baseline: stdlib json,
+    action_switch built and payload formatted on every message.
+    """
+    try:
+        message = json.loads(frame)
+    except ValueError:
+        return
+
+    if 'subscribe' in message:
+        "Subscribed to %s." % message['subscribe']
+        return
+
+    table = message.get('table')
+    action = message.get('action')
+
+    if not action:
+        return
+
+    action_switch = {
+        "partial": tables.partial_handler,
+        "insert": tables.insert_handler,
+        "update": tables.update_handler,
+        "delete": tables.delete_handler
+    }
+
+    "%s: %s %s" % (table, action, message['data'])
+
+    action_switch[action](table, message)
+
+
+def on_message(tables, frame):
+    try:
+        message = tables.decode(frame)
+    except ValueError:
+        return
+
+    tables.handle_message(message)
+
+
+def measure(name, func, frames, rounds, decode=None):
+    rates = list()
+
+    for _ in range(rounds):
+        tables = make_tables()
+        if decode is not None:
+            tables.decode = decode
+
+        start = time.perf_counter()
+        for frame in frames:
+            func(tables, frame)
+        rates.append(len(frames) / (time.perf_counter() - start))
+
+    print("{:<36s} best[{:>12.2f}] messages/sec".format(name, max(rates)))
+
+    return max(rates)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="websocket message replay benchmark")
+
+    parser.add_argument("--file", help="captured frames, one per line")
+    parser.add_argument("--count", type=int, default=100000,
+                        help="synthetic message count")
+    parser.add_argument("--depth", type=int, default=50,
+                        help="synthetic price level depth per side")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=20190524)
+    parser.add_argument("--save", help="write synthetic capture to file")
+
+    params = parser.parse_args(argv)
+
+    if params.file:
+        with open(params.file) as f:
+            frames = [line.rstrip("\n") for line in f if line.strip()]
+    else:
+        random.seed(params.seed)
+        frames = generate_frames(params.count, params.depth)
+
+        if params.save:
+            with open(params.save, "w") as f:
+                f.writelines(frame + "\n" for frame in frames)
+
+    print("{} messages, {} bytes".format(
+        len(frames), sum(len(frame) for frame in frames)))
+
+    before = measure("legacy json.loads", legacy_on_message, frames,
+                     params.rounds)
+
+    measure("json.loads", on_message, frames, params.rounds,
+            decode=json.loads)
+
+    if nge_websocket.simplejson is not None:
+        measure("simplejson.loads", on_message, frames, params.rounds,
+                decode=nge_websocket.simplejson.loads)
+
+    if nge_websocket.orjson is not None:
+        measure("orjson.loads", on_message, frames, params.rounds,
+                decode=nge_websocket.orjson.loads)
+
+    after = measure("default decoder", on_message, frames, params.rounds)
+
+    print("speed up: {:.1f}x".format(after / before))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,249 @@
+# coding: utf-8
+import asyncio
+import json
+import logging
+
+from collections import defaultdict
+
+from .nge_websocket import (WebsocketTables, SYMBOL_SUBS, GENERIC_SUBS,
+                            generate_auth_headers, realtime_url,
+                            symbol_topics)
+
+try:
+    import websockets
+except ImportError:
+    websockets = None
+
+
+class AsyncNGEWebsocket(WebsocketTables):
+    """
+    asyncio websocket client with the same table semantics as
+    NGEWebsocket(data / keys / order_book ...).
+
+    Tables are updated by one reader task. Partials are awaitable with
+    wait_for_partial, and table actions can be consumed with
+    `async for table, action, rows in ws.updates()`. Each updates
+    iterator has a bounded queue, reader awaits on a full queue and stops
+    reading the socket, so a slow consumer back-pressures the connection
+    instead of growing memory. Without any updates iterator, messages are
+    only applied to tables.
+
+        async with AsyncNGEWebsocket(endpoint, "XBTUSD") as ws:
+            await ws.wait_for_partial("orderBookL2")
+            async for table, action, rows in ws.updates():
+                ...
+    """
+
+    # updates queue size of each iterator
+    QUEUE_SIZE = 1024
+
+    def __init__(self, endpoint, symbol=None, api_key=None, api_secret=None,
+                 queue_size=None):
+        """
+        Initialize data stores, connect with `await connect()` or
+        `async with`.
+        :param endpoint:
+        :param symbol: primary symbol subscribed on connect, None to
+        subscribe symbols later with subscribe_symbol
+        :param api_key:
+        :param api_secret:
+        :param queue_size: updates queue size of each iterator
+        """
+        self.logger = logging.getLogger(__name__)
+
+        self.endpoint = endpoint
+        self.symbol = symbol
+
+        if api_key is not None and api_secret is None:
+            raise ValueError('api_secret is required if api_key is provided')
+        if api_key is None and api_secret is not None:
+            raise ValueError('api_key is required if api_secret is provided')
+
+        self.api_key = api_key
+        self.api_secret = api_secret
+
+        self.queue_size = queue_size or self.QUEUE_SIZE
+
+        self.init_tables()
+        self.exited = False
+
+        self._connection = None
+        self._reader = None
+        self._queues = list()
+        self._partials = defaultdict(asyncio.Event)
+
+    async def connect(self, connection=None):
+        """
+        Connect and start reading messages.
+        :param connection: connected websocket(async iterable of frames
+        with async send / close), default to connect with websockets
+        :return:
+        """
+        if connection is None:
+            if websockets is None:
+                raise ImportError(
+                    "websockets is required for AsyncNGEWebsocket.")
+
+            headers = generate_auth_headers(
+                self.api_key, self.api_secret) if self.api_key else []
+
+            url = realtime_url(self.endpoint)
+            self.logger.info("Connecting to %s" % url)
+            connection = await websockets.connect(url,
+                                                  extra_headers=headers)
+
+        self._connection = connection
+        self._reader = asyncio.ensure_future(self.__read())
+
+        if self.symbol or self.api_key:
+            topics = list(GENERIC_SUBS)
+            if self.symbol:
+                topics += symbol_topics(self.symbol)
+
+            await self.subscribe(*topics)
+
+    async def close(self):
+        """
+        Close websocket, updates iterators stop after queued items.
+        :return:
+        """
+        self.exited = True
+
+        if self._connection is not None:
+            await self._connection.close()
+
+        if self._reader is not None:
+            # reader may be blocked by a full queue
+            self._reader.cancel()
+
+            try:
+                await self._reader
+            except asyncio.CancelledError:
+                pass
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def send_command(self, command, args=None):
+        """
+        Send a raw command.
+        :param command:
+        :param args:
+        :return:
+        """
+        await self._connection.send(
+            json.dumps({"op": command, "args": args or []}))
+
+    async def subscribe(self, *topics):
+        await self.send_command("subscribe", list(topics))
+
+    async def subscribe_symbol(self, symbol, tables=SYMBOL_SUBS):
+        """
+        Subscribe tables of symbol on current connection, tables are kept
+        in symbol_data[symbol].
+        :param symbol:
+        :param tables:
+        :return:
+        """
+        await self.subscribe(*symbol_topics(symbol, tables))
+
+    async def unsubscribe_symbol(self, symbol, tables=SYMBOL_SUBS):
+        """
+        Unsubscribe tables of symbol and drop its data.
+        :param symbol:
+        :param tables:
+        :return:
+        """
+        await self.send_command("unsubscribe", symbol_topics(symbol, tables))
+        self.drop_symbol(symbol)
+
+    async def wait_for_partial(self, *tables, symbol=None, timeout=None):
+        """
+        Wait until partials of tables are received.
+        :param tables: table names
+        :param symbol: wait for partials of symbol, None for any partial of
+        tables(e.g. tables without symbol such as margin)
+        :param timeout: seconds, None for no timeout
+        :return:
+        :raise asyncio.TimeoutError
+        """
+        await asyncio.wait_for(asyncio.gather(
+            *(self._partials[(table, symbol)].wait() for table in tables)),
+            timeout)
+
+    def drop_symbol(self, symbol):
+        super().drop_symbol(symbol)
+
+        # partials of symbol are waited again after resubscribe, events are
+        # kept so tasks already waiting are released by the next partial
+        for key, event in self._partials.items():
+            if key[1] == symbol:
+                event.clear()
+
+    async def updates(self):
+        """
+        Iterate applied table actions until websocket is closed.
+        :return: async iterator of (table, action, rows)
+        """
+        queue = asyncio.Queue(self.queue_size)
+        self._queues.append(queue)
+
+        try:
+            while True:
+                if self.exited and queue.empty():
+                    return
+
+                item = await queue.get()
+
+                if item is None:
+                    return
+
+                yield item
+        finally:
+            self._queues.remove(queue)
+
+    def __set_partial(self, table, message):
+        symbols = {row.get('symbol') for row in message['data']}
+        symbols.add((message.get('filter') or {}).get('symbol'))
+        symbols.add(None)
+
+        for symbol in symbols:
+            self._partials[(table, symbol)].set()
+
+    async def __read(self):
+        try:
+            async for frame in self._connection:
+                try:
+                    message = self.decode(frame)
+                except ValueError as e:
+                    self.logger.debug(frame)
+                    continue
+
+                action = self.handle_message(message)
+
+                if action is None:
+                    continue
+
+                table = message['table']
+
+                if action == 'partial':
+                    self.__set_partial(table, message)
+
+                for queue in tuple(self._queues):
+                    # back-pressure: wait for slow consumers
+                    await queue.put((table, action, message['data']))
+        except Exception as e:
+            if not self.exited:
+                self.logger.exception(e)
+        finally:
+            self.exited = True
+            self.logger.info('Websocket Closed')
+
+            for queue in tuple(self._queues):
+                # wake up waiting iterator
+                if queue.empty():
+                    queue.put_nowait(None)
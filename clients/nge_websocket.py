@@ -9,7 +9,20 @@ import hashlib
 import json
 
 from time import sleep, time
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
+from itertools import count, islice
+
+from orderbook.feed import L2BookFeed
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import simplejson
+except ImportError:
+    simplejson = None
 
 
 def generate_nonce():
@@ -33,80 +46,274 @@ def generate_signature(secret, verb, url, nonce, data):
     return signature
 
 
-# noinspection PyUnusedLocal
-class NGEWebsocket(object):
-    # Don't grow a table larger than this amount. Helps cap memory usage.
-    MAX_TABLE_LEN = 200
+def generate_auth_headers(api_key, api_secret, path='/realtime'):
+    """
+    Generate WS auth headers. To auth to the WS using an API key, we
+    generate a signature of a nonce and the WS API endpoint.
+    :return: list of (name, value)
+    """
+    nonce = generate_nonce()
+    return [
+        ("api-nonce", str(nonce)),
+        ("api-signature", generate_signature(
+            api_secret, 'GET', path, nonce, '')),
+        ("api-key", api_key)
+    ]
 
-    def __init__(self, endpoint, symbol, api_key=None, api_secret=None):
+
+# You can sub to orderBookL2 for all levels, or orderBook10 for top
+# 10 levels & save bandwidth
+SYMBOL_SUBS = ("execution", "instrument", "order", "orderBookL2",
+               "position", "quote", "trade")
+GENERIC_SUBS = ("margin",)
+
+
+def json_decoder():
+    """
+    Fastest available JSON decoder, orjson, simplejson, then json.
+    :return: loads function, which raises ValueError on invalid document
+    """
+    if orjson is not None:
+        return orjson.loads
+
+    if simplejson is not None:
+        return simplejson.loads
+
+    return json.loads
+
+
+def symbol_topics(symbol, tables=SYMBOL_SUBS):
+    return [table + ':' + symbol for table in tables]
+
+
+def realtime_url(endpoint, subscriptions=()):
+    """
+    Generate a WS connection URL from REST endpoint.
+    :param endpoint:
+    :param subscriptions: topics subscribed in querystring
+    :return:
+    """
+    path = "/realtime"
+    if subscriptions:
+        path += "?subscribe={}".format(','.join(subscriptions))
+
+    # noinspection PyUnresolvedReferences
+    url_parts = list(urllib.parse.urlparse(endpoint))
+    url_parts[0] = url_parts[0].replace('http', 'ws')
+    url_parts[2] = path
+    # noinspection PyUnresolvedReferences
+    return urllib.parse.urlunparse(url_parts)
+
+
+class KeyedTable(object):
+    """
+    Websocket table indexed by the "keys" fields communicated on partial,
+    rows are kept in insertion order, so the table still reads like the
+    row list(iterate, len, table[0], table[-1]), while locating a row for
+    update / delete is O(1).
+    Tables without keys(e.g. trade) are append only, rows are indexed by
+    arrival sequence.
+
+    Tables are updated by the websocket thread while read by others, so
+    iterating or slicing reads a snapshot of rows taken under the table
+    lock, never the live index.
+    """
+
+    def __init__(self, keys=(), rows=()):
+        self.keys = tuple(keys)
+
+        self._rows = OrderedDict()
+        self._sequence = count()
+        self._lock = threading.Lock()
+
+        self.extend(rows)
+
+    def key_of(self, row):
+        if not self.keys:
+            return next(self._sequence)
+
+        return tuple(row[key] for key in self.keys)
+
+    def get(self, row):
         """
-        Connect to the websocket and initialize data stores.
-        :param endpoint:
-        :param symbol:
-        :param api_key:
-        :param api_secret:
+        Find row in table with the same keys
+        :param row: row with key fields
+        :return: row in table or None
         """
+        if not self.keys:
+            return None
 
-        self.logger = logging.getLogger(__name__)
-        self.logger.debug("Initializing WebSocket.")
+        return self._rows.get(self.key_of(row))
 
-        self.endpoint = endpoint
-        self.symbol = symbol
+    def extend(self, rows):
+        table = self._rows
 
-        if api_key is not None and api_secret is None:
-            raise ValueError('api_secret is required if api_key is provided')
-        if api_key is None and api_secret is not None:
-            raise ValueError('api_key is required if api_secret is provided')
+        with self._lock:
+            for row in rows:
+                table[self.key_of(row)] = row
 
-        self.api_key = api_key
-        self.api_secret = api_secret
+    def update(self, row):
+        """
+        Update row with the same keys
+        :param row: updated fields with key fields
+        :return: updated row in table, None if not found
+        """
+        item = self.get(row)
 
-        self.data = defaultdict(list)
-        self.keys = dict()
-        self.exited = False
+        if item is not None:
+            item.update(row)
 
-        # We can subscribe right in the connection querystring, so let's
-        # build that.
-        # Subscribe to all pertinent endpoints
-        ws_url = self.__get_url()
-        self.logger.info("Connecting to %s" % ws_url)
-        self.__connect(ws_url, symbol)
-        self.logger.info('Connected to WS.')
+        return item
 
-        # Connected. Wait for partials
-        self.__wait_for_symbol(symbol)
-        if api_key:
-            self.__wait_for_account()
-        self.logger.info('Got all market data. Starting.')
+    def remove(self, row):
+        """
+        Remove row with the same keys
+        :param row: row with key fields
+        :return: removed row, None if not found
+        """
+        if not self.keys:
+            return None
 
-    def exit(self):
+        with self._lock:
+            return self._rows.pop(self.key_of(row), None)
+
+    def trim(self, size):
         """
-        Call this to exit - will close websocket.
+        Drop oldest rows, keep latest size rows
+        :param size: rows to keep
+        """
+        table = self._rows
+
+        with self._lock:
+            for _ in range(len(table) - size):
+                table.popitem(last=False)
+
+    def rows(self):
+        """
+        Snapshot of rows in insertion order
+        :return: list of rows
+        """
+        with self._lock:
+            return list(self._rows.values())
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return self.rows()[item]
+
+        rows = self._rows
+
+        with self._lock:
+            if item == -1 and rows:
+                return rows[next(reversed(rows))]
+
+            if item < 0:
+                item += len(rows)
+
+            if not 0 <= item < len(rows):
+                raise IndexError("table index out of range")
+
+            return next(islice(rows.values(), item, None))
+
+    def __iter__(self):
+        return iter(self.rows())
+
+    def __reversed__(self):
+        return reversed(self.rows())
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __repr__(self):
+        return "KeyedTable(keys={}, rows={})".format(self.keys,
+                                                     len(self._rows))
+
+
+class WebsocketTables(object):
+    """
+    Table storage and message handling shared by websocket clients,
+    transport(thread or asyncio) is up to subclass.
+
+    Rows are partitioned by their symbol, tables of each symbol are in
+    symbol_data[symbol], rows without symbol(e.g. margin) are in data.
+    Tables of the primary symbol(self.symbol) are also kept in data, so
+    single symbol clients can read data[table] directly.
+    """
+
+    # Don't grow a table larger than this amount. Helps cap memory usage.
+    MAX_TABLE_LEN = 200
+
+    # orderBookL2 actions are applied to per symbol OrderBook if set
+    l2_feed = None
+
+    symbol = None
+
+    # decoder of WS frames, can be replaced by subclass or instance
+    decode = staticmethod(json_decoder())
+
+    def init_tables(self):
+        """
+        Initialize data stores.
         :return:
         """
+        self.data = defaultdict(KeyedTable)
+        self.symbol_data = defaultdict(dict)
+        self.keys = dict()
 
-        self.exited = True
-        self.ws.close()
+        self.l2_feed = L2BookFeed(tick_price=self.__tick_price)
 
-    def get_instrument(self):
+        # There are four possible actions from the WS:
+        # 'partial' - full table image
+        # 'insert'  - new row
+        # 'update'  - update row
+        # 'delete'  - delete row
+        self.__action_switch = {
+            "partial": self.partial_handler,
+            "insert": self.insert_handler,
+            "update": self.update_handler,
+            "delete": self.delete_handler
+        }
+
+    def table(self, table_name, symbol=None):
+        """
+        Get table of symbol.
+        :param table_name:
+        :param symbol: default to primary symbol
+        :return: KeyedTable, empty if not received
+        """
+        if symbol is None or symbol == self.symbol:
+            return self.data[table_name]
+
+        table = self.symbol_data.get(symbol, {}).get(table_name)
+
+        return KeyedTable() if table is None else table
+
+    @property
+    def symbols(self):
+        """
+        Symbols with received tables.
+        :return:
+        """
+        return set(self.symbol_data)
+
+    def get_instrument(self, symbol=None):
         """
         Get the raw instrument data for this symbol.
         :return:
         """
         # Turn the 'tickSize' into 'tickLog' for use in rounding
-        instrument = self.data['instrument'][0]
+        instrument = self.table('instrument', symbol)[0]
         instrument['tickLog'] = int(
             math.fabs(math.log10(instrument['tickSize'])))
         return instrument
 
-    def get_ticker(self):
+    def get_ticker(self, symbol=None):
         """
         Return a ticker object. Generated from quote and trade.
         :return:
         """
 
-        last_quote = self.data['quote'][-1]
-        last_trade = self.data['trade'][-1]
+        last_quote = self.table('quote', symbol)[-1]
+        last_trade = self.table('trade', symbol)[-1]
         ticker = {
             "last": last_trade['price'],
             "buy": last_quote['bidPrice'],
@@ -116,7 +323,7 @@ class NGEWebsocket(object):
         }
 
         # The instrument has a tickSize. Use it to round values.
-        instrument = self.data['instrument'][0]
+        instrument = self.get_instrument(symbol)
         return {k: round(float(v or 0), instrument['tickLog']) for k, v in
                 ticker.items()}
 
@@ -127,80 +334,314 @@ class NGEWebsocket(object):
         """
         return self.data['margin'][0]
 
-    def market_depth(self):
+    def market_depth(self, symbol=None):
         """
         Get market depth (orderbook). Returns all levels.
-        :return:
+        :return: KeyedTable, iterate or slice it for a snapshot
         """
-        return self.data['orderBookL2']
+        return self.table('orderBookL2', symbol)
+
+    def order_book(self, symbol=None):
+        """
+        Get OrderBook maintained from orderBookL2, levels are sorted in
+        price priority. Book is updated by websocket thread, read it
+        under l2_feed.lock, or use top_levels.
+        :param symbol: default to subscribed symbol
+        :return: OrderBook or None if no partial received
+        """
+        if self.l2_feed is None:
+            return None
+
+        return self.l2_feed.book(symbol or self.symbol)
+
+    def top_levels(self, symbol=None, n=25):
+        """
+        Get best n levels of OrderBook maintained from orderBookL2,
+        safe to call from other threads.
+        :param symbol: default to subscribed symbol
+        :param n: level count per side
+        :return: TopLevels or None if no partial received
+        """
+        if self.l2_feed is None:
+            return None
+
+        return self.l2_feed.top_levels(symbol or self.symbol, n)
 
-    def open_orders(self, clr_id_prefix):
+    def open_orders(self, clr_id_prefix, symbol=None):
         """
         Get all your open orders.
         :param clr_id_prefix:
+        :param symbol:
         :return:
         """
-        orders = self.data['order']
+        orders = self.table('order', symbol)
         # Filter to only open orders (leavesQty > 0) and those that we
         # actually placed
         return [o for o in orders if
                 str(o['clOrdID']).startswith(clr_id_prefix) and o[
                     'leavesQty'] > 0]
 
-    def recent_trades(self):
+    def recent_trades(self, symbol=None):
         """
         Get recent trades.
-        :return:
+        :return: KeyedTable, iterate or slice it for a snapshot
         """
-        return self.data['trade']
+        return self.table('trade', symbol)
 
     def partial_handler(self, table_name, message):
-        self.logger.debug("%s: partial" % table_name)
+        self.logger.debug("%s: partial", table_name)
 
-        self.data[table_name] = message['data']
         # Keys are communicated on partials to let you know how
         # to uniquely identify
         # an item. We use it for updates.
         self.keys[table_name] = message['keys']
 
+        partitions = self.__partition(message['data'])
+
+        # partial of a symbol may have no rows
+        symbol = (message.get('filter') or {}).get('symbol')
+        if symbol is not None or not partitions:
+            partitions.setdefault(symbol, [])
+
+        for symbol, rows in partitions.items():
+            self.__set_table(table_name, symbol,
+                             KeyedTable(message['keys'], rows))
+
+        self.__feed_book(table_name, 'partial', message)
+
     def insert_handler(self, table_name, message):
-        self.logger.debug(
-            '%s: inserting %s' % (table_name, message['data']))
+        self.logger.debug('%s: inserting %s', table_name, message['data'])
+
+        for symbol, rows in self.__partition(message['data']).items():
+            table = self.__table(table_name, symbol)
+            table.extend(rows)
 
-        self.data[table_name] += message['data']
+            # Limit the max length of the table to avoid excessive memory
+            # usage. Don't trim orders because we'll lose valuable state
+            # if we do.
+            if table_name not in ['order', 'orderBookL2'] and len(
+                    table) > self.MAX_TABLE_LEN:
+                table.trim(int(self.MAX_TABLE_LEN / 2))
 
-        # Limit the max length of the table to avoid excessive memory usage.
-        # Don't trim orders because we'll lose valuable state if we do.
-        if table_name not in ['order', 'orderBookL2'] and len(
-                self.data[table_name]) > NGEWebsocket.MAX_TABLE_LEN:
-            self.data[table_name] = self.data[table_name][int(
-                NGEWebsocket.MAX_TABLE_LEN / 2):]
+        self.__feed_book(table_name, 'insert', message)
 
     def update_handler(self, table_name, message):
-        self.logger.debug(
-            '%s: updating %s' % (table_name, message['data']))
-
-        # Locate the item in the collection and update it.
-        for update_data in message['data']:
-            item = find_item_by_keys(self.keys[table_name],
-                                     self.data[table_name], update_data)
-            if not item:
-                return  # No item found to update. Could happen
-                # before push
-            item.update(update_data)
-            # Remove cancelled / filled orders
-            if table_name == 'order' and item['leavesQty'] <= 0:
-                self.data[table_name].remove(item)
+        self.logger.debug('%s: updating %s', table_name, message['data'])
+
+        for symbol, rows in self.__partition(message['data']).items():
+            table = self.__table(table_name, symbol)
+
+            # Locate the item in the collection and update it.
+            for update_data in rows:
+                item = table.update(update_data)
+                if item is None:
+                    continue  # No item found to update. Could happen
+                    # before push
+                # Remove cancelled / filled orders
+                if table_name == 'order' and item['leavesQty'] <= 0:
+                    table.remove(item)
+
+        self.__feed_book(table_name, 'update', message)
 
     def delete_handler(self, table_name, message):
-        self.logger.debug(
-            '%s: deleting %s' % (table_name, message['data']))
+        self.logger.debug('%s: deleting %s', table_name, message['data'])
+
+        for symbol, rows in self.__partition(message['data']).items():
+            table = self.__table(table_name, symbol)
+
+            # Locate the item in the collection and remove it.
+            for deleteData in rows:
+                table.remove(deleteData)
+
+        self.__feed_book(table_name, 'delete', message)
+
+    def __feed_book(self, table_name, action, message):
+        if table_name != 'orderBookL2' or self.l2_feed is None:
+            return
+
+        try:
+            self.l2_feed.apply(action, message['data'], (
+                message.get('filter') or {}).get('symbol'))
+        except Exception as e:
+            # order book is derived, never block table updates
+            self.logger.exception(e)
+
+    def __tick_price(self, symbol):
+        """
+        Tick price of symbol for its OrderBook
+        :param symbol:
+        :return: tickSize of instrument, None if instrument not received
+        """
+        table = self.symbol_data.get(symbol, {}).get('instrument')
+        instrument = table.get({'symbol': symbol}) if table else None
+
+        return instrument['tickSize'] if instrument else None
+
+    def drop_symbol(self, symbol):
+        """
+        Drop tables and order book of symbol.
+        :param symbol:
+        :return:
+        """
+        tables = self.symbol_data.pop(symbol, {})
+
+        if symbol == self.symbol:
+            for table_name in tables:
+                self.data.pop(table_name, None)
+
+        if self.l2_feed is not None:
+            with self.l2_feed.lock:
+                self.l2_feed.books.pop(symbol, None)
+
+    @staticmethod
+    def __partition(rows):
+        """
+        Group rows by symbol, None for rows without symbol.
+        :param rows:
+        :return: symbol -> rows
+        """
+        partitions = dict()
+
+        for row in rows:
+            symbol = row.get('symbol')
+
+            symbol_rows = partitions.get(symbol)
+            if symbol_rows is None:
+                partitions[symbol] = [row]
+            else:
+                symbol_rows.append(row)
+
+        return partitions
+
+    def __set_table(self, table_name, symbol, table):
+        if symbol is not None:
+            self.symbol_data[symbol][table_name] = table
+
+        if symbol is None or symbol == self.symbol:
+            self.data[table_name] = table
+
+    def __table(self, table_name, symbol=None):
+        """
+        Get table by name and symbol, created with keys of partial if not
+        exists.
+        :param table_name:
+        :param symbol:
+        :return:
+        """
+        if symbol is None:
+            table = self.data.get(table_name)
+        else:
+            table = self.symbol_data[symbol].get(table_name)
+
+        if table is None:
+            table = KeyedTable(self.keys.get(table_name, ()))
+            self.__set_table(table_name, symbol, table)
+
+        return table
+
+    def handle_message(self, message):
+        """
+        Apply a decoded WS message to tables.
+        :param message:
+        :return: applied action, None if not a table action
+        """
+        if 'subscribe' in message:
+            self.logger.debug("Subscribed to %s.", message['subscribe'])
+            return None
+
+        table = message.get('table')
+        action = message.get('action')
+
+        if not action:
+            return None
+
+        try:
+            action_func = self.__action_switch[action]
+        except KeyError as e:
+            self.logger.error("Unknown action: %s", action)
+            return None
+
+        try:
+            action_func(table, message)
+        except Exception as e:
+            self.logger.exception(e)
+            return None
+
+        return action
+
+
+# noinspection PyUnusedLocal
+class NGEWebsocket(WebsocketTables):
+    def __init__(self, endpoint, symbol, api_key=None, api_secret=None):
+        """
+        Connect to the websocket and initialize data stores.
+        :param endpoint:
+        :param symbol: primary symbol, None to subscribe symbols later with
+        subscribe_symbol on the same connection
+        :param api_key:
+        :param api_secret:
+        """
+
+        self.logger = logging.getLogger(__name__)
+        self.logger.debug("Initializing WebSocket.")
+
+        self.endpoint = endpoint
+        self.symbol = symbol
+
+        if api_key is not None and api_secret is None:
+            raise ValueError('api_secret is required if api_key is provided')
+        if api_key is None and api_secret is not None:
+            raise ValueError('api_key is required if api_secret is provided')
 
-        # Locate the item in the collection and remove it.
-        for deleteData in message['data']:
-            item = find_item_by_keys(self.keys[table_name],
-                                     self.data[table_name], deleteData)
-            self.data[table_name].remove(item)
+        self.api_key = api_key
+        self.api_secret = api_secret
+
+        self.init_tables()
+        self.exited = False
+
+        # We can subscribe right in the connection querystring, so let's
+        # build that.
+        # Subscribe to all pertinent endpoints
+        ws_url = self.__get_url()
+        self.logger.info("Connecting to %s" % ws_url)
+        self.__connect(ws_url, symbol)
+        self.logger.info('Connected to WS.')
+
+        # Connected. Wait for partials
+        if symbol:
+            self.__wait_for_symbol(symbol)
+        if api_key:
+            self.__wait_for_account()
+        self.logger.info('Got all market data. Starting.')
+
+    def subscribe_symbol(self, symbol, tables=SYMBOL_SUBS):
+        """
+        Subscribe tables of symbol on current connection, tables are kept
+        in symbol_data[symbol].
+        :param symbol:
+        :param tables:
+        :return:
+        """
+        self.__send_command("subscribe", symbol_topics(symbol, tables))
+
+    def unsubscribe_symbol(self, symbol, tables=SYMBOL_SUBS):
+        """
+        Unsubscribe tables of symbol and drop its data.
+        :param symbol:
+        :param tables:
+        :return:
+        """
+        self.__send_command("unsubscribe", symbol_topics(symbol, tables))
+        self.drop_symbol(symbol)
+
+    def exit(self):
+        """
+        Call this to exit - will close websocket.
+        :return:
+        """
+
+        self.exited = True
+        self.ws.close()
 
     def __connect(self, ws_url, symbol):
         """
@@ -245,16 +686,8 @@ class NGEWebsocket(object):
             return []
 
         self.logger.info("Authenticating with API Key.")
-        # To auth to the WS using an API key, we generate a signature of
-        # a nonce and
-        # the WS API endpoint.
-        nonce = generate_nonce()
-        return [
-            "api-nonce: " + str(nonce),
-            "api-signature: " + generate_signature(
-                self.api_secret, 'GET', '/realtime', nonce, ''),
-            "api-key:" + self.api_key
-        ]
+        return ["{}: {}".format(name, value) for name, value in
+                generate_auth_headers(self.api_key, self.api_secret)]
 
     def __get_url(self):
         """
@@ -263,31 +696,22 @@ class NGEWebsocket(object):
         Most subscription topics are scoped by the symbol we're listening to.
         :return:
         """
+        subscriptions = list(GENERIC_SUBS)
+        if self.symbol:
+            subscriptions += symbol_topics(self.symbol)
 
-        # You can sub to orderBookL2 for all levels, or orderBook10 for top
-        # 10 levels & save bandwidth
-        symbol_subs = ["execution", "instrument", "order", "orderBookL2",
-                       "position", "quote", "trade"]
-        generic_subs = ["margin"]
-
-        subscriptions = [sub + ':' + self.symbol for sub in symbol_subs]
-        subscriptions += generic_subs
-
-        # noinspection PyUnresolvedReferences
-        url_parts = list(urllib.parse.urlparse(self.endpoint))
-        url_parts[0] = url_parts[0].replace('http', 'ws')
-        url_parts[2] = "/realtime?subscribe={}".format(','.join(subscriptions))
-        # noinspection PyUnresolvedReferences
-        return urllib.parse.urlunparse(url_parts)
+        return realtime_url(self.endpoint, subscriptions)
 
     def __wait_for_account(self):
         """
         On subscribe, this data will come down. Wait for it.
         :return:
         """
+        tables = {'margin', 'position', 'order', 'orderBookL2'} \
+            if self.symbol else set(GENERIC_SUBS)
+
         # Wait for the keys to show up from the ws
-        while not {'margin', 'position', 'order', 'orderBookL2'} <= set(
-                self.data):
+        while not tables <= set(self.data):
             sleep(0.1)
 
     def __wait_for_symbol(self, symbol):
@@ -319,43 +743,12 @@ class NGEWebsocket(object):
         """
 
         try:
-            message = json.loads(message)
+            message = self.decode(message)
         except ValueError as e:
             self.logger.debug(message)
             return
 
-        if 'subscribe' in message:
-            self.logger.debug("Subscribed to %s." % message['subscribe'])
-            return
-
-        table = message.get('table')
-        action = message.get('action')
-
-        if not action:
-            return
-
-        # There are four possible actions from the WS:
-        # 'partial' - full table image
-        # 'insert'  - new row
-        # 'update'  - update row
-        # 'delete'  - delete row
-        action_switch = {
-            "partial": self.partial_handler,
-            "insert": self.insert_handler,
-            "update": self.update_handler,
-            "delete": self.delete_handler
-        }
-
-        try:
-            action_func = action_switch[action]
-        except KeyError as e:
-            self.logger.error("Unknown action: %s" % action)
-            return
-
-        try:
-            action_func(table, message)
-        except Exception as e:
-            self.logger.exception(e)
+        self.handle_message(message)
 
     def __on_error(self, ws, error):
         """
@@ -383,23 +776,3 @@ class NGEWebsocket(object):
         :return:
         """
         self.logger.info('Websocket Closed')
-
-
-# Utility method for finding an item in the store.
-# When an update comes through on the websocket, we need to figure out
-# which item in the array it is
-# in order to match that item.
-#
-# Helpfully, on a data push (or on an HTTP hit to /api/v1/schema),
-# we have a "keys" array. These are the
-# fields we can use to uniquely identify an item.
-# Sometimes there is more than one, so we iterate through all
-# provided keys.
-def find_item_by_keys(keys, table_data, match_data):
-    for item in table_data:
-        matched = True
-        for key in keys:
-            if item[key] != match_data[key]:
-                matched = False
-        if matched:
-            return item
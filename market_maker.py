@@ -15,11 +15,11 @@ from bravado.exception import HTTPNotFound, HTTPBadGateway
 from websocket import WebSocketTimeoutException
 
 from bitmex import bitmex
-from bitmex_websocket import BitMEXWebsocket
 from bravado.exception import HTTPBadRequest, HTTPUnauthorized
 from bravado_core.exception import SwaggerError
 
 from clients.nge import nge, NGEAPIKeyAuthenticator
+from clients.nge_websocket import NGEWebsocket
 from common.utils import path
 
 
@@ -292,13 +292,18 @@ def orderbook_follower(client, symbol, mbl, ws, executor=None):
         p < p_list[-1]["price"]
     }
 
-    market_depth = ws.market_depth()
+    # levels are kept sorted in book, no sorting on every loop
+    top = ws.top_levels(symbol, ORDERBOOK_DEPTH)
 
-    sell = sorted([m for m in market_depth if m["side"] == "Sell"],
-                  key=lambda x: x["price"])[:ORDERBOOK_DEPTH]
+    if top is None or not top.bids or not top.asks:
+        # no orderBookL2 partial yet
+        return
+
+    sell = [{"side": "Sell", "price": price, "size": size}
+            for price, size, _ in top.asks]
 
-    buy = sorted([m for m in market_depth if m["side"] == "Buy"],
-                 key=lambda x: x["price"], reverse=True)[:ORDERBOOK_DEPTH]
+    buy = [{"side": "Buy", "price": price, "size": size}
+           for price, size, _ in top.bids]
 
     # 取消对手方重叠价格
     trim_orders(
@@ -395,8 +400,8 @@ def market_maker(flags, symbol, client, mbl):
     if USE_PROXY:
         os.environ["https_proxy"] = PROXY
 
-    ws = BitMEXWebsocket(endpoint="https://www.bitmex.com/api/v1",
-                         symbol=symbol)
+    ws = NGEWebsocket(endpoint="https://www.bitmex.com/api/v1",
+                      symbol=symbol)
 
     wait_for_data(running=flags[0], ws=ws)
 
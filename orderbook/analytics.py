@@ -0,0 +1,205 @@
+# coding: utf-8
+__all__ = ("BookAnalytics",)
+
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+from typing import Optional
+
+from orderbook.const import Direction, create_enum_by_name
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class BookAnalytics(object):
+    """
+    Depth metrics over an OrderBook, computed on per side arrays of level
+    prices and cumulative sizes / notionals (numpy arrays if numpy is
+    installed, otherwise lists), so metrics are bisections over prefix
+    sums instead of walking price levels.
+
+    Arrays are extracted once on first use, an instance is a snapshot of
+    the book at that moment, create a new one(OrderBook.analytics) for
+    each tick.
+    """
+
+    def __init__(self, book, depth: int = None):
+        """
+        :param book: OrderBook
+        :param depth: levels per side to extract, None for all levels
+        """
+        self._book = book
+        self._depth = depth
+
+        self._arrays = dict()
+
+    @staticmethod
+    def _direction(side) -> Direction:
+        if isinstance(side, Direction):
+            return side
+
+        return create_enum_by_name(Direction, side)
+
+    def arrays(self, side) -> tuple:
+        """
+        Level arrays of one side in price priority
+        :param side: Direction or direction name
+        :return: (prices, sizes, cumulative sizes, cumulative notionals)
+        """
+        side = self._direction(side)
+
+        try:
+            return self._arrays[side]
+        except KeyError:
+            pass
+
+        mbl = self._book[side]
+        levels = mbl.depth_snapshot(
+            mbl.depth if self._depth is None else self._depth)
+
+        prices = [level[0] for level in levels]
+        sizes = [level[1] for level in levels]
+
+        if numpy is not None:
+            prices = numpy.array(prices, dtype=numpy.float64)
+            sizes = numpy.array(sizes, dtype=numpy.int64)
+
+            result = (prices, sizes, numpy.cumsum(sizes),
+                      numpy.cumsum(prices * sizes))
+        else:
+            result = (prices, sizes, list(accumulate(sizes)),
+                      list(accumulate(p * s for p, s in zip(prices, sizes))))
+
+        self._arrays[side] = result
+
+        return result
+
+    @staticmethod
+    def _search(values, value) -> int:
+        """
+        Index of first cumulative value reaching value
+        """
+        if numpy is not None and isinstance(values, numpy.ndarray):
+            return int(numpy.searchsorted(values, value, side="left"))
+
+        return bisect_left(values, value)
+
+    def best_price(self, side) -> Optional[float]:
+        prices = self.arrays(side)[0]
+
+        return float(prices[0]) if len(prices) else None
+
+    def spread(self) -> Optional[float]:
+        bid = self.best_price(Direction.Buy)
+        ask = self.best_price(Direction.Sell)
+
+        if bid is None or ask is None:
+            return None
+
+        return ask - bid
+
+    def mid(self) -> Optional[float]:
+        bid = self.best_price(Direction.Buy)
+        ask = self.best_price(Direction.Sell)
+
+        if bid is None or ask is None:
+            return None
+
+        return (bid + ask) / 2
+
+    def microprice(self) -> Optional[float]:
+        """
+        Best prices weighted by opposite best level size
+        :return: microprice, None if any side is empty
+        """
+        bid_prices, bid_sizes = self.arrays(Direction.Buy)[:2]
+        ask_prices, ask_sizes = self.arrays(Direction.Sell)[:2]
+
+        if not len(bid_prices) or not len(ask_prices):
+            return None
+
+        bid_size = int(bid_sizes[0])
+        ask_size = int(ask_sizes[0])
+
+        return float(bid_prices[0] * ask_size + ask_prices[0] * bid_size) / \
+            (bid_size + ask_size)
+
+    def cumulative_depth(self, side) -> tuple:
+        """
+        Cumulative size through each level of one side
+        :param side: Direction or direction name
+        :return: (prices, cumulative sizes) from best to worst
+        """
+        prices, _, cum_sizes, _ = self.arrays(side)
+
+        return prices, cum_sizes
+
+    def depth_at_price(self, side, price: float) -> int:
+        """
+        Total leaves size of levels at or better than price
+        :param side: Direction or direction name
+        :param price: price limit
+        :return: leaves size
+        """
+        side = self._direction(side)
+        prices, _, cum_sizes, _ = self.arrays(side)
+
+        # ascending keys in priority: Sell prices, negative Buy prices
+        direction = -side.value
+
+        if numpy is not None and isinstance(prices, numpy.ndarray):
+            idx = int(numpy.searchsorted(prices * direction,
+                                         price * direction, side="right"))
+        else:
+            idx = bisect_right([p * direction for p in prices],
+                               price * direction)
+
+        return int(cum_sizes[idx - 1]) if idx else 0
+
+    def vwap(self, side, size: int) -> Optional[float]:
+        """
+        Average price to fill size by a taker order
+        :param side: taker side, Buy takes from Sell levels
+        :param size: quantity to fill
+        :return: vwap, None if depth is insufficient
+        """
+        prices, _, cum_sizes, cum_notionals = self.arrays(
+            self._direction(side).flap())
+
+        if size <= 0 or not len(cum_sizes) or cum_sizes[-1] < size:
+            return None
+
+        idx = self._search(cum_sizes, size)
+
+        filled = int(cum_sizes[idx - 1]) if idx else 0
+        notional = float(cum_notionals[idx - 1]) if idx else 0.0
+
+        return (notional + float(prices[idx]) * (size - filled)) / size
+
+    def impact(self, side, notional: float) -> Optional[tuple]:
+        """
+        Fill notional(price * size) by a taker order
+        :param side: taker side, Buy takes from Sell levels
+        :param notional: notional to fill
+        :return: (filled size, vwap, slippage against best price, positive
+        is worse), None if depth is insufficient
+        """
+        side = self._direction(side)
+
+        prices, _, cum_sizes, cum_notionals = self.arrays(side.flap())
+
+        if notional <= 0 or not len(cum_notionals) or \
+                cum_notionals[-1] < notional:
+            return None
+
+        idx = self._search(cum_notionals, notional)
+
+        filled = int(cum_sizes[idx - 1]) if idx else 0
+        filled_notional = float(cum_notionals[idx - 1]) if idx else 0.0
+
+        size = filled + (notional - filled_notional) / float(prices[idx])
+        vwap = notional / size
+
+        return size, vwap, (vwap - float(prices[0])) * side.value
@@ -1,5 +1,7 @@
 # code: utf-8
 
+import sys
+
 from enum import unique, IntEnum
 
 
@@ -133,11 +135,60 @@ class TimeCondition(IntEnum):
         return self.__str__()
 
 
+class EnumTable(dict):
+    """
+    Precomputed decode table of an enum class, mapping member name, integer
+    value and member itself to the member.
+    """
+
+    def __init__(self, cls):
+        super(EnumTable, self).__init__()
+
+        self.enum_class = cls
+
+        for name, member in getattr(cls, "__members__").items():
+            self[sys.intern(name)] = member
+            self[member.value] = member
+
+    def __missing__(self, key):
+        raise ValueError("invalid {}: {}".format(self.enum_class, key))
+
+
+_ENUM_TABLES = dict()
+
+
+def enum_decoder(cls):
+    """
+    Get decode function of enum class, accepting member name, integer value
+    or member, invalid value will raise ValueError.
+    :param cls: enum class
+    :return: decode function
+    """
+    try:
+        table = _ENUM_TABLES[cls]
+    except KeyError:
+        table = _ENUM_TABLES[cls] = EnumTable(cls)
+
+    return table.__getitem__
+
+
 def create_enum_by_name(cls, name):
     if isinstance(name, str):
-        try:
-            return getattr(cls, "__members__")[name]
-        except KeyError:
-            pass
+        return enum_decoder(cls)(name)
 
     raise ValueError("invalid {}: {}".format(cls, name))
+
+
+@unique
+class EventType(IntEnum):
+    LevelAdded = 1
+    LevelRemoved = 2
+    LevelChanged = 3
+    BestChanged = 4
+    Trade = 5
+
+    def __str__(self):
+        return self.name
+
+    def __repr__(self):
+        return self.__str__()
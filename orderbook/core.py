@@ -1,93 +1,274 @@
 # coding: utf-8
-__all__ = ("OrderBook", "MBL", "PriceLevel", "PriceHeap")
+__all__ = ("OrderBook", "MBL", "PriceLevel", "PriceHeap", "TopLevels")
 
-import heapq
 import sys
+import struct
 
 from os.path import sep
+from bisect import bisect_left, insort
 
-from typing import List, Dict, Optional
-from collections import defaultdict, OrderedDict
-from functools import reduce, wraps
+from typing import List, Dict, Optional, BinaryIO
+from collections import OrderedDict, namedtuple
+from functools import wraps
+from itertools import islice, count
+from time import time
 from weakref import ref, ReferenceType
 
+import msgpack
+
 from orderbook import logger
-from orderbook.const import (Direction, create_enum_by_name)
-from orderbook.utils import normalize_price
-from orderbook.structure import Order
+from orderbook.const import (Direction, EventType, OrderStatus, OrderType,
+                             TimeCondition, create_enum_by_name)
+from orderbook.analytics import BookAnalytics
+from orderbook.events import BookEvent
+from orderbook.utils import PriceNormalizer
+from orderbook.structure import Order, Trade, SCHEMA_VERSION
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 class PriceHeap(object):
-    def __init__(self, direction: Direction):
-        self._direction = -direction.value
+    """
+    Price index for one side of the book.
+
+    Prices (or integer tick counts, see OrderBook.price_key) are kept as
+    priority keys (price * direction) in an ascending sorted array, so
+    the best price always sits at the tail and the worst price at the
+    head. Push and remove locate their slot by bisection, pop of the best
+    price is O(1) and top(n) is a tail slice.
+    """
 
-        self._worst_price = None
+    def __init__(self, direction: Direction):
+        self._direction = direction.value
 
-        self._heap = list()
+        self._keys = list()
 
     @property
     def best_price(self) -> float:
-        if self._heap:
-            return self._heap[0] * self._direction
+        if self._keys:
+            return self._keys[-1] * self._direction
 
-        if self._direction > 0:
+        if self._direction < 0:
             return sys.float_info.max
         else:
             return 0.0
 
     @property
     def worst_price(self) -> float:
-        if self._worst_price is not None:
-            return self._worst_price * self._direction
+        if self._keys:
+            return self._keys[0] * self._direction
 
-        if self._direction > 0:
+        if self._direction < 0:
             return 0.0
         else:
             return sys.float_info.max
 
     def push(self, price: float):
-        price = self._direction * price
+        insort(self._keys, price * self._direction)
 
-        if self._worst_price is None or price > self._worst_price:
-            self._worst_price = price
+    def extend(self, prices):
+        """
+        Push prices in batch, sorting only once
+        """
+        direction = self._direction
 
-        heapq.heappush(self._heap, price)
+        self._keys.extend(price * direction for price in prices)
+        self._keys.sort()
 
     def pop(self) -> float:
-        return self._direction * heapq.heappop(self._heap)
+        return self._keys.pop() * self._direction
+
+    def pop_through(self, price: float) -> List[float]:
+        """
+        Pop all prices at or better than price
+        :param price: cross price
+        :return: popped prices, from best to worst
+        """
+        idx = bisect_left(self._keys, price * self._direction)
+
+        popped = self._keys[idx:]
+        del self._keys[idx:]
+
+        direction = self._direction
+
+        return [key * direction for key in reversed(popped)]
 
     def remove(self, price: float):
-        try:
-            self._heap.remove(price * self._direction)
-        except ValueError as e:
-            logger.warning(e)
+        key = price * self._direction
+
+        idx = bisect_left(self._keys, key)
+
+        if idx >= len(self._keys) or self._keys[idx] != key:
+            logger.warning(
+                "price[{}] not exists in price heap.".format(price))
             return
 
-        heapq.heapify(self._heap)
+        del self._keys[idx]
 
     def top(self, n: int = 25) -> List[float]:
-        n = min(n, len(self._heap))
+        if n <= 0:
+            return []
+
+        direction = self._direction
 
-        return [p * self._direction for p in heapq.nsmallest(n, self._heap)]
+        return [k * direction for k in self._keys[:-n - 1:-1]]
 
     def top_price(self, price: float):
         pass
 
     def __getitem__(self, item):
-        return self._heap[item] * self._direction
+        return self._keys[-1 - item] * self._direction
+
+    def __iter__(self):
+        """
+        Iterate prices in priority, from best to worst
+        """
+        direction = self._direction
+
+        for key in reversed(self._keys):
+            yield key * direction
 
     def __len__(self):
-        return len(self._heap)
+        return len(self._keys)
 
     def __bool__(self):
-        if self._heap:
+        if self._keys:
             return True
 
         return False
 
 
+class TopLevels(namedtuple("TopLevels", ("bids", "asks"))):
+    """
+    Best levels of both sides, each side is a list of
+    (price, leaves size, order count) in price priority.
+    """
+
+    __slots__ = ()
+
+    def to_array(self, n: int = None):
+        """
+        Convert to numpy array in shape (2, n, 3), bids first, missing
+        levels are padded with zeros
+        :param n: level count, default to the deeper side's
+        :return: numpy.ndarray of float64
+        :raise ImportError
+        """
+        if numpy is None:
+            raise ImportError("numpy is required to convert top levels.")
+
+        if n is None:
+            n = max(len(self.bids), len(self.asks))
+
+        result = numpy.zeros((2, n, 3), dtype=numpy.float64)
+
+        for idx, levels in enumerate(self):
+            levels = levels[:n]
+
+            if levels:
+                result[idx, :len(levels)] = levels
+
+        return result
+
+
+# magic, schema version, body length
+_DUMP_HEADER = struct.Struct("<4sHQ")
+_DUMP_MAGIC = b"OBKS"
+
+
+# method name -> (watch, trades), see _publish_changes
+_PUBLISHED_METHODS = dict()
+
+
+def _publish_changes(watch, trades=False):
+    """
+    Mark OrderBook mutation to publish level / best / trade events.
+    Method itself is unchanged, publishing wrapper is installed on instance
+    only while listener subscribed, so it costs nothing without listener.
+    :param watch: watch(book, *args, **kwargs) -> {side: level keys or None}
+    before mutation, None means all levels of the side
+    :param trades: publish returned trades
+    """
+
+    def decorator(func):
+        _PUBLISHED_METHODS[func.__name__] = (watch, trades)
+
+        return func
+
+    return decorator
+
+
+def _watch_all(book, *args, **kwargs):
+    return {Direction.Buy: None, Direction.Sell: None}
+
+
+def _watch_order(book, order):
+    return {order.side: [book.price_key(order.price)]}
+
+
+def _watch_order_id(book, order_id, qty=None, price=None,
+                    keep_priority=False):
+    try:
+        direction, level = book._order_price_index_map[order_id]
+    except KeyError:
+        return {}
+
+    keys = [level.level_key]
+
+    if price is not None:
+        keys.append(book.price_key(price))
+
+    return {direction: keys}
+
+
+def _watch_submit(book, order):
+    side = order.side
+    counterparty = book._counterparty_mbl[side]
+
+    limit_key = None
+
+    if order.ordType == OrderType.Limit:
+        limit_key = book.price_key(order.price)
+
+    # counterparty levels may be matched, then remained may rest in limit
+    keys = list()
+    watched = {counterparty.direction: keys,
+               side: [limit_key] if limit_key is not None else []}
+
+    remained = order.leavesQty
+    direction = side.value
+
+    for key in counterparty.iter_keys():
+        if remained <= 0 or (limit_key is not None and
+                             (key - limit_key) * direction > 0):
+            break
+
+        keys.append(key)
+        remained -= counterparty.level_by_key(key).leaves_size
+
+    return watched
+
+
+def _watch_overlap(book, price):
+    direction = book.get_price_direction(price)
+
+    return {direction: None} if direction is not None else {}
+
+
 class OrderBook(object):
-    def __init__(self, symbol: str, tick_price: float, max_depth=-1):
+    def __init__(self, symbol: str, tick_price: float, max_depth=-1,
+                 integer_ticks=False):
+        """
+        :param symbol: instrument symbol
+        :param tick_price: minimum price increment
+        :param max_depth: max level depth, -1 means unlimited
+        :param integer_ticks: if True, prices are converted to integer
+        tick counts when entering the book, and levels are indexed by
+        tick count instead of normalized float price.
+        """
         self._symbol = symbol
 
         if not isinstance(tick_price, float):
@@ -96,15 +277,30 @@ class OrderBook(object):
 
         self._tick_price = tick_price
 
+        self._normalizer = PriceNormalizer(tick_price)
+
         self._max_depth = max_depth
 
+        self._integer_ticks = integer_ticks
+
         self._mbl = {
             Direction.Sell: MBL(direction=Direction.Sell, orderbook=self),
             Direction.Buy: MBL(direction=Direction.Buy, orderbook=self)
         }
 
+        self._counterparty_mbl = {
+            Direction.Sell: self._mbl[Direction.Buy],
+            Direction.Buy: self._mbl[Direction.Sell]
+        }
+
+        # orderID -> (direction, price level) of resting orders
         self._order_price_index_map = dict()
 
+        self._match_sequence = count(1)
+
+        self._listeners = list()
+        self._publishing = False
+
     @property
     def symbol(self) -> str:
         return self._symbol
@@ -117,6 +313,37 @@ class OrderBook(object):
     def max_depth(self) -> int:
         return self._max_depth
 
+    @property
+    def integer_ticks(self) -> bool:
+        return self._integer_ticks
+
+    @property
+    def normalizer(self) -> PriceNormalizer:
+        return self._normalizer
+
+    def price_key(self, price: float):
+        """
+        Convert price to level index key
+        :param price: origin price
+        :return: tick count in integer ticks mode, otherwise normalized price
+        :rtype Union[int, float]
+        """
+        if self._integer_ticks:
+            return self._normalizer.ticks(price)
+
+        return self._normalizer.normalize(price)
+
+    def key_price(self, key) -> float:
+        """
+        Convert level index key back to float price
+        :param key: level index key
+        :return: level price
+        """
+        if self._integer_ticks:
+            return self._normalizer.price(key)
+
+        return key
+
     @property
     def buy_mbl(self):
         """
@@ -131,6 +358,367 @@ class OrderBook(object):
         """
         return self._mbl[Direction.Sell]
 
+    def subscribe(self, listener):
+        """
+        Subscribe orderbook events, listener is called with BookEvent
+        after each mutation, e.g. an EventRing.
+        :param listener: callable(BookEvent)
+        :return: listener
+        """
+        if not self._listeners:
+            for name, (watch, trades) in _PUBLISHED_METHODS.items():
+                setattr(self, name, self.__publisher(
+                    getattr(self, name), watch, trades))
+
+        self._listeners.append(listener)
+
+        return listener
+
+    def unsubscribe(self, listener):
+        """
+        Unsubscribe orderbook events
+        :param listener: subscribed listener
+        :raise ValueError
+        """
+        self._listeners.remove(listener)
+
+        if not self._listeners:
+            for name in _PUBLISHED_METHODS:
+                delattr(self, name)
+
+    def __publisher(self, method, watch, trades):
+        @wraps(method)
+        def wrapper(*args, **kwargs):
+            # nested mutations are covered by outermost one
+            if self._publishing:
+                return method(*args, **kwargs)
+
+            self._publishing = True
+
+            try:
+                watched = watch(self, *args, **kwargs)
+                before = self._capture(watched)
+
+                result = method(*args, **kwargs)
+
+                self._publish(watched, before, result if trades else ())
+            finally:
+                self._publishing = False
+
+            return result
+
+        return wrapper
+
+    def _capture(self, watched) -> tuple:
+        """
+        Capture watched levels' state and best levels' state
+        :param watched: {side: level keys or None(all levels)}
+        :return: (level states, best states)
+        """
+        levels = dict()
+
+        for side, keys in watched.items():
+            mbl = self._mbl[side]
+
+            for key in (mbl.iter_keys() if keys is None else keys):
+                levels[side, key] = mbl.level_state(key)
+
+        best = {side: mbl.level_state(mbl.best_key)
+                for side, mbl in self._mbl.items()}
+
+        return levels, best
+
+    def _publish(self, watched, before, trades):
+        levels_before, best_before = before
+        levels_after, best_after = self._capture(watched)
+
+        events = [BookEvent(EventType.Trade, trade.side, trade.price,
+                            trade.size, 1, trade) for trade in trades]
+
+        for (side, key), state in levels_after.items():
+            previous = levels_before.pop((side, key), None)
+
+            if state == previous:
+                continue
+
+            if state is None:
+                events.append(BookEvent(EventType.LevelRemoved, side,
+                                        *previous[:1], 0, 0))
+            elif previous is None:
+                events.append(BookEvent(EventType.LevelAdded, side, *state))
+            else:
+                events.append(BookEvent(EventType.LevelChanged, side,
+                                        *state))
+
+        # levels only exist before, e.g. side is cleared
+        for (side, key), previous in levels_before.items():
+            if previous is not None:
+                events.append(BookEvent(EventType.LevelRemoved, side,
+                                        *previous[:1], 0, 0))
+
+        for side, state in best_after.items():
+            if state != best_before[side]:
+                events.append(BookEvent(EventType.BestChanged, side,
+                                        *(state or (None, 0, 0))))
+
+        for listener in tuple(self._listeners):
+            for event in events:
+                try:
+                    listener(event)
+                except Exception as e:
+                    logger.exception(e)
+
+    @_publish_changes(_watch_order)
+    def add_order(self, order: Order) -> int:
+        """
+        Add order to mbl of its side
+        :param order: Order
+        :return: order index in its price level
+        :raise ValueError
+        """
+        if order["orderID"] in self._order_price_index_map:
+            raise ValueError(
+                "order[{}] already exists.".format(order["orderID"]))
+
+        return self._mbl[order["side"]].add_order(order)
+
+    @_publish_changes(_watch_all)
+    def load_snapshot(self, rows) -> int:
+        """
+        Rebuild orderbook from L2 snapshot rows, such as orderBookL2
+        partial data: {"id": .., "side": .., "size": .., "price": ..}.
+        Each row becomes one order with row's id as orderID, rows without
+        size are skipped, existing levels will be cleared before loading.
+        :param rows: iterable of snapshot rows
+        :return: loaded row count
+        :raise ValueError
+        """
+        self.clear()
+
+        orders = {Direction.Buy: list(), Direction.Sell: list()}
+
+        for row in rows:
+            if not row["size"]:
+                continue
+
+            side = create_enum_by_name(Direction, row["side"])
+
+            orders[side].append(Order(
+                orderID=str(row["id"]), symbol=self._symbol,
+                side=row["side"], orderQty=row["size"] * side.value,
+                price=row["price"]))
+
+        return sum(self._mbl[side].add_orders(side_orders)
+                   for side, side_orders in orders.items())
+
+    @_publish_changes(_watch_all)
+    def clear(self):
+        """
+        Remove all levels and orders in orderbook
+        """
+        for mbl in self._mbl.values():
+            mbl.clear()
+
+        self._order_price_index_map.clear()
+
+    def get_order(self, order_id: str) -> Optional[Order]:
+        """
+        Get resting order by its orderID
+        :param order_id: order id
+        :return: order or None(if order not exist)
+        """
+        try:
+            _, level = self._order_price_index_map[order_id]
+        except KeyError:
+            return None
+
+        return level.get_order(order_id)
+
+    @_publish_changes(_watch_order_id)
+    def cancel(self, order_id: str) -> Order:
+        """
+        Cancel resting order by its orderID
+        :param order_id: order id
+        :return: canceled order
+        :raise ValueError
+        """
+        try:
+            _, level = self._order_price_index_map[order_id]
+        except KeyError:
+            raise ValueError("order[{}] not exists.".format(order_id))
+
+        return level.remove_order_by_id(order_id)
+
+    @_publish_changes(_watch_order_id)
+    def amend(self, order_id: str, qty: int = None,
+              price: float = None, keep_priority: bool = False) -> Order:
+        """
+        Amend resting order's quantity or price.
+        Order keeps its time priority only if price is unchanged
+        and quantity is not increased(or keep_priority is True, e.g.
+        aggregated L2 levels), otherwise it's re-queued
+        at the end of the new price level.
+        If amended quantity is not greater than filled quantity,
+        order will be canceled.
+        :param order_id: order id
+        :param qty: new order quantity
+        :param price: new order price
+        :param keep_priority: keep time priority on quantity increase
+        :return: amended order
+        :raise ValueError
+        """
+        try:
+            direction, level = self._order_price_index_map[order_id]
+        except KeyError:
+            raise ValueError("order[{}] not exists.".format(order_id))
+
+        order = level.get_order(order_id)
+
+        order_qty = order["orderQty"] if qty is None else abs(qty)
+        leaves_qty = order["leavesQty"] + order_qty - order["orderQty"]
+
+        if leaves_qty <= 0:
+            return level.remove_order_by_id(order_id)
+
+        if price is None or self.price_key(price) == level.level_key:
+            if keep_priority or order_qty <= order["orderQty"]:
+                order["orderQty"] = order_qty
+                order["leavesQty"] = leaves_qty
+
+                level.modify_order(order)
+
+                return order
+
+            price = order["price"]
+
+        level.remove_order_by_id(order_id)
+
+        order["orderQty"] = order_qty
+        order["leavesQty"] = leaves_qty
+        order["price"] = price
+
+        self._mbl[direction].add_order(order)
+
+        return order
+
+    @_publish_changes(_watch_submit, trades=True)
+    def submit(self, order: Order) -> List[Trade]:
+        """
+        Match incoming order against counterparty mbl level by level,
+        in price then time priority.
+        Market order crosses without price limit and never rests,
+        limit order crosses up to its price and rests remained quantity
+        unless its time condition is ImmediateOrCancel or FillOrKill.
+        FillOrKill order is killed without any fill if liquidity within
+        its limit price is insufficient.
+        Incoming and matched orders' leavesQty, cumQty and ordStatus
+        will be updated.
+        :param order: incoming order
+        :return: trade list, one trade for each matched resting order
+        :raise ValueError
+        """
+        order_id = order.orderID
+
+        if order_id in self._order_price_index_map:
+            raise ValueError("order[{}] already exists.".format(order_id))
+
+        order_type = order.ordType
+        time_condition = order.timeInForce
+
+        if order_type == OrderType.Market:
+            limit_key = None
+        elif order_type == OrderType.Limit:
+            limit_key = self.price_key(order.price)
+        else:
+            raise ValueError(
+                "order[{}]'s type[{}] is not supported.".format(
+                    order_id, order_type))
+
+        side = order.side
+        direction = side.value
+        counterparty = self._counterparty_mbl[side]
+
+        remained = order.leavesQty
+
+        if (time_condition == TimeCondition.FillOrKill and
+                counterparty.leaves_through(limit_key) < remained):
+            order.ordStatus = OrderStatus.Canceled
+
+            return []
+
+        trades = list()
+        timestamp = time() * 1000
+        taker_side = side.name
+        cum_qty = order.cumQty
+        notional = order.avgPx * cum_qty
+
+        while remained > 0:
+            best_key = counterparty.best_key
+
+            if best_key is None or (limit_key is not None and
+                                    (best_key - limit_key) * direction > 0):
+                break
+
+            level = counterparty.best_level
+            price = level.level_price
+
+            remained, fills = level.match_volume(remained)
+
+            for maker, qty in fills:
+                maker.cumQty += qty
+                maker.ordStatus = (OrderStatus.PartiallyFilled
+                                   if maker.leavesQty else
+                                   OrderStatus.Filled)
+
+                cum_qty += qty
+                notional += price * qty
+
+                trades.append(Trade(
+                    symbol=self._symbol, timestamp=timestamp,
+                    side=taker_side, size=qty, price=price,
+                    trdMatchID=str(next(self._match_sequence))))
+
+        order.leavesQty = remained
+        order.cumQty = cum_qty
+
+        if cum_qty:
+            order.avgPx = notional / cum_qty
+
+        if not remained:
+            order.ordStatus = OrderStatus.Filled
+        elif (limit_key is None or
+              time_condition in (TimeCondition.ImmediateOrCancel,
+                                 TimeCondition.FillOrKill)):
+            order.ordStatus = (OrderStatus.PartiallyFilledCanceled
+                               if cum_qty else OrderStatus.Canceled)
+        else:
+            if cum_qty:
+                order.ordStatus = OrderStatus.PartiallyFilled
+
+            self._mbl[side].add_order(order)
+
+        return trades
+
+    def top_levels(self, n: int = 25) -> TopLevels:
+        """
+        Get best n levels of both sides, price index is kept sorted
+        while levels are added or removed, so it costs O(n) instead of
+        scanning the whole book
+        :param n: level count per side
+        :return: TopLevels
+        """
+        return TopLevels(self._mbl[Direction.Buy].depth_snapshot(n),
+                         self._mbl[Direction.Sell].depth_snapshot(n))
+
+    def analytics(self, depth: int = None) -> BookAnalytics:
+        """
+        Snapshot analytics(mid, microprice, vwap, market impact ...) over
+        price / cumulative size arrays of current levels
+        :param depth: levels per side to include, None for all levels
+        :return: BookAnalytics
+        """
+        return BookAnalytics(self, depth=depth)
+
     def get_price_direction(self, price) -> Optional[Direction]:
         if price >= self.sell_mbl.best_price:
             return Direction.Sell
@@ -143,17 +731,101 @@ class OrderBook(object):
     def in_gap(self, price: float) -> bool:
         return self.buy_mbl.best_price < price < self.sell_mbl.best_price
 
+    @_publish_changes(_watch_overlap)
     def overlap_levels(self, price) -> (Optional[Direction], list):
+        """
+        Pop all levels overlapped by price in one pass
+        :param price: cross price
+        :return: overlapped side(None if price is in gap),
+        popped levels in price priority
+        """
         direction = self.get_price_direction(price)
-        overlapped = list()
 
-        while not self.in_gap(price):
-            level = self._mbl[direction].pop_level()
+        if direction is None:
+            return None, []
 
-            if level:
-                overlapped.append(level)
+        return direction, self._mbl[direction].pop_levels_through(price)
 
-        return direction, overlapped
+    def dump(self, stream: BinaryIO) -> int:
+        """
+        Write binary checkpoint of orderbook into stream, layout:
+        header(magic, schema version, body length) + msgpack body of
+        book info and resting orders(see Order.to_row, prices as ticks),
+        orders are written side by side in price / time priority.
+        :param stream: writable binary stream
+        :return: dumped order count
+        """
+        packer = msgpack.Packer(use_bin_type=True)
+        tick_price = self._tick_price
+
+        chunks = [packer.pack({
+            "symbol": self._symbol, "tick_price": tick_price,
+            "max_depth": self._max_depth,
+            "integer_ticks": self._integer_ticks,
+            "orders": len(self._order_price_index_map)})]
+
+        for mbl in (self._mbl[Direction.Buy], self._mbl[Direction.Sell]):
+            for level in mbl.iter_levels():
+                chunks.extend(packer.pack(order.to_row(tick_price))
+                              for order in level)
+
+        stream.write(_DUMP_HEADER.pack(_DUMP_MAGIC, SCHEMA_VERSION,
+                                       sum(map(len, chunks))))
+        stream.writelines(chunks)
+
+        return len(chunks) - 1
+
+    @classmethod
+    def load(cls, stream: BinaryIO) -> "OrderBook":
+        """
+        Create orderbook from checkpoint written by dump, stream is read
+        exactly to the end of checkpoint.
+        :param stream: readable binary stream
+        :return: OrderBook
+        :raise ValueError
+        """
+        header = stream.read(_DUMP_HEADER.size)
+
+        if len(header) != _DUMP_HEADER.size:
+            raise ValueError("incomplete orderbook checkpoint header.")
+
+        magic, version, length = _DUMP_HEADER.unpack(header)
+
+        if magic != _DUMP_MAGIC:
+            raise ValueError("invalid orderbook checkpoint.")
+
+        if version != SCHEMA_VERSION:
+            raise ValueError("unsupported schema version: {}".format(version))
+
+        body = stream.read(length)
+
+        if len(body) != length:
+            raise ValueError("incomplete orderbook checkpoint body.")
+
+        unpacker = msgpack.Unpacker(raw=False, max_buffer_size=length or 1)
+        unpacker.feed(body)
+
+        info = next(unpacker)
+        tick_price = info["tick_price"]
+
+        book = cls(symbol=info["symbol"], tick_price=tick_price,
+                   max_depth=info["max_depth"],
+                   integer_ticks=info["integer_ticks"])
+
+        orders = {Direction.Buy: list(), Direction.Sell: list()}
+
+        for row in unpacker:
+            order = Order.from_row(row, tick_price)
+            orders[order.side].append(order)
+
+        loaded = sum(book._mbl[side].add_orders(side_orders)
+                     for side, side_orders in orders.items())
+
+        if loaded != info["orders"]:
+            raise ValueError("order count mis-match, {} expected, got {}"
+                             .format(info["orders"], loaded))
+
+        return book
 
     def __getitem__(self, item):
         """
@@ -188,8 +860,7 @@ class MBL(object):
 
         self._price_heap = PriceHeap(direction=direction)
 
-        self._level_cache = defaultdict(
-            lambda: PriceLevel(price=0.0, mbl=self))
+        self._level_cache = dict()
 
     def __check_depth(self):
         assert len(self._level_cache) == len(self._price_heap), \
@@ -217,6 +888,10 @@ class MBL(object):
     def direction(self) -> Direction:
         return self._direction
 
+    @property
+    def orderbook(self) -> OrderBook:
+        return self._orderbook
+
     @property
     def best_price(self) -> float:
         """
@@ -225,6 +900,21 @@ class MBL(object):
         :raise RuntimeError
         """
 
+        if not self._price_heap:
+            return self._price_heap.best_price
+
+        return self._orderbook.key_price(self._price_heap.best_price)
+
+    @property
+    def best_key(self):
+        """
+        Get best level's index key
+        :return: level key, None if mbl is empty
+        """
+
+        if not self._price_heap:
+            return None
+
         return self._price_heap.best_price
 
     @property
@@ -238,7 +928,10 @@ class MBL(object):
         :raise RuntimeError
         """
 
-        return self._level_cache.get(self.best_price, None)
+        if not self._price_heap:
+            return None
+
+        return self._level_cache.get(self._price_heap.best_price, None)
 
     @property
     def depth(self) -> int:
@@ -252,6 +945,44 @@ class MBL(object):
 
         return 0
 
+    def iter_keys(self):
+        """
+        Iterate level keys from best to worst
+        :return: iterator of level key
+        """
+        return iter(self._price_heap)
+
+    def level_by_key(self, key):
+        """
+        Get price level by level key(see OrderBook.price_key)
+        :param key: level key
+        :return: price level or None
+        """
+        return self._level_cache.get(key)
+
+    def level_state(self, key) -> Optional[tuple]:
+        """
+        Get state of level by level key
+        :param key: level key
+        :return: (price, leaves size, order count), None if level not exist
+        """
+        level = self._level_cache.get(key)
+
+        if level is None:
+            return None
+
+        return level.level_price, level.leaves_size, level.count
+
+    def iter_levels(self):
+        """
+        Iterate price levels from best to worst
+        :return: iterator of PriceLevel
+        """
+        levels = self._level_cache
+
+        for key in self._price_heap:
+            yield levels[key]
+
     def append_level(self, level):
         """
         Append exist price level to current mbl
@@ -262,7 +993,9 @@ class MBL(object):
             raise ValueError(
                 "invalid level price[{}]".format(level.level_price))
 
-        if level.level_price in self._level_cache:
+        key = self._orderbook.price_key(level.level_price)
+
+        if key in self._level_cache:
             raise ValueError("level with price[{}] already exists.".format(
                 level.level_price))
 
@@ -273,8 +1006,19 @@ class MBL(object):
         else:
             level.mbl = self
 
-        self._level_cache[level.level_price] = level
-        self._price_heap.push(level.level_price)
+        self.__insert_level(key, level)
+
+    def __insert_level(self, key, level):
+        self.__attach_level(key, level)
+
+        self._price_heap.push(key)
+
+    def __attach_level(self, key, level):
+        level._key = key
+        level._mbl = self
+        level._index = self._orderbook._order_price_index_map
+
+        self._level_cache[key] = level
 
     def delete_level(self, price):
         """
@@ -284,29 +1028,114 @@ class MBL(object):
         :rtype Optional(PriceLevel)
         """
 
-        if price not in self._level_cache:
-            return None
+        return self.discard_level(self._orderbook.price_key(price))
+
+    def discard_level(self, key):
+        """
+        Delete a price level by level index key
+        :param key: level index key
+        :return: price level
+        :rtype Optional(PriceLevel)
+        """
+
+        level = self._level_cache.pop(key, None)
 
-        level = self._level_cache.pop(price)
+        if level is not None:
+            self._price_heap.remove(key)
 
-        self._price_heap.remove(price)
+            self.__detach_level(level)
 
         return level
 
-    def add_order(self, order: Order) -> int:
+    @staticmethod
+    def __detach_level(level):
+        if level._index is not None:
+            for order_id in level._order_cache:
+                level._index.pop(order_id, None)
+
+        level._key = None
+        level._mbl = None
+        level._index = None
+
+    def __verify_order_side(self, order):
         if order["side"] != self._direction:
             raise ValueError(
-                "order[{}]'s direction[{}] mis-match with current mbl[]"
+                "order[{}]'s direction[{}] mis-match with current mbl[{}]"
                 .format(order["orderID"], order["side"], self._direction))
 
-        normalized_price = normalize_price(order["price"],
-                                           self._orderbook.tick_price)
-        order.price = normalized_price
+    def add_order(self, order: Order) -> int:
+        self.__verify_order_side(order)
+
+        key = self._orderbook.price_key(order["price"])
+        order.price = self._orderbook.key_price(key)
+
+        level = self._level_cache.get(key)
+
+        if level is None:
+            level = PriceLevel(price=order.price)
+            self.__insert_level(key, level)
 
-        if normalized_price not in self._level_cache:
-            self._price_heap.push(normalized_price)
+        return level.push_order(order)
+
+    def add_orders(self, orders) -> int:
+        """
+        Add orders in batch, orders are grouped by price first,
+        then new levels are created in bulk and price index is
+        sorted only once for all of them.
+        :param orders: iterable of Order
+        :return: added order count
+        :raise ValueError
+        """
+        price_key = self._orderbook.price_key
+        direction = self._direction
+
+        grouped = dict()
+
+        for order in orders:
+            if order.side != direction:
+                self.__verify_order_side(order)
+
+            key = price_key(order.price)
+
+            level_orders = grouped.get(key)
+
+            if level_orders is None:
+                grouped[key] = [order]
+            else:
+                level_orders.append(order)
+
+        key_price = self._orderbook.key_price
+        level_cache = self._level_cache
+
+        new_keys = list()
+        added = 0
+
+        try:
+            for key, level_orders in grouped.items():
+                level = level_cache.get(key)
 
-        return self._level_cache[normalized_price].push_order(order)
+                if level is None:
+                    level = PriceLevel(price=key_price(key))
+                    self.__attach_level(key, level)
+                    new_keys.append(key)
+
+                price = level.level_price
+                for order in level_orders:
+                    order.price = price
+
+                added += level.push_orders(level_orders)
+        finally:
+            self._price_heap.extend(new_keys)
+
+        return added
+
+    def clear(self):
+        """
+        Remove all levels in mbl
+        """
+        while self._price_heap:
+            self.__detach_level(
+                self._level_cache.pop(self._price_heap.pop()))
 
     def trade_volume(self, volume: int) -> (int, Dict[float,
                                                       List[ReferenceType]]):
@@ -328,10 +1157,58 @@ class MBL(object):
         :return: PriceLevel
         :rtype Optional(PriceLevel)
         """
-        if self.__check_depth():
+        if not self.__check_depth():
             return None
 
-        return self._level_cache.pop(self._price_heap.pop())
+        level = self._level_cache.pop(self._price_heap.pop())
+
+        self.__detach_level(level)
+
+        return level
+
+    def pop_levels_through(self, price) -> List:
+        """
+        Pop all levels priced at or better than price
+        :param price: cross price
+        :return: popped levels in price priority
+        :rtype List[PriceLevel]
+        """
+        levels = [self._level_cache.pop(key) for key in
+                  self._price_heap.pop_through(
+                      self._orderbook.price_key(price))]
+
+        for level in levels:
+            self.__detach_level(level)
+
+        return levels
+
+    def leaves_through(self, key=None) -> int:
+        """
+        Get total leaves quantity of levels priced at or better than key
+        :param key: level index key, None for all levels
+        :return: leaves quantity
+        """
+        total = 0
+        direction = self._direction.value
+
+        for level_key in self._price_heap:
+            if key is not None and (key - level_key) * direction > 0:
+                break
+
+            total += self._level_cache[level_key].leaves_size
+
+        return total
+
+    def depth_snapshot(self, n: int = 25) -> List[tuple]:
+        """
+        Get aggregated snapshot of best n levels in price priority
+        :param n: level count
+        :return: list of (price, leaves size, order count)
+        """
+        # level internals are read directly, it's called on every tick
+        return [(level._price, level._leaves_size, len(level._order_cache))
+                for level in map(self._level_cache.__getitem__,
+                                 self._price_heap.top(n))]
 
     def __contains__(self, price):
         """
@@ -339,9 +1216,7 @@ class MBL(object):
         :param price:
         :return: exists
         """
-        price = normalize_price(price, self._orderbook.tick_price)
-
-        return price in self._level_cache
+        return self._orderbook.price_key(price) in self._level_cache
 
     def __getitem__(self, price):
         """
@@ -351,12 +1226,148 @@ class MBL(object):
         :rtype PriceLevel
         """
 
-        price = normalize_price(price, self._orderbook.tick_price)
+        return self._level_cache.get(self._orderbook.price_key(price), None)
 
-        if price in self._level_cache:
-            return self._level_cache[price]
 
-        return None
+class _FenwickTree(object):
+    """
+    Binary indexed tree over positions [0, size),
+    supporting point update and prefix sum in O(log n).
+    """
+
+    __slots__ = ("_tree",)
+
+    def __init__(self, values=None, size: int = 0):
+        if values is None:
+            self._tree = [0] * (size + 1)
+            return
+
+        tree = [0]
+        tree.extend(values)
+
+        size = len(tree)
+        for idx in range(1, size):
+            parent = idx + (idx & -idx)
+            if parent < size:
+                tree[parent] += tree[idx]
+
+        self._tree = tree
+
+    def add(self, pos: int, delta):
+        tree = self._tree
+        size = len(tree)
+
+        pos += 1
+        while pos < size:
+            tree[pos] += delta
+            pos += pos & -pos
+
+    def prefix(self, pos: int):
+        """
+        Sum of values in [0, pos)
+        """
+        tree = self._tree
+        total = 0
+
+        while pos > 0:
+            total += tree[pos]
+            pos -= pos & -pos
+
+        return total
+
+    def search(self, target):
+        """
+        Find smallest position whose inclusive prefix sum reaches target,
+        values must be non-negative.
+        """
+        tree = self._tree
+        size = len(tree)
+
+        pos = 0
+        step = 1 << (size - 1).bit_length()
+
+        while step:
+            nxt = pos + step
+            if nxt < size and tree[nxt] < target:
+                pos = nxt
+                target -= tree[nxt]
+            step >>= 1
+
+        return pos
+
+
+class _QueueIndex(object):
+    """
+    Time priority index of orders in a price level.
+    Every order gets an increasing sequence number on entering the queue,
+    and two fenwick trees over sequence numbers keep live order count and
+    leaves quantity, so rank and volume ahead of any order are O(log n).
+    Sequence numbers are compacted when capacity is exhausted.
+    """
+
+    _MIN_CAPACITY = 16
+
+    def __init__(self, orders):
+        """
+        :param orders: iterable of (order_id, state) in time priority
+        """
+        self.rebuild(orders)
+
+    def rebuild(self, orders):
+        """
+        Renumber live orders from zero
+        :param orders: iterable of (order_id, state) in time priority,
+        state's last item is sequence number which will be updated
+        """
+        orders = list(orders)
+
+        capacity = max(self._MIN_CAPACITY, len(orders) * 2)
+
+        seq_orders = [None] * capacity
+        counts = [0] * capacity
+        leaves = [0] * capacity
+
+        for seq, (order_id, state) in enumerate(orders):
+            state[-1] = seq
+            seq_orders[seq] = order_id
+            counts[seq] = 1
+            leaves[seq] = state[1]
+
+        self._next_seq = len(orders)
+        self._seq_orders = seq_orders
+        self._counts = _FenwickTree(counts)
+        self._leaves = _FenwickTree(leaves)
+
+    def full(self) -> bool:
+        return self._next_seq >= len(self._seq_orders)
+
+    def push(self, order_id: str, leaves_qty) -> int:
+        seq = self._next_seq
+        self._next_seq += 1
+
+        self._seq_orders[seq] = order_id
+        self._counts.add(seq, 1)
+        self._leaves.add(seq, leaves_qty)
+
+        return seq
+
+    def remove(self, seq: int, leaves_qty):
+        self._seq_orders[seq] = None
+        self._counts.add(seq, -1)
+        self._leaves.add(seq, -leaves_qty)
+
+    def update_leaves(self, seq: int, delta):
+        if delta:
+            self._leaves.add(seq, delta)
+
+    def rank(self, seq: int) -> int:
+        return self._counts.prefix(seq)
+
+    def volume_before(self, seq: int):
+        return self._leaves.prefix(seq)
+
+    def select(self, idx: int) -> str:
+        return self._seq_orders[self._counts.search(idx + 1)]
 
 
 def _price_level_depth_checker(func):
@@ -364,8 +1375,8 @@ def _price_level_depth_checker(func):
     def depth_checker(self, *args, **kwargs):
         result = func(self, *args, **kwargs)
 
-        if self.count <= 0 and self._mbl:
-            self._mbl.delete_level(self.level_price)
+        if self.count <= 0 and self._mbl and self._key is not None:
+            self._mbl.discard_level(self._key)
 
         return result
 
@@ -375,28 +1386,52 @@ def _price_level_depth_checker(func):
 class PriceLevel(object):
     def __init__(self, price: float = 0.0, mbl: MBL = None):
         self._price = price
+        self._key = None
         self._mbl = mbl
+        self._index = None
 
         self._order_cache = OrderedDict()
 
+        # orderID -> [orderQty, leavesQty, sequence number] as seen by
+        # this level, used to maintain aggregated size incrementally
+        self._order_state = dict()
+        self._size = 0
+        self._leaves_size = 0
+
+        # built on first position query, then maintained incrementally
+        self._queue = None
+
         self.__add_to_mbl()
 
     @property
     def level_price(self):
         return self._price
 
+    @property
+    def level_key(self):
+        """
+        Level index key in mbl, None if level not appended to any mbl
+        :return: tick count or normalized price
+        """
+        return self._key
+
     @property
     def count(self):
         return len(self._order_cache)
 
     @property
     def size(self):
-        if not self._order_cache:
-            return 0
+        """
+        Total order quantity of orders in level
+        """
+        return self._size
 
-        return reduce(lambda x, y: x + y,
-                      [o.orderQty for o in self._order_cache.values()],
-                      0)
+    @property
+    def leaves_size(self):
+        """
+        Total leaves quantity of orders in level
+        """
+        return self._leaves_size
 
     @property
     def mbl(self):
@@ -445,31 +1480,179 @@ class PriceLevel(object):
 
         self.__verify_order_price(order)
 
-        if order["orderID"] in self._order_cache:
+        order_id = order["orderID"]
+
+        if order_id in self._order_cache:
             raise ValueError(
                 "order[{}] exists in current level[{}]\n"
                 "origin order: {}\nnew order: {}".format(
-                    order["orderID"], self.level_price,
-                    self._order_cache[order["orderID"]], order))
+                    order_id, self.level_price,
+                    self._order_cache[order_id], order))
 
-        self._order_cache[order["orderID"]] = order
+        order_qty, leaves_qty = order["orderQty"], order["leavesQty"]
+
+        queue = self._queue
+        if queue is None:
+            seq = -1
+        else:
+            if queue.full():
+                queue.rebuild(self.__queue_items())
+
+            seq = queue.push(order_id, leaves_qty)
+
+        self._order_cache[order_id] = order
+        self._order_state[order_id] = [order_qty, leaves_qty, seq]
+        self._size += order_qty
+        self._leaves_size += leaves_qty
+
+        if self._index is not None:
+            self._index[order_id] = (self._mbl.direction, self)
 
         return self.count - 1
 
-    def modify_order(self, order: Order):
+    def push_orders(self, orders) -> int:
+        """
+        Append orders in batch, queue position index will be
+        rebuilt on next position query instead of per order.
+        :param orders: iterable of Order
+        :return: appended order count
+        :raise ValueError
+        """
+
+        order_cache = self._order_cache
+        order_state = self._order_state
+        index = self._index
+        index_value = (self._mbl.direction, self) if index is not None \
+            else None
+
+        added = 0
+
+        for order in orders:
+            self.__verify_order_price(order)
+
+            order_id = order["orderID"]
+
+            if order_id in order_cache:
+                raise ValueError(
+                    "order[{}] exists in current level[{}]".format(
+                        order_id, self.level_price))
+
+            order_qty, leaves_qty = order["orderQty"], order["leavesQty"]
+
+            order_cache[order_id] = order
+            order_state[order_id] = [order_qty, leaves_qty, -1]
+            self._size += order_qty
+            self._leaves_size += leaves_qty
+
+            if index is not None:
+                index[order_id] = index_value
+
+            added += 1
+
+        self._queue = None
+
+        return added
+
+    def __queue_items(self):
+        order_state = self._order_state
+
+        return ((order_id, order_state[order_id])
+                for order_id in self._order_cache)
+
+    def __queue_index(self) -> _QueueIndex:
+        if self._queue is None:
+            self._queue = _QueueIndex(self.__queue_items())
+
+        return self._queue
+
+    def get_order(self, order_id: str) -> Optional[Order]:
+        """
+        Get order by its orderID
+        :param order_id: order id
+        :return: order or None(if order not exist)
+        """
+
+        return self._order_cache.get(order_id, None)
+
+    def position_of(self, order_id: str) -> int:
+        """
+        Get order's queue position in time priority
+        :param order_id: order id
+        :return: count of orders ahead
+        :raise ValueError
+        """
+
+        if order_id not in self._order_state:
+            raise ValueError(
+                "order[{}] not exists in current level[{}]".format(
+                    order_id, self.level_price))
+
+        queue = self.__queue_index()
+
+        return queue.rank(self._order_state[order_id][2])
+
+    def volume_ahead(self, order_id: str) -> int:
         """
-        Modify order under current price level
+        Get leaves quantity queued ahead of order
+        :param order_id: order id
+        :return: total leaves quantity of orders ahead
+        :raise ValueError
+        """
+
+        if order_id not in self._order_state:
+            raise ValueError(
+                "order[{}] not exists in current level[{}]".format(
+                    order_id, self.level_price))
+
+        queue = self.__queue_index()
+
+        return queue.volume_before(self._order_state[order_id][2])
+
+    def iter_orders(self, n: int = None):
+        """
+        Iterate orders in time priority
+        :param n: only first n orders, all orders if None
+        :return: order iterator
+        """
+
+        return islice(self._order_cache.values(), n)
+
+    def modify_order(self, order: Order) -> int:
+        """
+        Modify order under current price level, order keeps its position
         :param order: Order
-        :return:
-        :raises ValueError, RuntimeError
+        :return: order index in current level, -1 if level is empty
+        :raises ValueError
         """
 
+        if not self._order_cache:
+            return -1
+
         if order["orderID"] not in self._order_cache:
             raise ValueError(
-                "order[{}] not exists.".format(order["orderID"]))
+                "order[{}] not exists under current level[{}]".format(
+                    order["orderID"], self.level_price))
+
+        state = self._order_state[order["orderID"]]
+
+        self._size += order["orderQty"] - state[0]
+        self._leaves_size += order["leavesQty"] - state[1]
+        if self._queue is not None:
+            self._queue.update_leaves(state[2],
+                                      order["leavesQty"] - state[1])
+        state[0], state[1] = order["orderQty"], order["leavesQty"]
 
         self._order_cache[order["orderID"]] = order
 
+        if self._queue is None and \
+                next(iter(self._order_cache)) == order["orderID"]:
+            # head order, no need to build queue index
+            return 0
+
+        queue = self.__queue_index()
+
+        return queue.rank(state[2])
+
     def remove_order(self, order: Order):
         """
         Remove a order from current level
@@ -496,41 +1679,94 @@ class PriceLevel(object):
                 "order[{}] not exists in current level[{}]".format(
                     order_id, self.level_price))
 
+        if self._index is not None:
+            self._index.pop(order_id, None)
+
+        order_qty, leaves_qty, seq = self._order_state.pop(order_id)
+        self._size -= order_qty
+        self._leaves_size -= leaves_qty
+
+        if self._queue is not None:
+            self._queue.remove(seq, leaves_qty)
+
         return self._order_cache.pop(order_id)
 
-    @_price_level_depth_checker
     def trade_volume(self, volume: int) -> (int, List[ReferenceType]):
         """
         Trade specified volume size
         :param volume: volume size to be traded
         :return: remained volume size, traded order's weakref list
         """
+        remained_volume, fills = self.match_volume(volume)
+
+        return remained_volume, [ref(order) for order, _ in fills]
+
+    @_price_level_depth_checker
+    def match_volume(self, volume: int) -> (int, List[tuple]):
+        """
+        Match specified volume size against orders in time priority
+        :param volume: volume size to be matched
+        :return: remained volume size, list of (order, matched quantity)
+        """
         remained_volume = volume
 
-        traded_orders = list()
+        fills = list()
 
-        for order_id in list(self._order_cache.keys()):
-            remained_volume -= self._order_cache[order_id]["leavesQty"]
+        while self._order_cache:
+            order_id = next(iter(self._order_cache))
 
             order = self._order_cache[order_id]
-            traded_orders.append(ref(order))
 
-            if remained_volume >= 0:
-                self._order_cache.pop(order_id)
+            order_qty, leaves_qty, seq = self._order_state[order_id]
+
+            if remained_volume < leaves_qty:
+                leaves_qty -= remained_volume
+
+                self._order_state[order_id][1] = leaves_qty
+                self._leaves_size -= remained_volume
+                if self._queue is not None:
+                    self._queue.update_leaves(seq, -remained_volume)
+                order["leavesQty"] = leaves_qty
+
+                fills.append((order, remained_volume))
+
+                remained_volume = 0
+                break
+
+            remained_volume -= leaves_qty
+
+            self._order_cache.pop(order_id)
+            self._order_state.pop(order_id)
+            self._size -= order_qty
+            self._leaves_size -= leaves_qty
+            if self._queue is not None:
+                self._queue.remove(seq, leaves_qty)
+
+            order["leavesQty"] = 0
+
+            fills.append((order, leaves_qty))
+
+            if self._index is not None:
+                self._index.pop(order_id, None)
 
             if remained_volume <= 0:
-                order["leavesQty"] = abs(remained_volume)
                 break
-            else:
-                order["leavesQty"] = 0
 
-        return max(0, remained_volume), traded_orders
+        return remained_volume, fills
 
     def __getitem__(self, idx):
         if not isinstance(idx, int):
             raise ValueError("index type must be integer")
 
-        if idx >= self.count:
+        pos = idx + self.count if idx < 0 else idx
+
+        if not 0 <= pos < self.count:
             raise IndexError("index[{}] out of range".format(idx))
 
-        return self._order_cache[list(self._order_cache.keys())[idx]]
+        if pos == 0:
+            return next(iter(self._order_cache.values()))
+
+        return self._order_cache[self.__queue_index().select(pos)]
+
+    def __iter__(self):
+        return iter(self._order_cache.values())
@@ -0,0 +1,85 @@
+# coding: utf-8
+__all__ = ("BookEvent", "EventRing")
+
+from collections import namedtuple, deque, OrderedDict
+from typing import List
+
+from orderbook.const import EventType
+
+# level / best events: price, size(leaves) and count of level after change,
+# price is None if side becomes empty on BestChanged;
+# trade events: trade is the Trade, price and size are trade's
+BookEvent = namedtuple("BookEvent",
+                       ("type", "side", "price", "size", "count", "trade"))
+BookEvent.__new__.__defaults__ = (None,)
+
+
+class EventRing(object):
+    """
+    Bounded event buffer to subscribe to OrderBook, for consumers polling
+    events with drain instead of handling callbacks.
+    Oldest events are dropped when buffer is full. If conflate is True,
+    events of the same price level(and BestChanged of the same side) are
+    merged, only latest state is kept, trades are never merged.
+    """
+
+    def __init__(self, capacity: int = 4096, conflate: bool = False):
+        if capacity <= 0:
+            raise ValueError("invalid capacity: {}".format(capacity))
+
+        self._capacity = capacity
+        self._conflate = conflate
+
+        self._events = OrderedDict() if conflate else deque()
+        self._trade_sequence = 0
+
+        self._dropped = 0
+
+    @property
+    def dropped(self) -> int:
+        return self._dropped
+
+    def __call__(self, event: BookEvent):
+        events = self._events
+
+        if not self._conflate:
+            if len(events) >= self._capacity:
+                events.popleft()
+                self._dropped += 1
+
+            events.append(event)
+            return
+
+        if event.type == EventType.Trade:
+            self._trade_sequence += 1
+            key = (EventType.Trade, self._trade_sequence)
+        elif event.type == EventType.BestChanged:
+            key = (EventType.BestChanged, event.side)
+        else:
+            key = (None, event.side, event.price)
+
+        if key in events:
+            # keep latest state at the position of latest update
+            del events[key]
+        elif len(events) >= self._capacity:
+            events.popitem(last=False)
+            self._dropped += 1
+
+        events[key] = event
+
+    def drain(self) -> List[BookEvent]:
+        """
+        Take all buffered events in order
+        :return: list of events
+        """
+        if self._conflate:
+            events = list(self._events.values())
+        else:
+            events = list(self._events)
+
+        self._events.clear()
+
+        return events
+
+    def __len__(self):
+        return len(self._events)
@@ -0,0 +1,205 @@
+# coding: utf-8
+__all__ = ("L2BookFeed",)
+
+import threading
+
+from typing import Dict, Optional
+
+from orderbook import logger
+from orderbook.const import Direction, create_enum_by_name
+from orderbook.core import OrderBook, TopLevels
+from orderbook.structure import Order
+
+
+class L2BookFeed(object):
+    """
+    Maintain per symbol OrderBook from orderBookL2 style table actions.
+
+    Each L2 row {"symbol", "id", "side", "size", "price"} is kept as one
+    order with row id as orderID, so book's order index is the level
+    id -> price mapping for update / delete rows, which carry no price.
+    Levels are kept sorted by the book, best bid / ask and top n levels
+    are read without sorting the table.
+
+    Actions and top_levels take the feed lock, so books can be read by
+    other threads while feed is applied by websocket thread. Hold lock
+    for any other read of books, e.g. `with feed.lock: ...`.
+    """
+
+    # fine enough for any feed price if tick price is unknown
+    DEFAULT_TICK_PRICE = 1e-8
+
+    def __init__(self, tick_price=None, **book_options):
+        """
+        :param tick_price: tick price for new books, float or
+        callable(symbol) -> Optional[float]
+        :param book_options: other OrderBook arguments for new books
+        """
+        self._tick_price = tick_price
+        self._book_options = book_options
+
+        self._books = dict()
+        self._lock = threading.RLock()
+
+    @property
+    def lock(self) -> threading.RLock:
+        return self._lock
+
+    @property
+    def books(self) -> Dict[str, OrderBook]:
+        return self._books
+
+    def top_levels(self, symbol: str, n: int = 25) -> Optional[TopLevels]:
+        """
+        Read best n levels of symbol under feed lock
+        :param symbol: symbol
+        :param n: level count per side
+        :return: TopLevels, None if no partial of symbol received
+        """
+        with self._lock:
+            book = self._books.get(symbol)
+
+            if book is None:
+                return None
+
+            return book.top_levels(n)
+
+    def book(self, symbol: str) -> Optional[OrderBook]:
+        return self._books.get(symbol)
+
+    def __get_book(self, symbol: str) -> OrderBook:
+        book = self._books.get(symbol)
+
+        if book is None:
+            tick_price = self._tick_price
+
+            if callable(tick_price):
+                tick_price = tick_price(symbol)
+
+            # feed may send integral tick size, such as "tickSize": 1
+            book = self._books[symbol] = OrderBook(
+                symbol=symbol, tick_price=float(tick_price) if tick_price
+                else self.DEFAULT_TICK_PRICE, **self._book_options)
+
+        return book
+
+    @staticmethod
+    def __group(rows) -> dict:
+        grouped = dict()
+
+        for row in rows:
+            symbol_rows = grouped.get(row["symbol"])
+
+            if symbol_rows is None:
+                grouped[row["symbol"]] = [row]
+            else:
+                symbol_rows.append(row)
+
+        return grouped
+
+    def apply(self, action: str, rows, symbol: str = None) -> int:
+        """
+        Apply table action
+        :param action: partial / insert / update / delete
+        :param rows: table rows
+        :param symbol: filter symbol of partial, see partial
+        :return: applied row count
+        :raise ValueError
+        """
+        if action not in ("partial", "insert", "update", "delete"):
+            raise ValueError("unknown action: {}".format(action))
+
+        with self._lock:
+            if action == "partial":
+                return self.partial(rows, symbol)
+
+            return getattr(self, action)(rows)
+
+    def partial(self, rows, symbol: str = None) -> int:
+        """
+        Rebuild books of symbols in rows
+        :param rows: full image rows
+        :param symbol: filter symbol of partial, its book is cleared if
+        rows have no level of it(e.g. empty partial on resubscribe)
+        :return: loaded row count
+        """
+        grouped = self.__group(rows)
+
+        if symbol is not None and symbol not in grouped:
+            book = self._books.get(symbol)
+
+            if book is not None:
+                book.clear()
+
+        return sum(self.__get_book(symbol).load_snapshot(symbol_rows)
+                   for symbol, symbol_rows in grouped.items())
+
+    def insert(self, rows) -> int:
+        applied = 0
+
+        for row in rows:
+            book = self.__get_book(row["symbol"])
+            order_id = str(row["id"])
+
+            if book.get_order(order_id) is not None:
+                # re-inserted level
+                book.cancel(order_id)
+
+            side = create_enum_by_name(Direction, row["side"])
+
+            book.add_order(Order(
+                orderID=order_id, symbol=row["symbol"], side=row["side"],
+                orderQty=row["size"] * side.value, price=row["price"]))
+
+            applied += 1
+
+        return applied
+
+    def update(self, rows) -> int:
+        applied = 0
+
+        for row in rows:
+            book = self._books.get(row["symbol"])
+            order_id = str(row["id"])
+
+            order = book.get_order(order_id) if book is not None else None
+
+            if order is None:
+                logger.debug("level[%s] not exists for update.", order_id)
+                continue
+
+            side = row.get("side")
+
+            if side is not None and side != order.side.name:
+                # level switched side
+                book.cancel(order_id)
+
+                self.insert(({
+                    "symbol": row["symbol"], "id": row["id"], "side": side,
+                    "size": row.get("size", order.leavesQty),
+                    "price": row.get("price", order.price)},))
+            else:
+                # one order per level, no time priority to keep
+                book.amend(order_id, qty=row.get("size"),
+                           price=row.get("price"), keep_priority=True)
+
+            applied += 1
+
+        return applied
+
+    def delete(self, rows) -> int:
+        applied = 0
+
+        for row in rows:
+            book = self._books.get(row["symbol"])
+            order_id = str(row["id"])
+
+            if book is None or book.get_order(order_id) is None:
+                logger.debug("level[%s] not exists for delete.", order_id)
+                continue
+
+            book.cancel(order_id)
+
+            applied += 1
+
+        return applied
@@ -0,0 +1,589 @@
+# coding: utf-8
+__all__ = ("write_snapshot", "SnapshotReader", "Journal",
+           "JournaledOrderBook")
+
+import mmap
+import os
+import struct
+
+from collections import OrderedDict
+from typing import List, Optional
+
+import msgpack
+
+from orderbook import logger
+from orderbook.const import Direction
+from orderbook.core import OrderBook, PriceLevel
+from orderbook.structure import Order, Trade, SCHEMA_VERSION
+from orderbook.utils import PriceNormalizer
+
+# magic, schema version, symbol, tick price, integer ticks, max depth,
+# buy level count, sell level count, journal sequence, order id section
+# offset, order section offset
+_SNAPSHOT_HEADER = struct.Struct("<4sH32sd?qIIQQQ")
+_SNAPSHOT_MAGIC = b"OBM2"
+
+# price ticks, size, leaves size, order count, orders offset, orders length
+_LEVEL_RECORD = struct.Struct("<qqqIQI")
+
+# payload length, sequence, op
+_JOURNAL_RECORD = struct.Struct("<IQB")
+
+_SIDES = (Direction.Buy, Direction.Sell)
+
+
+def write_snapshot(book: OrderBook, path: str, sequence: int = 0) -> int:
+    """
+    Write orderbook snapshot file, layout:
+    header + fixed-size level records(buy side then sell side, best first)
+    + order id section(msgpack array of orderIDs in level order)
+    + order section(msgpack rows of Order.to_row with prices as ticks).
+    File is written aside and renamed into place, so readers always map a
+    complete snapshot.
+    :param book: orderbook
+    :param path: snapshot file path
+    :param sequence: journal sequence included in this snapshot
+    :return: snapshot size in bytes
+    """
+    symbol = book.symbol.encode()
+
+    if len(symbol) > 32:
+        raise ValueError("symbol[{}] too long for snapshot."
+                         .format(book.symbol))
+
+    packer = msgpack.Packer(use_bin_type=True)
+    tick_price = book.tick_price
+    ticks = book.normalizer.ticks
+
+    level_records = {side: list() for side in _SIDES}
+    order_ids = list()
+    order_chunks = list()
+    offset = 0
+
+    for side in _SIDES:
+        for level in book[side].iter_levels():
+            chunk = b"".join(packer.pack(order.to_row(tick_price))
+                             for order in level)
+
+            level_records[side].append(_LEVEL_RECORD.pack(
+                ticks(level.level_price), level.size, level.leaves_size,
+                level.count, offset, len(chunk)))
+
+            order_ids.extend(level._order_cache)
+            order_chunks.append(chunk)
+            offset += len(chunk)
+
+    ids_chunk = packer.pack(order_ids)
+
+    level_count = sum(len(records) for records in level_records.values())
+    ids_offset = _SNAPSHOT_HEADER.size + level_count * _LEVEL_RECORD.size
+    orders_offset = ids_offset + len(ids_chunk)
+
+    header = _SNAPSHOT_HEADER.pack(
+        _SNAPSHOT_MAGIC, SCHEMA_VERSION, symbol, tick_price,
+        book.integer_ticks, book.max_depth,
+        len(level_records[Direction.Buy]), len(level_records[Direction.Sell]),
+        sequence, ids_offset, orders_offset)
+
+    temp_path = path + ".tmp"
+
+    with open(temp_path, "wb") as f:
+        f.write(header)
+        for side in _SIDES:
+            f.writelines(level_records[side])
+        f.write(ids_chunk)
+        f.writelines(order_chunks)
+
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(temp_path, path)
+
+    return orders_offset + offset
+
+
+class SnapshotReader(object):
+    """
+    Read only memory-mapped view of snapshot file written by write_snapshot.
+    Level records are read directly from mapped pages without creating
+    orderbook objects, orders of a level are decoded on demand.
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._mmap) < _SNAPSHOT_HEADER.size:
+            self.close()
+            raise ValueError("incomplete snapshot file: {}".format(path))
+
+        (magic, version, symbol, self._tick_price, self._integer_ticks,
+         self._max_depth, buy_levels, sell_levels, self._sequence,
+         self._ids_offset, self._orders_offset) = \
+            _SNAPSHOT_HEADER.unpack_from(self._mmap)
+
+        if magic != _SNAPSHOT_MAGIC:
+            self.close()
+            raise ValueError("invalid snapshot file: {}".format(path))
+
+        if version != SCHEMA_VERSION:
+            self.close()
+            raise ValueError("unsupported schema version: {}".format(version))
+
+        self._symbol = symbol.rstrip(b"\0").decode()
+        self._normalizer = PriceNormalizer(self._tick_price)
+
+        self._level_ranges = {
+            Direction.Buy: (_SNAPSHOT_HEADER.size, buy_levels),
+            Direction.Sell: (_SNAPSHOT_HEADER.size +
+                             buy_levels * _LEVEL_RECORD.size, sell_levels)
+        }
+
+    @property
+    def symbol(self) -> str:
+        return self._symbol
+
+    @property
+    def tick_price(self) -> float:
+        return self._tick_price
+
+    @property
+    def sequence(self) -> int:
+        return self._sequence
+
+    def depth(self, side: Direction) -> int:
+        return self._level_ranges[side][1]
+
+    def __level_record(self, side: Direction, idx: int) -> tuple:
+        start, count = self._level_ranges[side]
+
+        if not 0 <= idx < count:
+            raise IndexError("level index[{}] out of range".format(idx))
+
+        return _LEVEL_RECORD.unpack_from(self._mmap,
+                                         start + idx * _LEVEL_RECORD.size)
+
+    def levels(self, side: Direction, n: int = None) -> List[tuple]:
+        """
+        Get aggregated levels from best to worst
+        :param side: book side
+        :param n: level count, all levels if None
+        :return: list of (price, leaves size, order count)
+        """
+        start, count = self._level_ranges[side]
+
+        if n is not None:
+            count = min(n, count)
+
+        price = self._normalizer.price
+        view = memoryview(self._mmap)[start:start +
+                                      count * _LEVEL_RECORD.size]
+
+        try:
+            return [(price(ticks), leaves_size, order_count)
+                    for ticks, _, leaves_size, order_count, _, _ in
+                    _LEVEL_RECORD.iter_unpack(view)]
+        finally:
+            view.release()
+
+    def level_orders(self, side: Direction, idx: int) -> List[Order]:
+        """
+        Decode orders of one level in time priority
+        :param side: book side
+        :param idx: level index, 0 is the best level
+        :return: list of Order
+        """
+        _, _, _, _, offset, length = self.__level_record(side, idx)
+
+        start = self._orders_offset + offset
+
+        unpacker = msgpack.Unpacker(raw=False, max_buffer_size=length or 1)
+        unpacker.feed(self._mmap[start:start + length])
+
+        return [Order.from_row(row, self._tick_price) for row in unpacker]
+
+    def restore(self, book_class=OrderBook, lazy: bool = True,
+                **kwargs) -> OrderBook:
+        """
+        Rebuild orderbook from snapshot.
+        Lazy restore creates levels from level records and indexes orderIDs
+        from the id section only, orders of a level are decoded on first
+        order access of the level(push / match / cancel / iterate ...),
+        aggregated reads(top levels, depth, analytics) decode nothing.
+        Otherwise all orders are decoded and added with MBL.add_orders.
+        :param book_class: OrderBook or its subclass
+        :param lazy: decode orders of each level on demand
+        :param kwargs: extra arguments for book_class
+        :return: orderbook instance
+        """
+        book = book_class(symbol=self._symbol, tick_price=self._tick_price,
+                          max_depth=self._max_depth,
+                          integer_ticks=self._integer_ticks, **kwargs)
+
+        if lazy:
+            self.__restore_levels(book)
+
+            return book
+
+        start = self._orders_offset
+        unpacker = msgpack.Unpacker(
+            raw=False, max_buffer_size=max(len(self._mmap) - start, 1))
+        unpacker.feed(self._mmap[start:])
+
+        orders = {side: list() for side in _SIDES}
+
+        for row in unpacker:
+            order = Order.from_row(row, self._tick_price)
+            orders[order.side].append(order)
+
+        for side in _SIDES:
+            book[side].add_orders(orders[side])
+
+        return book
+
+    def __restore_levels(self, book: OrderBook):
+        mapped = self._mmap
+
+        order_ids = msgpack.unpackb(
+            mapped[self._ids_offset:self._orders_offset], raw=False)
+        # kept by pending levels after snapshot is closed
+        orders = mapped[self._orders_offset:]
+
+        index = book._order_price_index_map
+        price = self._normalizer.price
+        pos = 0
+
+        for side in _SIDES:
+            mbl = book[side]
+            start, count = self._level_ranges[side]
+
+            for (ticks, size, leaves_size, order_count, offset,
+                 length) in _LEVEL_RECORD.iter_unpack(
+                    mapped[start:start + count * _LEVEL_RECORD.size]):
+                level_ids = order_ids[pos:pos + order_count]
+                pos += order_count
+
+                level = _SnapshotLevel(price=price(ticks), mbl=mbl)
+                level._order_cache = OrderedDict.fromkeys(level_ids)
+                level._size = size
+                level._leaves_size = leaves_size
+                level._encoded = (orders, offset, length, self._tick_price)
+
+                index.update(dict.fromkeys(level_ids, (side, level)))
+
+    def close(self):
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class _SnapshotLevel(PriceLevel):
+    """
+    Price level restored from snapshot with orderIDs and aggregated sizes
+    only, orders are decoded on first order access, then level becomes a
+    plain PriceLevel.
+    """
+
+    def _materialize(self):
+        data, offset, length, tick_price = self._encoded
+        del self._encoded
+
+        unpacker = msgpack.Unpacker(raw=False, max_buffer_size=length or 1)
+        unpacker.feed(data[offset:offset + length])
+
+        order_cache = self._order_cache
+        order_state = self._order_state
+        price = self._price
+
+        for row in unpacker:
+            order = Order.from_row(row, tick_price)
+            order.price = price
+
+            order_cache[order.orderID] = order
+            order_state[order.orderID] = [order.orderQty, order.leavesQty,
+                                          -1]
+
+        self.__class__ = PriceLevel
+
+
+def _materializing(name):
+    def method(self, *args, **kwargs):
+        self._materialize()
+
+        return getattr(self, name)(*args, **kwargs)
+
+    method.__name__ = name
+
+    return method
+
+
+# PriceLevel methods reading orders or their state
+for _name in ("push_order", "push_orders", "get_order", "position_of",
+              "volume_ahead", "iter_orders", "modify_order",
+              "remove_order_by_id", "match_volume", "__getitem__",
+              "__iter__"):
+    setattr(_SnapshotLevel, _name, _materializing(_name))
+
+
+class Journal(object):
+    """
+    Append-only journal of orderbook deltas, each record is
+    header(payload length, sequence, op) + msgpack payload.
+    Records are flushed to OS on append, so they survive a process crash,
+    sync also fsyncs each record to survive a host crash.
+    """
+
+    ADD = 1
+    CANCEL = 2
+    AMEND = 3
+    SUBMIT = 4
+    SNAPSHOT = 5
+    CLEAR = 6
+    OVERLAP = 7
+
+    def __init__(self, path: str, sequence: int = 0, sync: bool = False):
+        """
+        :param path: journal file path
+        :param sequence: sequence to continue from if journal is empty,
+        e.g. sequence of the snapshot journal was truncated with
+        :param sync: fsync every appended record
+        """
+        self._path = path
+        self._sequence = sequence
+        self._sync = sync
+
+        # continue sequence of existing records
+        for record_sequence, _, _ in self.records():
+            self._sequence = max(self._sequence, record_sequence)
+
+        self._file = open(path, "ab")
+        self._packer = msgpack.Packer(use_bin_type=True)
+
+    @property
+    def sequence(self) -> int:
+        return self._sequence
+
+    def append(self, op: int, payload) -> int:
+        """
+        Append one record
+        :param op: record op
+        :param payload: msgpack serializable payload
+        :return: record sequence
+        """
+        self._sequence += 1
+
+        data = self._packer.pack(payload)
+
+        self._file.write(_JOURNAL_RECORD.pack(len(data), self._sequence, op) +
+                         data)
+        self.flush(self._sync)
+
+        return self._sequence
+
+    def flush(self, sync: bool = False):
+        self._file.flush()
+
+        if sync:
+            os.fsync(self._file.fileno())
+
+    def truncate(self):
+        """
+        Remove all records, sequence continues
+        """
+        self._file.seek(0)
+        self._file.truncate()
+
+    def records(self, after: int = 0):
+        """
+        Iterate records, incomplete tail record(e.g. process crashed when
+        writing) is ignored.
+        :param after: only records with greater sequence are returned
+        :return: iterator of (sequence, op, payload)
+        """
+        if not os.path.exists(self._path) or \
+                not os.path.getsize(self._path):
+            return
+
+        with open(self._path, "rb") as f, \
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            pos = 0
+            size = len(data)
+
+            while pos + _JOURNAL_RECORD.size <= size:
+                length, sequence, op = _JOURNAL_RECORD.unpack_from(data, pos)
+                pos += _JOURNAL_RECORD.size
+
+                if pos + length > size:
+                    logger.warning(
+                        "incomplete journal record[{}] ignored."
+                        .format(sequence))
+                    return
+
+                if sequence > after:
+                    yield sequence, op, msgpack.unpackb(
+                        data[pos:pos + length], raw=False)
+
+                pos += length
+
+    def replay(self, book: OrderBook, after: int = 0) -> int:
+        """
+        Apply records to orderbook
+        :param book: orderbook
+        :param after: only records with greater sequence are applied
+        :return: applied record count
+        """
+        tick_price = book.tick_price
+        applied = 0
+
+        for _, op, payload in self.records(after):
+            if op == self.ADD:
+                OrderBook.add_order(book, Order.from_row(payload, tick_price))
+            elif op == self.CANCEL:
+                OrderBook.cancel(book, payload)
+            elif op == self.AMEND:
+                OrderBook.amend(book, *payload)
+            elif op == self.SUBMIT:
+                OrderBook.submit(book, Order.from_row(payload, tick_price))
+            elif op == self.SNAPSHOT:
+                OrderBook.load_snapshot(book, payload)
+            elif op == self.CLEAR:
+                OrderBook.clear(book)
+            elif op == self.OVERLAP:
+                OrderBook.overlap_levels(book, payload)
+            else:
+                raise ValueError("invalid journal op: {}".format(op))
+
+            applied += 1
+
+        return applied
+
+    def close(self):
+        self._file.close()
+
+
+class JournaledOrderBook(OrderBook):
+    """
+    OrderBook logging every mutation into journal, checkpoint writes
+    snapshot and truncates journal, restore maps snapshot and replays
+    journal records after it.
+    """
+
+    def __init__(self, *args, journal: Journal = None, **kwargs):
+        super(JournaledOrderBook, self).__init__(*args, **kwargs)
+
+        self._journal = journal
+
+    @property
+    def journal(self) -> Optional[Journal]:
+        return self._journal
+
+    def add_order(self, order: Order) -> int:
+        idx = super(JournaledOrderBook, self).add_order(order)
+
+        if self._journal is not None:
+            self._journal.append(Journal.ADD, order.to_row(self.tick_price))
+
+        return idx
+
+    def load_snapshot(self, rows) -> int:
+        rows = list(rows)
+
+        # clear inside load_snapshot is part of SNAPSHOT record
+        journal, self._journal = self._journal, None
+
+        try:
+            loaded = super(JournaledOrderBook, self).load_snapshot(rows)
+        finally:
+            self._journal = journal
+
+        if self._journal is not None:
+            self._journal.append(Journal.SNAPSHOT, rows)
+
+        return loaded
+
+    def clear(self):
+        super(JournaledOrderBook, self).clear()
+
+        if self._journal is not None:
+            self._journal.append(Journal.CLEAR, None)
+
+    def cancel(self, order_id: str) -> Order:
+        order = super(JournaledOrderBook, self).cancel(order_id)
+
+        if self._journal is not None:
+            self._journal.append(Journal.CANCEL, order_id)
+
+        return order
+
+    def amend(self, order_id: str, qty: int = None,
+              price: float = None, keep_priority: bool = False) -> Order:
+        order = super(JournaledOrderBook, self).amend(
+            order_id, qty, price, keep_priority)
+
+        if self._journal is not None:
+            self._journal.append(Journal.AMEND,
+                                 (order_id, qty, price, keep_priority))
+
+        return order
+
+    def overlap_levels(self, price) -> (Optional[Direction], list):
+        direction, levels = super(JournaledOrderBook, self).overlap_levels(
+            price)
+
+        if self._journal is not None and levels:
+            self._journal.append(Journal.OVERLAP, price)
+
+        return direction, levels
+
+    def submit(self, order: Order) -> List[Trade]:
+        # incoming order is logged as received, before being filled
+        row = order.to_row(self.tick_price)
+
+        trades = super(JournaledOrderBook, self).submit(order)
+
+        if self._journal is not None:
+            self._journal.append(Journal.SUBMIT, row)
+
+        return trades
+
+    def checkpoint(self, path: str) -> int:
+        """
+        Write snapshot including all journal records, then truncate journal
+        :param path: snapshot file path
+        :return: snapshot size in bytes
+        """
+        sequence = self._journal.sequence if self._journal else 0
+
+        size = write_snapshot(self, path, sequence)
+
+        if self._journal is not None:
+            self._journal.truncate()
+
+        return size
+
+    @classmethod
+    def restore(cls, snapshot_path: str, journal_path: str,
+                sync: bool = False) -> "JournaledOrderBook":
+        """
+        Restore orderbook from snapshot and journal records after it,
+        journal will be used for further mutations. Levels are restored
+        lazily, see SnapshotReader.restore.
+        :param snapshot_path: snapshot file path
+        :param journal_path: journal file path
+        :param sync: fsync every appended journal record
+        :return: JournaledOrderBook
+        """
+        with SnapshotReader(snapshot_path) as reader:
+            book = reader.restore(cls)
+            sequence = reader.sequence
+
+        journal = Journal(journal_path, sequence, sync)
+        journal.replay(book, sequence)
+
+        book._journal = journal
+
+        return book
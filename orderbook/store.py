@@ -0,0 +1,592 @@
+# coding: utf-8
+__all__ = ("ColumnarOrderStore", "ColumnarPriceLevel", "OrderView")
+
+from array import array
+from datetime import datetime
+from itertools import islice
+from typing import List, Tuple
+
+from orderbook.const import Direction, OrderStatus, create_enum_by_name
+from orderbook.utils import PriceNormalizer, make_datetime, make_epoch_ns
+from orderbook.structure import Order
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class OrderView(object):
+    """
+    Read only proxy of one row in ColumnarOrderStore, supports the same
+    column access as Order(attribute and item style).
+    View is only valid until its row is released from the store.
+    """
+
+    __slots__ = ("_store", "_row")
+
+    def __init__(self, store: "ColumnarOrderStore", row: int):
+        self._store = store
+        self._row = row
+
+    @property
+    def row(self) -> int:
+        return self._row
+
+    def to_order(self) -> Order:
+        """
+        Materialize an Order instance from current row
+        :return: Order
+        """
+        return self._store.to_order(self._row)
+
+    def __getattr__(self, item):
+        try:
+            getter = ColumnarOrderStore.COLUMN_GETTERS[item]
+        except KeyError:
+            raise AttributeError("invalid attribute name: {}".format(item))
+
+        return getter(self._store, self._row)
+
+    def __getitem__(self, item):
+        try:
+            getter = ColumnarOrderStore.COLUMN_GETTERS[item]
+        except KeyError:
+            raise KeyError("invalid attribute name: {}".format(item))
+
+        return getter(self._store, self._row)
+
+    def __eq__(self, other):
+        return (self["orderID"] == other["orderID"] and
+                self["timestamp"] == other["timestamp"])
+
+    def __hash__(self):
+        return hash(self["orderID"])
+
+    def __repr__(self):
+        return "OrderView(orderID={!r}, side={}, price={}, leavesQty={})" \
+            .format(self["orderID"], self["side"], self["price"],
+                    self["leavesQty"])
+
+
+class ColumnarOrderStore(object):
+    """
+    Struct-of-arrays order storage for replay / backtest.
+
+    Each order occupies one row across typed array columns(price in integer
+    ticks, quantities, side, status, epoch timestamp in ms), rows released
+    are recycled through a free-list. Only orderID string and its row index
+    are kept as Python objects, OrderView proxies are created on demand.
+
+    Rows queued in a ColumnarPriceLevel keep a reference to their level,
+    so cancel / fill / release on store also update the level's leaves
+    size and queue.
+    """
+
+    COLUMN_GETTERS = {
+        "orderID": lambda s, r: s._order_ids[r],
+        "side": lambda s, r: Direction(s._side[r]),
+        "price": lambda s, r: s._normalizer.price(s._price_ticks[r]),
+        "priceTicks": lambda s, r: s._price_ticks[r],
+        "orderQty": lambda s, r: s._order_qty[r],
+        "leavesQty": lambda s, r: s._leaves_qty[r],
+        "cumQty": lambda s, r: s._order_qty[r] - s._leaves_qty[r],
+        "ordStatus": lambda s, r: OrderStatus(s._status[r]),
+        "timestamp": lambda s, r: s.timestamp_of(r)
+    }
+
+    def __init__(self, tick_price: float):
+        self._normalizer = PriceNormalizer(tick_price)
+
+        self._order_ids = list()
+        self._price_ticks = array("q")
+        self._order_qty = array("q")
+        self._leaves_qty = array("q")
+        self._side = array("b")
+        self._status = array("h")
+        self._timestamp = array("q")
+
+        self._free_rows = array("q")
+        self._row_index = dict()
+
+        # owner level of each queued row, None if not queued, and slot
+        # of row in owner level's queue
+        self._levels = list()
+        self._positions = array("q")
+
+    @property
+    def normalizer(self) -> PriceNormalizer:
+        return self._normalizer
+
+    @property
+    def capacity(self) -> int:
+        return len(self._order_ids)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Bytes used by typed columns, orderID strings, level references
+        and index excluded
+        """
+        return sum(column.itemsize * len(column) for column in (
+            self._price_ticks, self._order_qty, self._leaves_qty,
+            self._side, self._status, self._timestamp, self._free_rows,
+            self._positions))
+
+    def insert(self, order_id: str, side: Direction, price_ticks: int,
+               order_qty: int, leaves_qty: int = None,
+               status: OrderStatus = OrderStatus.New,
+               timestamp: int = 0) -> int:
+        """
+        Insert one order row
+        :param order_id: order id
+        :param side: order direction
+        :param price_ticks: order price in integer ticks
+        :param order_qty: order quantity, always positive
+        :param leaves_qty: leaves quantity, default to order_qty
+        :param status: order status
+        :param timestamp: epoch timestamp in ms
+        :return: row index
+        :raise ValueError
+        """
+        if order_id in self._row_index:
+            raise ValueError("order[{}] already exists.".format(order_id))
+
+        if leaves_qty is None:
+            leaves_qty = order_qty
+
+        if self._free_rows:
+            row = self._free_rows.pop()
+
+            self._order_ids[row] = order_id
+            self._price_ticks[row] = price_ticks
+            self._order_qty[row] = order_qty
+            self._leaves_qty[row] = leaves_qty
+            self._side[row] = side
+            self._status[row] = status
+            self._timestamp[row] = timestamp
+            self._levels[row] = None
+            self._positions[row] = -1
+        else:
+            row = len(self._order_ids)
+
+            self._order_ids.append(order_id)
+            self._price_ticks.append(price_ticks)
+            self._order_qty.append(order_qty)
+            self._leaves_qty.append(leaves_qty)
+            self._side.append(side)
+            self._status.append(status)
+            self._timestamp.append(timestamp)
+            self._levels.append(None)
+            self._positions.append(-1)
+
+        self._row_index[order_id] = row
+
+        return row
+
+    def insert_order(self, order: Order) -> int:
+        """
+        Insert row from Order model
+        :param order: Order
+        :return: row index
+        :raise ValueError
+        """
+        timestamp = order.timestamp
+
+        if isinstance(timestamp, datetime):
+            # naive UTC datetime, never local time
+            timestamp = make_epoch_ns(timestamp) // 1000000
+        elif timestamp:
+            # epoch ns column, see use_epoch_timestamp
+            timestamp //= 1000000
+
+        return self.insert(
+            order_id=order.orderID, side=order.side,
+            price_ticks=self._normalizer.ticks(order.price),
+            order_qty=order.orderQty, leaves_qty=order.leavesQty,
+            status=order.ordStatus, timestamp=timestamp or 0)
+
+    def release(self, order_id: str) -> int:
+        """
+        Remove order from store, its row will be recycled
+        :param order_id: order id
+        :return: released row index
+        :raise ValueError
+        """
+        try:
+            row = self._row_index.pop(order_id)
+        except KeyError:
+            raise ValueError("order[{}] not exists.".format(order_id))
+
+        level = self._levels[row]
+
+        if level is not None:
+            level._discard(row, self._leaves_qty[row])
+            self._levels[row] = None
+
+        self._order_ids[row] = None
+        self._leaves_qty[row] = 0
+        self._status[row] = OrderStatus.Canceled
+        self._free_rows.append(row)
+
+        return row
+
+    def row_of(self, order_id: str) -> int:
+        try:
+            return self._row_index[order_id]
+        except KeyError:
+            raise ValueError("order[{}] not exists.".format(order_id))
+
+    def leaves_of(self, row: int) -> int:
+        return self._leaves_qty[row]
+
+    def timestamp_of(self, row: int):
+        """
+        Timestamp of row as Order column, naive UTC datetime(or epoch ns
+        with use_epoch_timestamp)
+        :param row: row index
+        :return: timestamp, None if not set
+        """
+        timestamp = self._timestamp[row]
+
+        if not timestamp:
+            return None
+
+        mapper = Order._column_mapper_.get("timestamp") or make_datetime
+
+        return mapper(timestamp)
+
+    def level_of(self, row: int) -> "ColumnarPriceLevel":
+        """
+        Level queuing the row
+        :param row: row index
+        :return: ColumnarPriceLevel, None if not queued
+        """
+        return self._levels[row]
+
+    def fill(self, row: int, qty: int) -> int:
+        """
+        Fill order row with specified quantity
+        :param row: row index
+        :param qty: filled quantity
+        :return: leaves quantity after filled
+        """
+        leaves = self._leaves_qty[row] - qty
+
+        level = self._levels[row]
+
+        if level is not None:
+            level._leaves_changed(leaves + qty, leaves)
+
+        self._leaves_qty[row] = leaves
+        self._status[row] = (OrderStatus.PartiallyFilled if leaves else
+                             OrderStatus.Filled)
+
+        return leaves
+
+    def cancel(self, order_id: str) -> int:
+        """
+        Mark order canceled and clear its leaves, row is kept
+        :param order_id: order id
+        :return: canceled leaves quantity
+        :raise ValueError
+        """
+        row = self.row_of(order_id)
+
+        leaves = self._leaves_qty[row]
+
+        level = self._levels[row]
+
+        if level is not None:
+            level._leaves_changed(leaves, 0)
+
+        self._leaves_qty[row] = 0
+        self._status[row] = (OrderStatus.PartiallyFilledCanceled
+                             if leaves < self._order_qty[row] else
+                             OrderStatus.Canceled)
+
+        return leaves
+
+    def view(self, row: int) -> OrderView:
+        return OrderView(self, row)
+
+    def to_order(self, row: int) -> Order:
+        side = Direction(self._side[row])
+
+        order = Order(orderID=self._order_ids[row],
+                      side=side.name,
+                      orderQty=self._order_qty[row] * side.value,
+                      price=self._normalizer.price(self._price_ticks[row]),
+                      leavesQty=self._leaves_qty[row],
+                      cumQty=self._order_qty[row] - self._leaves_qty[row],
+                      ordStatus=OrderStatus(self._status[row]).name)
+
+        # already mapped, unset timestamp stays None
+        order.timestamp = self.timestamp_of(row)
+
+        return order
+
+    def total_leaves(self, side) -> int:
+        """
+        Total leaves quantity of all orders in specified side
+        :param side: Direction or direction name
+        :return: leaves quantity
+        """
+        if not isinstance(side, Direction):
+            side = create_enum_by_name(Direction, side)
+
+        if numpy is not None and self._side:
+            leaves = numpy.frombuffer(self._leaves_qty, dtype=numpy.int64)
+            sides = numpy.frombuffer(self._side, dtype=numpy.int8)
+
+            return int(leaves[sides == side.value].sum())
+
+        value = side.value
+
+        return sum(leaves for leaves, row_side in
+                   zip(self._leaves_qty, self._side) if row_side == value)
+
+    def leaves_by_price(self, side) -> dict:
+        """
+        Aggregate leaves quantity by price ticks in specified side
+        :param side: Direction or direction name
+        :return: price ticks -> leaves quantity
+        """
+        if not isinstance(side, Direction):
+            side = create_enum_by_name(Direction, side)
+
+        value = side.value
+        result = dict()
+
+        for ticks, leaves, row_side in zip(self._price_ticks,
+                                           self._leaves_qty, self._side):
+            if leaves and row_side == value:
+                result[ticks] = result.get(ticks, 0) + leaves
+
+        return result
+
+    def __len__(self):
+        return len(self._row_index)
+
+    def __contains__(self, order_id):
+        return order_id in self._row_index
+
+    def __getitem__(self, order_id) -> OrderView:
+        try:
+            return OrderView(self, self._row_index[order_id])
+        except KeyError:
+            raise KeyError("order[{}] not exists.".format(order_id))
+
+
+class ColumnarPriceLevel(object):
+    """
+    Price level over ColumnarOrderStore, holding FIFO queue of row indices
+    instead of Order instances.
+
+    Removed rows are left in queue as tombstones, and rows canceled in
+    store keep their slot with zero leaves. Both are skipped by matching
+    and iteration, and the queue is compacted once dead slots exceed
+    COMPACT_THRESHOLD and half of the queue.
+    """
+
+    # dead slots(consumed, removed or canceled) compacted past this count
+    COMPACT_THRESHOLD = 1024
+
+    def __init__(self, store: ColumnarOrderStore, price_ticks: int):
+        self._store = store
+        self._price_ticks = price_ticks
+
+        self._rows = array("q")
+        self._head = 0
+
+        self._leaves_size = 0
+
+        # queued rows with leaves
+        self._live = 0
+
+    @property
+    def price_ticks(self) -> int:
+        return self._price_ticks
+
+    @property
+    def price(self) -> float:
+        return self._store.normalizer.price(self._price_ticks)
+
+    @property
+    def leaves_size(self) -> int:
+        return self._leaves_size
+
+    def push(self, row: int):
+        """
+        Push store row into level
+        :param row: row index
+        :raise ValueError
+        """
+        store = self._store
+
+        if store._levels[row] is not None:
+            raise ValueError("row[{}] already queued.".format(row))
+
+        store._levels[row] = self
+        store._positions[row] = len(self._rows)
+
+        self._rows.append(row)
+
+        leaves = store.leaves_of(row)
+        self._leaves_size += leaves
+        if leaves:
+            self._live += 1
+
+    def push_order(self, order: Order) -> int:
+        """
+        Insert order into store and push its row into level
+        :param order: Order
+        :return: row index
+        """
+        row = self._store.insert_order(order)
+
+        self.push(row)
+
+        return row
+
+    def remove(self, order_id: str) -> int:
+        """
+        Cancel order in level and release its row from store
+        :param order_id: order id
+        :return: canceled leaves quantity
+        :raise ValueError
+        """
+        store = self._store
+
+        if store.level_of(store.row_of(order_id)) is not self:
+            raise ValueError("order[{}] not exists under current level[{}]"
+                             .format(order_id, self._price_ticks))
+
+        leaves = store.cancel(order_id)
+        store.release(order_id)
+
+        return leaves
+
+    def _leaves_changed(self, before: int, after: int):
+        """
+        Leaves of queued row changed in store
+        :param before: leaves quantity before
+        :param after: leaves quantity after
+        """
+        self._leaves_size += after - before
+
+        if before and not after:
+            self._live -= 1
+
+    def _discard(self, row: int, leaves: int):
+        """
+        Drop row released from store, its slot becomes a tombstone
+        :param row: row index
+        :param leaves: leaves quantity of row
+        """
+        self._rows[self._store._positions[row]] = -1
+
+        self._leaves_changed(leaves, 0)
+        self.__compact()
+
+    def __compact(self):
+        rows = self._rows
+        dead = len(rows) - self._live
+
+        if dead <= self.COMPACT_THRESHOLD or dead * 2 <= len(rows):
+            return
+
+        store = self._store
+        levels = store._levels
+        positions = store._positions
+        leaves = store._leaves_qty
+
+        live_rows = array("q")
+
+        for idx in range(self._head, len(rows)):
+            row = rows[idx]
+
+            if row < 0:
+                continue
+
+            if not leaves[row]:
+                # canceled in store directly
+                levels[row] = None
+                continue
+
+            positions[row] = len(live_rows)
+            live_rows.append(row)
+
+        self._rows = live_rows
+        self._head = 0
+
+    def __live_rows(self):
+        rows = self._rows
+        leaves = self._store._leaves_qty
+
+        for idx in range(self._head, len(rows)):
+            row = rows[idx]
+
+            if row >= 0 and leaves[row]:
+                yield row
+
+    def match_volume(self, volume: int) -> Tuple[int, List[Tuple[int, int]]]:
+        """
+        Match volume against queued rows in FIFO order, filled rows are
+        dequeued but kept in store(with status Filled)
+        :param volume: volume to match
+        :return: (remained volume, [(row, filled qty)])
+        """
+        store = self._store
+        levels = store._levels
+        rows = self._rows
+        fills = list()
+
+        while volume > 0 and self._head < len(rows):
+            row = rows[self._head]
+
+            if row < 0:
+                # released from store
+                self._head += 1
+                continue
+
+            leaves = store.leaves_of(row)
+
+            if not leaves:
+                # canceled in store directly, leaves size already updated
+                levels[row] = None
+                self._head += 1
+                continue
+
+            qty = min(volume, leaves)
+            volume -= qty
+
+            # leaves size and live count are updated by store
+            if not store.fill(row, qty):
+                levels[row] = None
+                self._head += 1
+
+            fills.append((row, qty))
+
+        self.__compact()
+
+        return volume, fills
+
+    def __len__(self):
+        return self._live
+
+    def __iter__(self):
+        store = self._store
+
+        for row in self.__live_rows():
+            yield OrderView(store, row)
+
+    def __getitem__(self, index) -> OrderView:
+        if index < 0:
+            index += self._live
+
+        if not 0 <= index < self._live:
+            raise IndexError("level index out of range")
+
+        return OrderView(self._store,
+                         next(islice(self.__live_rows(), index, None)))
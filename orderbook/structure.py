@@ -1,37 +1,290 @@
 # coding: utf-8
-__all__ = ("Order", "Trade")
+__all__ = ("Order", "LazyOrder", "Trade", "use_epoch_timestamp")
+
+import msgpack
 
 from datetime import datetime
+from operator import attrgetter
+
+from orderbook.utils import (make_datetime, make_epoch_ns,
+                             epoch_ns_to_datetime, price_to_ticks,
+                             ticks_to_price)
+from orderbook.const import (enum_decoder, EnumTable, Direction,
+                             OrderStatus, OrderType, TimeCondition)
+
+# version of binary row layout, see DataModel.to_row
+SCHEMA_VERSION = 1
+
+
+_NOT_SET = object()
+_EMPTY_ROW = dict()
+
+
+class DataModelMeta(type):
+    """
+    Turn dict style __slots__ declaration(column name -> default value) into
+    plain slots, and generate keyword-only __init__ for each model, so every
+    slot is filled at construction and no default lookup is needed after.
+    """
+
+    def __new__(mcs, name, bases, namespace):
+        defaults = dict()
+
+        for base in reversed(bases):
+            defaults.update(getattr(base, "_defaults_", {}))
+
+        slots = namespace.get("__slots__", ())
+
+        if isinstance(slots, dict):
+            defaults.update((column, value) for column, value in slots.items()
+                            if not column.startswith("__"))
+            namespace["__slots__"] = tuple(slots)
+
+        namespace["_defaults_"] = defaults
+
+        cls = super(DataModelMeta, mcs).__new__(mcs, name, bases, namespace)
 
-from orderbook.utils import make_datetime
-from orderbook.const import (create_enum_by_name, Direction, OrderStatus,
-                             OrderType, TimeCondition)
+        cls._generated_init_ = "__init__" not in namespace
+        mcs.__build_init(cls)
 
+        return cls
 
-class DataModel(object):
+    def set_column_mapper(cls, column: str, mapper=None):
+        """
+        Replace column mapper of model, constructors are regenerated.
+        :param column: column name
+        :param mapper: new mapper, None to remove column's mapper
+        :raise AttributeError
+        """
+        if column not in cls._defaults_:
+            raise AttributeError("invalid attribute name: {}".format(column))
+
+        column_mapper = dict(cls._column_mapper_)
+
+        if mapper is None:
+            column_mapper.pop(column, None)
+        else:
+            column_mapper[column] = mapper
+
+        cls._column_mapper_ = column_mapper
+        DataModelMeta.__build_init(cls)
+
+    @staticmethod
+    def __build_init(cls):
+        if cls._generated_init_:
+            cls.__init__ = DataModelMeta.__make_init(cls)
+
+        cls._trusted_init_ = DataModelMeta.__make_init(cls, trusted=True)
+
+        # models keeping raw row, see LazyOrder
+        if hasattr(cls, "_raw_"):
+            cls._lazy_init_ = DataModelMeta.__make_init(cls, lazy=True)
+
+        columns = tuple(cls._defaults_)
+
+        if columns:
+            cls._row_getter_ = attrgetter(*columns)
+
+        cls._row_decoders_ = tuple(
+            DataModelMeta.__row_decoder(cls._column_mapper_.get(column))
+            for column in columns)
+        cls._timestamp_indexes_ = tuple(
+            idx for idx, column in enumerate(columns)
+            if cls._column_mapper_.get(column) in (make_datetime,
+                                                   make_epoch_ns))
+        cls._price_indexes_ = tuple(columns.index(column)
+                                    for column in cls._price_columns_)
+
+    @staticmethod
+    def __row_decoder(mapper):
+        """
+        Decoder of binary row value(see DataModel.to_row) for column
+        """
+        if isinstance(getattr(mapper, "__self__", None), EnumTable):
+            return mapper
+
+        if mapper is make_datetime:
+            return epoch_ns_to_datetime
+
+        return None
+
+    @staticmethod
+    def __make_init(cls, trusted=False, lazy=False):
+        """
+        Generate keyword-only __init__ for model, columns not given are
+        filled with default value, mapped / required / post load columns
+        use a sentinel default so we can tell if they are given.
+        Column mappers are skipped if trusted, and mapped columns are left
+        unset(except post load columns) if lazy.
+        """
+        scope = {"_NOT_SET": _NOT_SET}
+
+        column_mapper = dict() if trusted else cls._column_mapper_
+        post_load_columns = getattr(cls, "_post_load_columns_", ())
+        sentinel_columns = (set(column_mapper) |
+                            set(cls._required_columns_) |
+                            set(post_load_columns))
+
+        params = list()
+        body = list()
+
+        required = [column for column in cls._defaults_
+                    if column in cls._required_columns_]
+        if required:
+            body += [
+                "    if {}:".format(" or ".join(
+                    "{} is _NOT_SET".format(column) for column in required)),
+                "        raise AttributeError('columns[{{}}] is required.'"
+                ".format(','.join(column for column, value in ({}, ) "
+                "if value is _NOT_SET)))".format(", ".join(
+                    "('{0}', {0})".format(column) for column in required))]
+
+        for column, default in cls._defaults_.items():
+            scope["_d_" + column] = default
+
+            if column not in sentinel_columns:
+                params.append("{0}=_d_{0}".format(column))
+                body.append("    self.{0} = {0}".format(column))
+                continue
+
+            params.append("{}=_NOT_SET".format(column))
+
+            if lazy and column in column_mapper and \
+                    column not in post_load_columns:
+                continue
+
+            if column in column_mapper:
+                scope["_m_" + column] = column_mapper[column]
+                value = "_m_{0}({0})".format(column)
+            else:
+                value = column
+
+            body.append("    self.{0} = _d_{0} if {0} is _NOT_SET else {1}"
+                        .format(column, value))
+
+        if post_load_columns:
+            body.append("    self._post_load_({})".format(
+                ", ".join(post_load_columns)))
+
+        lines = ["def __init__(self{}):".format(
+            ", *, " + ", ".join(params) if params else "")]
+        lines += body or ["    pass"]
+
+        exec("\n".join(lines), scope)
+
+        return scope["__init__"]
+
+
+class DataModel(object, metaclass=DataModelMeta):
     __slots__ = dict()
 
     _column_mapper_ = dict()
     _required_columns_ = set()
 
-    def __init__(self, **kwargs):
-        missing_columns = self._required_columns_ - kwargs.keys()
-        if missing_columns:
-            raise AttributeError("columns[{}] is required.".format(
-                ",".join(missing_columns)))
+    # columns encoded as integer ticks in binary row
+    _price_columns_ = ()
+
+    @classmethod
+    def from_dict(cls, data: dict, trusted: bool = False):
+        """
+        Create model from column dict, e.g. a decoded feed row.
+        :param data: column name -> value
+        :param trusted: values are already validated and converted
+        (enum members, datetime), column mappers will be skipped
+        :return: model instance
+        :raise AttributeError, TypeError
+        """
+        if not trusted:
+            return cls(**data)
 
-        for key, value in kwargs.items():
-            if key in self._column_mapper_:
-                value = self._column_mapper_[key](value)
+        model = cls.__new__(cls)
+        model._trusted_init_(**data)
 
-            setattr(self, key, value)
+        return model
+
+    def to_row(self, tick_price: float = None) -> list:
+        """
+        Column values in schema order, enums as int, datetime as int64 epoch
+        ns, and price columns as integer ticks if tick_price specified.
+        :param tick_price: tick price of price columns
+        :return: list of column values
+        """
+        row = list(self._row_getter_(self))
+
+        for idx in self._timestamp_indexes_:
+            if isinstance(row[idx], datetime):
+                row[idx] = make_epoch_ns(row[idx])
+
+        if tick_price:
+            for idx in self._price_indexes_:
+                if row[idx] is not None:
+                    row[idx] = price_to_ticks(row[idx], tick_price)
+
+        return row
+
+    @classmethod
+    def from_row(cls, row, tick_price: float = None):
+        """
+        Restore model from column values created by to_row
+        :param row: list of column values
+        :param tick_price: tick price used in to_row
+        :return: model instance
+        :raise ValueError
+        """
+        if len(row) != len(cls._defaults_):
+            raise ValueError("invalid row length[{}] for {}, {} expected."
+                             .format(len(row), cls.__name__,
+                                     len(cls._defaults_)))
+
+        model = cls.__new__(cls)
+
+        for column, decoder, value in zip(cls._defaults_,
+                                          cls._row_decoders_, row):
+            if decoder is not None and value is not None:
+                value = decoder(value)
+
+            setattr(model, column, value)
+
+        if tick_price:
+            for column in cls._price_columns_:
+                value = getattr(model, column)
+
+                if value is not None:
+                    setattr(model, column, ticks_to_price(value, tick_price))
+
+        return model
+
+    def to_bytes(self, tick_price: float = None) -> bytes:
+        """
+        Encode model as msgpack array: [schema version, tick price, *row]
+        :param tick_price: encode price columns as integer ticks if specified
+        :return: bytes
+        """
+        return msgpack.packb([SCHEMA_VERSION, tick_price] +
+                             self.to_row(tick_price), use_bin_type=True)
+
+    @classmethod
+    def from_bytes(cls, data: bytes):
+        """
+        Decode model from bytes created by to_bytes
+        :param data: bytes
+        :return: model instance
+        :raise ValueError
+        """
+        version, tick_price, *row = msgpack.unpackb(data, raw=False)
+
+        if version != SCHEMA_VERSION:
+            raise ValueError("unsupported schema version: {}".format(version))
+
+        return cls.from_row(row, tick_price)
 
     def __getattr__(self, item):
-        if item not in self.__slots__:
+        # only reached when slot is deleted or name is invalid
+        try:
+            return self._defaults_[item]
+        except KeyError:
             raise AttributeError("invalid attribute name: {}".format(item))
 
-        return self.__slots__[item]
-
     def __getitem__(self, item):
         try:
             return getattr(self, item)
@@ -63,34 +316,51 @@ class Order(DataModel):
 
     _required_columns_ = {"orderID"}
 
+    # raw values passed to _post_load_, _NOT_SET if not given
+    _post_load_columns_ = ("orderQty", "side", "leavesQty")
+
+    _price_columns_ = ("price", "stopPx")
+
     _column_mapper_ = {
-        "side": lambda v: create_enum_by_name(Direction, v),
-        "ordStatus": lambda v: create_enum_by_name(OrderStatus, v),
-        "ordType": lambda v: create_enum_by_name(OrderType, v),
-        "timeInForce": lambda v: create_enum_by_name(TimeCondition, v),
+        "side": enum_decoder(Direction),
+        "ordStatus": enum_decoder(OrderStatus),
+        "ordType": enum_decoder(OrderType),
+        "timeInForce": enum_decoder(TimeCondition),
         "timestamp": make_datetime,
         "transactTime": make_datetime
     }
 
-    def __init__(self, **kwargs):
-        super(Order, self).__init__(**kwargs)
+    @classmethod
+    def lazy(cls, raw: dict) -> "LazyOrder":
+        """
+        Create order from raw payload row(websocket / REST), mapped
+        columns(enum, datetime) are decoded on first access, except side
+        which is decoded and validated with quantity here.
+        Raw row is kept by reference, pass a copy if it will be modified.
+        :param raw: column name -> raw value
+        :return: LazyOrder
+        :raise AttributeError, TypeError, ValueError
+        """
+        order = LazyOrder.__new__(LazyOrder)
+        order._raw_ = raw
+        order._lazy_init_(**raw)
 
-        if "orderQty" in kwargs:
-            qty = kwargs["orderQty"]
+        return order
 
-            if "side" in kwargs:
-                if (qty > 0) ^ (self["side"].value > 0):
+    def _post_load_(self, orderQty, side, leavesQty):
+        if orderQty is not _NOT_SET:
+            if side is not _NOT_SET:
+                if (orderQty > 0) ^ (self.side.value > 0):
                     raise ValueError(
                         "order quantity[{}] mis-match with order side[{}]"
-                        .format(qty, kwargs["side"]))
+                        .format(orderQty, side))
             else:
-                setattr(self, "side",
-                        Direction(qty / abs(qty)))
+                self.side = Direction(orderQty / abs(orderQty))
 
-            setattr(self, "orderQty", abs(qty))
+            self.orderQty = abs(orderQty)
 
-        if "leavesQty" not in kwargs:
-            setattr(self, "leavesQty", self["orderQty"])
+        if leavesQty is _NOT_SET:
+            self.leavesQty = self.orderQty
 
     def __eq__(self, other):
         """
@@ -99,8 +369,8 @@ class Order(DataModel):
         :param other:
         :return:
         """
-        return (self["orderID"] == other["orderID"] and
-                self["timestamp"] == other["timestamp"])
+        return (self.orderID == other["orderID"] and
+                self.timestamp == other["timestamp"])
 
     def __lt__(self, other):
         """
@@ -122,7 +392,47 @@ class Order(DataModel):
         Order id used as hash object
         :return:
         """
-        return hash(self["orderID"])
+        return hash(self.orderID)
+
+
+class LazyOrder(Order):
+    """
+    Order created by Order.lazy, mapped columns not accessed yet are kept
+    in raw row, and decoded(then cached in slot) on first access, so decode
+    error of a column is raised on its first access.
+    """
+
+    __slots__ = ("_raw_",)
+
+    def resolve(self) -> "LazyOrder":
+        """
+        Decode all remained columns and release raw row
+        :return: self
+        """
+        for column in self._column_mapper_:
+            getattr(self, column)
+
+        self._raw_ = _EMPTY_ROW
+
+        return self
+
+    def __getattr__(self, item):
+        try:
+            value = self._defaults_[item]
+        except KeyError:
+            raise AttributeError("invalid attribute name: {}".format(item))
+
+        raw = self._raw_
+
+        if item in raw:
+            value = raw[item]
+
+            if item in self._column_mapper_:
+                value = self._column_mapper_[item](value)
+
+        setattr(self, item, value)
+
+        return value
 
 
 class Trade(DataModel):
@@ -134,8 +444,24 @@ class Trade(DataModel):
 
     _column_mapper_ = {
         "timestamp": make_datetime,
-        "tickDirection": lambda v: create_enum_by_name(Direction, v),
-        "side": lambda v: create_enum_by_name(Direction, v)
+        "tickDirection": enum_decoder(Direction),
+        "side": enum_decoder(Direction)
     }
 
     _required_columns_ = {"symbol", "timestamp"}
+
+    _price_columns_ = ("price",)
+
+
+def use_epoch_timestamp(enabled: bool = True):
+    """
+    Keep timestamp columns of Order and Trade as integer epoch nanoseconds
+    instead of datetime, datetime creation is skipped entirely.
+    :param enabled: False to restore datetime columns
+    """
+    mapper = make_epoch_ns if enabled else make_datetime
+
+    for model, columns in ((Order, ("timestamp", "transactTime")),
+                           (Trade, ("timestamp",))):
+        for column in columns:
+            model.set_column_mapper(column, mapper)
@@ -0,0 +1,84 @@
+# coding: utf-8
+import unittest
+
+from unittest import mock
+
+from .. import analytics
+from ..core import OrderBook
+from ..const import Direction
+from ..structure import Order
+
+
+class BookAnalyticsTest(unittest.TestCase):
+    _SYMBOL = "XBTUSD"
+    _TICK_PRICE = 0.5
+
+    def setUp(self) -> None:
+        self.ob = OrderBook(symbol=self._SYMBOL, tick_price=self._TICK_PRICE)
+
+        for idx, (price, qty) in enumerate(((100.0, 3), (99.5, 1),
+                                            (99.5, 2), (98.0, 4))):
+            self.ob.add_order(Order(orderID="b{}".format(idx), price=price,
+                                    orderQty=qty))
+
+        for idx, (price, qty) in enumerate(((101.0, 1), (101.5, 2),
+                                            (102.0, 5))):
+            self.ob.add_order(Order(orderID="s{}".format(idx), price=price,
+                                    orderQty=-qty))
+
+    def check_metrics(self):
+        stats = self.ob.analytics()
+
+        self.assertEqual(1.0, stats.spread())
+        self.assertEqual(100.5, stats.mid())
+        self.assertEqual((100.0 * 1 + 101.0 * 3) / 4, stats.microprice())
+
+        prices, cum_sizes = stats.cumulative_depth("Buy")
+        self.assertEqual([100.0, 99.5, 98.0], list(prices))
+        self.assertEqual([3, 6, 10], list(cum_sizes))
+
+        self.assertEqual(6, stats.depth_at_price(Direction.Buy, 99.5))
+        self.assertEqual(6, stats.depth_at_price(Direction.Buy, 99.0))
+        self.assertEqual(0, stats.depth_at_price(Direction.Buy, 100.5))
+        self.assertEqual(3, stats.depth_at_price("Sell", 101.5))
+        self.assertEqual(8, stats.depth_at_price("Sell", 110.0))
+
+        self.assertEqual(101.0, stats.vwap("Buy", 1))
+        self.assertEqual((101.0 + 101.5 * 2 + 102.0) / 4,
+                         stats.vwap(Direction.Buy, 4))
+        self.assertEqual((100.0 * 3 + 99.5) / 4,
+                         stats.vwap(Direction.Sell, 4))
+        self.assertIsNone(stats.vwap(Direction.Buy, 9))
+
+        size, vwap, slippage = stats.impact(Direction.Buy, 101.0 + 203.0)
+        self.assertEqual(3, size)
+        self.assertAlmostEqual(304.0 / 3, vwap)
+        self.assertAlmostEqual(304.0 / 3 - 101.0, slippage)
+
+        size, vwap, slippage = stats.impact(Direction.Sell, 350.0)
+        self.assertAlmostEqual(3 + 50.0 / 99.5, size)
+        self.assertGreater(slippage, 0)
+        self.assertIsNone(stats.impact(Direction.Sell, 1e6))
+
+        top = self.ob.analytics(depth=1)
+        self.assertEqual(3, top.depth_at_price(Direction.Buy, 90.0))
+
+        self.ob.clear()
+        stats = self.ob.analytics()
+        self.assertIsNone(stats.mid())
+        self.assertIsNone(stats.microprice())
+        self.assertIsNone(stats.vwap(Direction.Buy, 1))
+        self.assertEqual(0, stats.depth_at_price(Direction.Sell, 101.0))
+
+    @unittest.skipIf(analytics.numpy is None, "numpy not installed")
+    def test_numpy(self):
+        self.assertIsInstance(self.ob.analytics().arrays("Buy")[0],
+                              analytics.numpy.ndarray)
+
+        self.check_metrics()
+
+    def test_fallback(self):
+        with mock.patch.object(analytics, "numpy", None):
+            self.assertIsInstance(self.ob.analytics().arrays("Buy")[0], list)
+
+            self.check_metrics()
@@ -3,7 +3,7 @@
 import unittest
 
 from ..const import (new_direction, Direction, OrderStatus,
-                     create_enum_by_name)
+                     create_enum_by_name, enum_decoder)
 
 
 class DirectionTest(unittest.TestCase):
@@ -76,3 +76,16 @@ class OrderStatusTest(unittest.TestCase):
 
         self.assertRaises(ValueError, create_enum_by_name,
                           OrderStatus, "test")
+
+
+class EnumDecoderTest(unittest.TestCase):
+    def test_decode(self):
+        decode = enum_decoder(OrderStatus)
+
+        self.assertIs(OrderStatus.Filled, decode("Filled"))
+        self.assertIs(OrderStatus.Filled, decode(3))
+        self.assertIs(OrderStatus.Filled, decode(OrderStatus.Filled))
+        self.assertIs(Direction.Sell, enum_decoder(Direction)(-1))
+
+        self.assertRaises(ValueError, decode, "filled")
+        self.assertRaises(ValueError, decode, 100)
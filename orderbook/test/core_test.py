@@ -1,9 +1,13 @@
 # coding: utf-8
 import unittest
+import io
 import sys
 
-from ..core import PriceLevel, MBL, OrderBook, PriceHeap
-from ..const import Direction
+from itertools import groupby
+
+from ..core import PriceLevel, MBL, OrderBook, PriceHeap, numpy
+from ..const import Direction, EventType, OrderStatus
+from ..events import BookEvent, EventRing
 from ..structure import Order
 
 
@@ -78,6 +82,28 @@ class PriceLevelTest(unittest.TestCase):
                                     r"level\[.*\]"):
             self.level.modify_order(order3)
 
+    def test_size(self):
+        order1 = Order(orderID="123", price=self._LEVEL_PRICE, orderQty=3)
+        order2 = Order(orderID="456", price=self._LEVEL_PRICE, orderQty=4)
+
+        self.assertEqual(0, self.level.size)
+
+        self.level.push_order(order1)
+        self.level.push_order(order2)
+        self.assertEqual(7, self.level.size)
+        self.assertEqual(7, self.level.leaves_size)
+
+        # modified in place
+        order1["orderQty"] = 5
+        order1["leavesQty"] = 2
+        self.level.modify_order(order1)
+        self.assertEqual(9, self.level.size)
+        self.assertEqual(6, self.level.leaves_size)
+
+        self.level.remove_order(order2)
+        self.assertEqual(5, self.level.size)
+        self.assertEqual(2, self.level.leaves_size)
+
     def test_pop(self):
         order1 = Order(orderID="123", price=self._LEVEL_PRICE)
         order2 = Order(orderID="456", price=self._LEVEL_PRICE)
@@ -108,6 +134,50 @@ class PriceLevelTest(unittest.TestCase):
         self.assertEqual(order2, self.level[0])
         self.assertEqual(order4, self.level[1])
 
+    def test_queue_position(self):
+        orders = [Order(orderID=str(idx), price=self._LEVEL_PRICE,
+                        orderQty=idx + 1) for idx in range(100)]
+
+        for order in orders:
+            self.level.push_order(order)
+
+        self.assertEqual(0, self.level.position_of("0"))
+        self.assertEqual(99, self.level.position_of("99"))
+        self.assertEqual(sum(range(1, 51)), self.level.volume_ahead("50"))
+
+        # remove every 3rd order, and partially fill head order
+        for order in orders[::3]:
+            self.level.remove_order(order)
+
+        self.level.trade_volume(1)
+
+        live = [o for o in orders if int(o["orderID"]) % 3]
+
+        self.assertEqual(live[0]["orderQty"] - 1, live[0]["leavesQty"])
+
+        for pos, order in enumerate(live):
+            self.assertEqual(pos, self.level.position_of(order["orderID"]))
+            self.assertEqual(
+                sum(o["leavesQty"] for o in live[:pos]),
+                self.level.volume_ahead(order["orderID"]))
+            self.assertEqual(order, self.level[pos])
+
+        self.assertEqual(live[-1], self.level[-1])
+        self.assertEqual(live[:5], list(self.level.iter_orders(5)))
+        self.assertEqual(live, list(self.level))
+
+        # push after removals re-compacts sequence numbers
+        for idx in range(100, 300):
+            self.level.push_order(Order(orderID=str(idx),
+                                        price=self._LEVEL_PRICE, orderQty=1))
+
+        self.assertEqual(len(live) + 199, self.level.position_of("299"))
+
+        with self.assertRaisesRegex(ValueError,
+                                    r"order\[.*\] not exists in current "
+                                    r"level\[.*\]"):
+            self.level.volume_ahead("0")
+
     def test_trade(self):
         order1 = Order(orderID="123", price=self._LEVEL_PRICE, orderQty=1)
         order2 = Order(orderID="456", price=self._LEVEL_PRICE, orderQty=2)
@@ -120,6 +190,8 @@ class PriceLevelTest(unittest.TestCase):
         self.level.push_order(order4)
 
         self.assertTrue(self._LEVEL_PRICE in self.mbl)
+        self.assertEqual(10, self.level.size)
+        self.assertEqual(10, self.level.leaves_size)
 
         remained, orders = self.level.trade_volume(3)
         self.assertEqual(0, remained)
@@ -131,6 +203,9 @@ class PriceLevelTest(unittest.TestCase):
         self.assertEqual(order4, self.level[0])
         self.assertEqual(3, self.level[0]["leavesQty"])
 
+        self.assertEqual(4, self.level.size)
+        self.assertEqual(3, self.level.leaves_size)
+
         remained, orders = self.level.trade_volume(5)
         self.assertEqual(2, remained)
         self.assertEqual([order4], [ref() for ref in orders])
@@ -199,6 +274,47 @@ class PriceHeapTest(unittest.TestCase):
         self.assertEqual(49, buy[0])
         self.assertEqual([49, 48, 47], buy.top(3))
 
+    def test_worst_price(self):
+        buy = PriceHeap(direction=Direction.Buy)
+        sell = PriceHeap(direction=Direction.Sell)
+
+        self.assertEqual(sys.float_info.max, buy.worst_price)
+        self.assertEqual(0, sell.worst_price)
+
+        for price in (5, 3, 9, 1, 7):
+            buy.push(price)
+            sell.push(price)
+
+        self.assertEqual(1, buy.worst_price)
+        self.assertEqual(9, sell.worst_price)
+
+        buy.remove(1)
+        sell.remove(9)
+
+        self.assertEqual(3, buy.worst_price)
+        self.assertEqual(7, sell.worst_price)
+
+        self.assertEqual(3, buy[-1])
+        self.assertEqual(7, sell[-1])
+
+        for price in (3, 5, 7, 9):
+            buy.remove(price)
+
+        self.assertEqual(0, len(buy))
+        self.assertEqual(sys.float_info.max, buy.worst_price)
+
+    def test_remove_missing(self):
+        heap = PriceHeap(direction=Direction.Sell)
+
+        for price in (1, 2, 3):
+            heap.push(price)
+
+        with self.assertLogs("orderbook", level="WARNING"):
+            heap.remove(4)
+
+        self.assertEqual([1, 2, 3], heap.top(5))
+        self.assertEqual([], heap.top(0))
+
 
 class MBLTest(unittest.TestCase):
     _SYMBOL = "XBTUSD"
@@ -262,3 +378,593 @@ class MBLTest(unittest.TestCase):
         with self.assertRaisesRegex(ValueError,
                                     "level is already append to another mbl."):
             self.sell.append_level(level2)
+
+
+class OrderBookTest(unittest.TestCase):
+    _SYMBOL = "XBTUSD"
+    _TICK_PRICE = 0.5
+
+    def test_integer_ticks(self):
+        ob = OrderBook(symbol=self._SYMBOL, tick_price=self._TICK_PRICE,
+                       integer_ticks=True)
+
+        self.assertTrue(ob.integer_ticks)
+        self.assertEqual(201, ob.price_key(100.3))
+        self.assertEqual(100.5, ob.key_price(201))
+
+        ob.buy_mbl.add_order(Order(orderID="1", price=100.3, orderQty=1))
+        ob.buy_mbl.add_order(Order(orderID="2", price=100.5, orderQty=2))
+        ob.buy_mbl.add_order(Order(orderID="3", price=99.9, orderQty=3))
+
+        self.assertEqual(2, ob.buy_mbl.depth)
+        self.assertEqual(100.5, ob.buy_mbl.best_price)
+        self.assertIsInstance(ob.buy_mbl.best_price, float)
+        self.assertEqual(201, ob.buy_mbl.best_level.level_key)
+        self.assertEqual(100.5, ob.buy_mbl.best_level.level_price)
+        self.assertEqual(2, ob.buy_mbl.best_level.count)
+
+        self.assertTrue(100.4 in ob.buy_mbl)
+        self.assertEqual(100.0, ob.buy_mbl[100.1].level_price)
+        self.assertIsNone(ob.buy_mbl[101.0])
+
+        ob.buy_mbl[100.5].remove_order_by_id("1")
+        ob.buy_mbl[100.5].remove_order_by_id("2")
+
+        self.assertEqual(1, ob.buy_mbl.depth)
+        self.assertEqual(100.0, ob.buy_mbl.best_price)
+
+    def test_float_price_key(self):
+        ob = OrderBook(symbol=self._SYMBOL, tick_price=self._TICK_PRICE)
+
+        self.assertFalse(ob.integer_ticks)
+        self.assertEqual(100.5, ob.price_key(100.3))
+        self.assertEqual(100.5, ob.key_price(100.5))
+
+    def test_order_index(self):
+        ob = OrderBook(symbol=self._SYMBOL, tick_price=self._TICK_PRICE)
+
+        ob.add_order(Order(orderID="b1", price=100.0, orderQty=1))
+        ob.add_order(Order(orderID="b2", price=100.0, orderQty=2))
+        ob.add_order(Order(orderID="s1", price=101.0, orderQty=-3))
+
+        with self.assertRaisesRegex(ValueError,
+                                    r"order\[.*\] already exists."):
+            ob.add_order(Order(orderID="b1", price=99.0, orderQty=1))
+
+        self.assertEqual(Direction.Sell, ob.get_order("s1")["side"])
+        self.assertEqual(2, ob.get_order("b2")["orderQty"])
+        self.assertIsNone(ob.get_order("foo"))
+
+        self.assertEqual("b1", ob.cancel("b1")["orderID"])
+        self.assertIsNone(ob.get_order("b1"))
+
+        with self.assertRaisesRegex(ValueError, r"order\[.*\] not exists."):
+            ob.cancel("b1")
+
+        remained, _ = ob.sell_mbl.trade_volume(3)
+        self.assertEqual(0, remained)
+        self.assertIsNone(ob.get_order("s1"))
+        self.assertEqual(0, ob.sell_mbl.depth)
+
+        self.assertIsNotNone(ob.get_order("b2"))
+
+    def test_amend(self):
+        ob = OrderBook(symbol=self._SYMBOL, tick_price=self._TICK_PRICE)
+
+        for idx in range(3):
+            ob.add_order(Order(orderID=str(idx), price=100.0, orderQty=5))
+
+        # reduce quantity keeps time priority
+        order = ob.amend("0", qty=3)
+        self.assertEqual(3, order["orderQty"])
+        self.assertEqual(3, order["leavesQty"])
+        self.assertEqual(order, ob.buy_mbl[100.0][0])
+
+        # increase quantity loses time priority
+        ob.amend("0", qty=6)
+        self.assertEqual(order, ob.buy_mbl[100.0][2])
+        self.assertEqual(6, ob.get_order("0")["leavesQty"])
+
+        # unless priority is kept explicitly
+        order = ob.amend("2", qty=8, keep_priority=True)
+        self.assertEqual(order, ob.buy_mbl[100.0][1])
+        self.assertEqual(19, ob.buy_mbl[100.0].leaves_size)
+
+        # price change moves order to new level
+        order = ob.amend("1", price=100.8)
+        self.assertEqual(101.0, order["price"])
+        self.assertEqual(101.0, ob.buy_mbl.best_price)
+        self.assertEqual(2, ob.buy_mbl[100.0].count)
+        self.assertIs(order, ob.get_order("1"))
+
+        # quantity under filled quantity cancels order
+        order["leavesQty"] = 1
+        ob.amend("1", qty=4)
+        self.assertIsNone(ob.get_order("1"))
+        self.assertEqual(100.0, ob.buy_mbl.best_price)
+
+        with self.assertRaisesRegex(ValueError, r"order\[.*\] not exists."):
+            ob.amend("foo", qty=1)
+
+    def test_depth_snapshot(self):
+        ob = OrderBook(symbol=self._SYMBOL, tick_price=self._TICK_PRICE,
+                       integer_ticks=True)
+
+        for idx, price in enumerate((100.0, 100.5, 100.5, 99.0, 98.5)):
+            ob.add_order(Order(orderID="b{}".format(idx), price=price,
+                               orderQty=idx + 1))
+            ob.add_order(Order(orderID="s{}".format(idx), price=price + 5,
+                               orderQty=-(idx + 1)))
+
+        self.assertEqual([(100.5, 5, 2), (100.0, 1, 1), (99.0, 4, 1)],
+                         ob.buy_mbl.depth_snapshot(3))
+        self.assertEqual([(103.5, 5, 1), (104.0, 4, 1), (105.0, 1, 1),
+                          (105.5, 5, 2)],
+                         ob.sell_mbl.depth_snapshot(10))
+
+        ob.sell_mbl.trade_volume(9)
+        self.assertEqual([(105.0, 1, 1), (105.5, 5, 2)],
+                         ob.sell_mbl.depth_snapshot(10))
+
+        ob.sell_mbl.trade_volume(2)
+        self.assertEqual([(105.5, 4, 2)], ob.sell_mbl.depth_snapshot(10))
+        self.assertEqual(5, ob.sell_mbl.best_level.size)
+        self.assertEqual([], ob.sell_mbl.depth_snapshot(0))
+
+    def test_top_levels(self):
+        ob = OrderBook(symbol=self._SYMBOL, tick_price=self._TICK_PRICE)
+
+        for idx, price in enumerate((100.0, 100.5, 100.5, 99.0)):
+            ob.add_order(Order(orderID="b{}".format(idx), price=price,
+                               orderQty=idx + 1))
+
+        ob.add_order(Order(orderID="s0", price=101.0, orderQty=-2))
+
+        top = ob.top_levels(2)
+
+        self.assertEqual([(100.5, 5, 2), (100.0, 1, 1)], top.bids)
+        self.assertEqual([(101.0, 2, 1)], top.asks)
+
+        ob.cancel("b1")
+        ob.add_order(Order(orderID="b4", price=100.5, orderQty=1))
+
+        self.assertEqual(([(100.5, 4, 2), (100.0, 1, 1), (99.0, 4, 1)],
+                          [(101.0, 2, 1)]),
+                         ob.top_levels(3))
+
+    @unittest.skipIf(numpy is None, "numpy not installed")
+    def test_top_levels_array(self):
+        ob = OrderBook(symbol=self._SYMBOL, tick_price=self._TICK_PRICE)
+
+        ob.add_order(Order(orderID="b0", price=100.0, orderQty=1))
+        ob.add_order(Order(orderID="b1", price=99.5, orderQty=2))
+        ob.add_order(Order(orderID="s0", price=101.0, orderQty=-3))
+
+        array = ob.top_levels(2).to_array()
+
+        self.assertEqual((2, 2, 3), array.shape)
+        self.assertEqual([[100.0, 1, 1], [99.5, 2, 1]], array[0].tolist())
+        self.assertEqual([[101.0, 3, 1], [0, 0, 0]], array[1].tolist())
+        self.assertEqual((2, 1, 3), ob.top_levels().to_array(1).shape)
+
+
+class MatchingTest(unittest.TestCase):
+    _SYMBOL = "XBTUSD"
+    _TICK_PRICE = 0.5
+
+    def setUp(self) -> None:
+        self.ob = OrderBook(symbol=self._SYMBOL, tick_price=self._TICK_PRICE)
+
+        for idx, price in enumerate((101.0, 101.0, 101.5, 102.0)):
+            self.ob.add_order(Order(orderID="s{}".format(idx), price=price,
+                                    orderQty=-(idx + 1)))
+
+        for idx, price in enumerate((100.0, 99.5)):
+            self.ob.add_order(Order(orderID="b{}".format(idx), price=price,
+                                    orderQty=idx + 1))
+
+    def test_limit(self):
+        order = Order(orderID="t1", side="Buy", orderQty=5, price=101.5)
+
+        trades = self.ob.submit(order)
+
+        self.assertEqual([(101.0, 1), (101.0, 2), (101.5, 2)],
+                         [(t.price, t.size) for t in trades])
+        self.assertTrue(all(t.side == Direction.Buy for t in trades))
+        self.assertEqual(self._SYMBOL, trades[0].symbol)
+        self.assertEqual(3, len({t.trdMatchID for t in trades}))
+
+        self.assertEqual(OrderStatus.Filled, order.ordStatus)
+        self.assertEqual(0, order.leavesQty)
+        self.assertEqual(5, order.cumQty)
+        self.assertAlmostEqual((101.0 * 3 + 101.5 * 2) / 5, order.avgPx)
+
+        self.assertIsNone(self.ob.get_order("s0"))
+        maker = self.ob.get_order("s2")
+        self.assertEqual(OrderStatus.PartiallyFilled, maker.ordStatus)
+        self.assertEqual(1, maker.leavesQty)
+        self.assertEqual(2, maker.cumQty)
+        self.assertEqual(101.5, self.ob.sell_mbl.best_price)
+
+        # remained quantity rests on book
+        order = Order(orderID="t2", side="Sell", orderQty=-4, price=99.8)
+        trades = self.ob.submit(order)
+
+        self.assertEqual([(100.0, 1)], [(t.price, t.size) for t in trades])
+        self.assertEqual(OrderStatus.PartiallyFilled, order.ordStatus)
+        self.assertIs(order, self.ob.get_order("t2"))
+        self.assertEqual(100.0, self.ob.sell_mbl.best_price)
+        self.assertEqual(3, self.ob.sell_mbl.best_level.leaves_size)
+        self.assertEqual(99.5, self.ob.buy_mbl.best_price)
+
+        # no cross
+        order = Order(orderID="t3", side="Buy", orderQty=1, price=99.5)
+        self.assertEqual([], self.ob.submit(order))
+        self.assertEqual(OrderStatus.New, order.ordStatus)
+        self.assertEqual(2, self.ob.buy_mbl.best_level.count)
+
+        with self.assertRaisesRegex(ValueError,
+                                    r"order\[.*\] already exists."):
+            self.ob.submit(order)
+
+    def test_market(self):
+        order = Order(orderID="t1", side="Buy", orderQty=20,
+                      ordType="Market")
+
+        trades = self.ob.submit(order)
+
+        self.assertEqual(10, sum(t.size for t in trades))
+        self.assertEqual(OrderStatus.PartiallyFilledCanceled,
+                         order.ordStatus)
+        self.assertEqual(10, order.leavesQty)
+        self.assertEqual(0, self.ob.sell_mbl.depth)
+        self.assertIsNone(self.ob.get_order("t1"))
+
+        order = Order(orderID="t2", side="Buy", orderQty=1,
+                      ordType="Market")
+        self.assertEqual([], self.ob.submit(order))
+        self.assertEqual(OrderStatus.Canceled, order.ordStatus)
+
+    def test_ioc(self):
+        order = Order(orderID="t1", side="Buy", orderQty=5, price=101.0,
+                      timeInForce="ImmediateOrCancel")
+
+        trades = self.ob.submit(order)
+
+        self.assertEqual(3, sum(t.size for t in trades))
+        self.assertEqual(OrderStatus.PartiallyFilledCanceled,
+                         order.ordStatus)
+        self.assertIsNone(self.ob.get_order("t1"))
+        self.assertEqual(101.5, self.ob.sell_mbl.best_price)
+
+    def test_fok(self):
+        order = Order(orderID="t1", side="Buy", orderQty=7, price=101.5,
+                      timeInForce="FillOrKill")
+
+        self.assertEqual([], self.ob.submit(order))
+        self.assertEqual(OrderStatus.Canceled, order.ordStatus)
+        self.assertEqual(7, order.leavesQty)
+        self.assertEqual(101.0, self.ob.sell_mbl.best_price)
+        self.assertEqual(3, self.ob.sell_mbl.best_level.leaves_size)
+
+        order = Order(orderID="t2", side="Buy", orderQty=6, price=101.5,
+                      timeInForce="FillOrKill")
+
+        self.assertEqual(3, len(self.ob.submit(order)))
+        self.assertEqual(OrderStatus.Filled, order.ordStatus)
+        self.assertEqual(102.0, self.ob.sell_mbl.best_price)
+
+    def test_unsupported(self):
+        order = Order(orderID="t1", side="Buy", orderQty=1, price=101.0,
+                      ordType="StopLimit")
+
+        with self.assertRaisesRegex(ValueError, r"is not supported"):
+            self.ob.submit(order)
+
+
+class BatchTest(unittest.TestCase):
+    _SYMBOL = "XBTUSD"
+    _TICK_PRICE = 0.5
+
+    def test_add_orders(self):
+        ob = OrderBook(symbol=self._SYMBOL, tick_price=self._TICK_PRICE)
+
+        ob.add_order(Order(orderID="0", price=100.0, orderQty=1))
+
+        orders = [Order(orderID=str(idx), price=100.0 - (idx % 5) * 0.5,
+                        orderQty=idx) for idx in range(1, 21)]
+
+        self.assertEqual(20, ob.buy_mbl.add_orders(orders))
+        self.assertEqual(5, ob.buy_mbl.depth)
+        self.assertEqual([100.0, 99.5, 99.0, 98.5, 98.0],
+                         [p for p, _, _ in ob.buy_mbl.depth_snapshot(5)])
+        self.assertEqual(
+            (100.0, 1 + 5 + 10 + 15 + 20, 5),
+            ob.buy_mbl.depth_snapshot(1)[0])
+
+        # time priority kept within level
+        level = ob.buy_mbl[100.0]
+        self.assertEqual(["0", "5", "10", "15", "20"],
+                         [o["orderID"] for o in level])
+        self.assertEqual(3, level.position_of("15"))
+        self.assertEqual(16, level.volume_ahead("15"))
+
+        self.assertIs(orders[0], ob.get_order("1"))
+        self.assertEqual(99.5, ob.cancel("1")["price"])
+
+        with self.assertRaisesRegex(ValueError, r"mis-match with current"):
+            ob.buy_mbl.add_orders(
+                [Order(orderID="foo", price=100.0, orderQty=-1)])
+
+    def test_load_snapshot(self):
+        ob = OrderBook(symbol=self._SYMBOL, tick_price=self._TICK_PRICE,
+                       integer_ticks=True)
+
+        ob.add_order(Order(orderID="foo", price=1.0, orderQty=1))
+
+        rows = [{"symbol": self._SYMBOL, "id": 8799000000 + idx,
+                 "side": "Sell" if idx % 2 else "Buy",
+                 "size": idx + 1,
+                 "price": 100.0 + (idx // 2 + 1) * (0.5 if idx % 2 else -0.5)}
+                for idx in range(100)]
+
+        self.assertEqual(100, ob.load_snapshot(rows))
+        self.assertIsNone(ob.get_order("foo"))
+
+        self.assertEqual(50, ob.buy_mbl.depth)
+        self.assertEqual(50, ob.sell_mbl.depth)
+        self.assertEqual(99.5, ob.buy_mbl.best_price)
+        self.assertEqual(100.5, ob.sell_mbl.best_price)
+        self.assertEqual([(99.5, 1, 1), (99.0, 3, 1)],
+                         ob.buy_mbl.depth_snapshot(2))
+        self.assertEqual([(100.5, 2, 1), (101.0, 4, 1)],
+                         ob.sell_mbl.depth_snapshot(2))
+        self.assertEqual(Direction.Sell, ob.get_order("8799000001").side)
+
+        ob.clear()
+        self.assertEqual(0, ob.buy_mbl.depth)
+        self.assertEqual(0, ob.sell_mbl.depth)
+        self.assertIsNone(ob.get_order("8799000001"))
+
+        # empty levels in snapshot are skipped
+        rows[0]["size"] = 0
+        self.assertEqual(99, ob.load_snapshot(rows))
+        self.assertIsNone(ob.get_order("8799000000"))
+        self.assertEqual(49, ob.buy_mbl.depth)
+        self.assertEqual(99.0, ob.buy_mbl.best_price)
+
+
+class CrossingTest(unittest.TestCase):
+    _SYMBOL = "XBTUSD"
+    _TICK_PRICE = 0.5
+
+    def setUp(self) -> None:
+        self.ob = OrderBook(symbol=self._SYMBOL, tick_price=self._TICK_PRICE)
+
+        for idx in range(1, 11):
+            self.ob.add_order(Order(orderID="s{}".format(idx),
+                                    price=100.0 + idx * 0.5,
+                                    orderQty=-idx))
+            self.ob.add_order(Order(orderID="b{}".format(idx),
+                                    price=100.0 - idx * 0.5,
+                                    orderQty=idx))
+
+    def test_pop_level(self):
+        level = self.ob.sell_mbl.pop_level()
+
+        self.assertEqual(100.5, level.level_price)
+        self.assertIsNone(level.mbl)
+        self.assertEqual(101.0, self.ob.sell_mbl.best_price)
+        self.assertEqual(9, self.ob.sell_mbl.depth)
+        self.assertIsNone(self.ob.get_order("s1"))
+
+        level = self.ob.buy_mbl.pop_level()
+        self.assertEqual(99.5, level.level_price)
+
+        while self.ob.buy_mbl.pop_level():
+            pass
+
+        self.assertEqual(0, self.ob.buy_mbl.depth)
+        self.assertIsNone(self.ob.buy_mbl.pop_level())
+
+    def test_pop_through(self):
+        levels = self.ob.sell_mbl.pop_levels_through(102.2)
+
+        self.assertEqual([100.5, 101.0, 101.5, 102.0],
+                         [level.level_price for level in levels])
+        self.assertEqual(102.5, self.ob.sell_mbl.best_price)
+        self.assertEqual(6, self.ob.sell_mbl.depth)
+
+        levels = self.ob.buy_mbl.pop_levels_through(98.0)
+        self.assertEqual([99.5, 99.0, 98.5, 98.0],
+                         [level.level_price for level in levels])
+        self.assertEqual(97.5, self.ob.buy_mbl.best_price)
+
+        self.assertEqual([], self.ob.buy_mbl.pop_levels_through(99.0))
+
+        levels = self.ob.buy_mbl.pop_levels_through(0.5)
+        self.assertEqual(6, len(levels))
+        self.assertEqual(0, self.ob.buy_mbl.depth)
+
+    def test_overlap_levels(self):
+        self.assertEqual((None, []), self.ob.overlap_levels(100.0))
+
+        direction, levels = self.ob.overlap_levels(101.0)
+
+        self.assertEqual(Direction.Sell, direction)
+        self.assertEqual([100.5, 101.0],
+                         [level.level_price for level in levels])
+        self.assertTrue(self.ob.in_gap(101.0))
+
+        direction, levels = self.ob.overlap_levels(97.0)
+
+        self.assertEqual(Direction.Buy, direction)
+        self.assertEqual(6, len(levels))
+        self.assertEqual(96.5, self.ob.buy_mbl.best_price)
+        self.assertIsNone(self.ob.get_order("b6"))
+        self.assertIsNotNone(self.ob.get_order("b7"))
+
+        # levels popped through whole mbl
+        direction, levels = self.ob.overlap_levels(1000.0)
+        self.assertEqual(8, len(levels))
+        self.assertEqual(0, self.ob.sell_mbl.depth)
+
+
+class CheckpointTest(unittest.TestCase):
+    _SYMBOL = "XBTUSD"
+    _TICK_PRICE = 0.5
+
+    def test_dump_load(self):
+        ob = OrderBook(symbol=self._SYMBOL, tick_price=self._TICK_PRICE,
+                       max_depth=20, integer_ticks=True)
+
+        for idx in range(1, 6):
+            ob.add_order(Order(orderID="s{}".format(idx),
+                               price=100.0 + (idx % 3) * 0.5,
+                               orderQty=-idx))
+            ob.add_order(Order(orderID="b{}".format(idx),
+                               price=99.0 - (idx % 2) * 0.5,
+                               orderQty=idx,
+                               timestamp="2019-05-24T17:07:16.123Z"))
+
+        ob.submit(Order(orderID="t1", price=100.0, orderQty=2))
+
+        stream = io.BytesIO()
+        self.assertEqual(10, ob.dump(stream))
+        stream.write(b"trailing")
+        stream.seek(0)
+
+        loaded = OrderBook.load(stream)
+
+        self.assertEqual(b"trailing", stream.read())
+        self.assertEqual(self._SYMBOL, loaded.symbol)
+        self.assertEqual(20, loaded.max_depth)
+        self.assertTrue(loaded.integer_ticks)
+
+        for side in (Direction.Buy, Direction.Sell):
+            self.assertEqual(ob[side].depth_snapshot(),
+                             loaded[side].depth_snapshot())
+
+            for level, loaded_level in zip(ob[side].iter_levels(),
+                                           loaded[side].iter_levels()):
+                self.assertEqual(
+                    [(o.orderID, o.leavesQty, o.ordStatus, o.timestamp)
+                     for o in level],
+                    [(o.orderID, o.leavesQty, o.ordStatus, o.timestamp)
+                     for o in loaded_level])
+
+        self.assertEqual(1, loaded.get_order("s3").leavesQty)
+
+        stream = io.BytesIO(b"XXXX" + bytes(10))
+        self.assertRaisesRegex(ValueError, "invalid", OrderBook.load, stream)
+
+
+class EventTest(unittest.TestCase):
+    _SYMBOL = "XBTUSD"
+    _TICK_PRICE = 0.5
+
+    def setUp(self) -> None:
+        self.ob = OrderBook(symbol=self._SYMBOL, tick_price=self._TICK_PRICE)
+
+        for idx, price in enumerate((101.0, 101.0, 101.5)):
+            self.ob.add_order(Order(orderID="s{}".format(idx), price=price,
+                                    orderQty=-(idx + 1)))
+
+        self.ob.add_order(Order(orderID="b0", price=100.0, orderQty=1))
+
+        self.events = self.ob.subscribe(EventRing())
+
+    def test_add_cancel(self):
+        self.ob.add_order(Order(orderID="b1", price=100.0, orderQty=2))
+        self.ob.add_order(Order(orderID="b2", price=99.5, orderQty=3))
+
+        self.assertEqual([
+            BookEvent(EventType.LevelChanged, Direction.Buy, 100.0, 3, 2),
+            BookEvent(EventType.BestChanged, Direction.Buy, 100.0, 3, 2),
+            BookEvent(EventType.LevelAdded, Direction.Buy, 99.5, 3, 1)
+        ], self.events.drain())
+
+        self.ob.cancel("b0")
+        self.ob.cancel("b1")
+
+        self.assertEqual([
+            BookEvent(EventType.LevelChanged, Direction.Buy, 100.0, 2, 1),
+            BookEvent(EventType.BestChanged, Direction.Buy, 100.0, 2, 1),
+            BookEvent(EventType.LevelRemoved, Direction.Buy, 100.0, 0, 0),
+            BookEvent(EventType.BestChanged, Direction.Buy, 99.5, 3, 1)
+        ], self.events.drain())
+
+        self.assertRaises(ValueError, self.ob.cancel, "b0")
+        self.assertEqual([], self.events.drain())
+
+    def test_submit(self):
+        trades = self.ob.submit(Order(orderID="t1", price=101.5,
+                                      orderQty=5))
+
+        events = self.events.drain()
+
+        self.assertEqual(trades, [e.trade for e in events[:3]])
+        self.assertEqual([
+            BookEvent(EventType.LevelRemoved, Direction.Sell, 101.0, 0, 0),
+            BookEvent(EventType.LevelChanged, Direction.Sell, 101.5, 1, 1),
+            BookEvent(EventType.BestChanged, Direction.Sell, 101.5, 1, 1)
+        ], events[3:])
+
+        self.ob.submit(Order(orderID="t2", price=102.0, orderQty=2))
+
+        events = self.events.drain()
+
+        self.assertEqual([EventType.Trade, EventType.LevelRemoved,
+                          EventType.LevelAdded, EventType.BestChanged,
+                          EventType.BestChanged],
+                         [e.type for e in events])
+        self.assertEqual([
+            BookEvent(EventType.BestChanged, Direction.Sell, None, 0, 0),
+            BookEvent(EventType.BestChanged, Direction.Buy, 102.0, 1, 1)
+        ], events[-2:])
+
+    def test_clear(self):
+        self.ob.clear()
+
+        self.assertEqual({(EventType.LevelRemoved, 3),
+                          (EventType.BestChanged, 2)},
+                         {(t, len(list(e))) for t, e in groupby(
+                             sorted(self.events.drain()),
+                             key=lambda e: e.type)})
+
+    def test_unsubscribe(self):
+        def failed(event):
+            raise RuntimeError(event)
+
+        self.ob.subscribe(failed)
+        self.ob.unsubscribe(self.events)
+
+        self.ob.add_order(Order(orderID="b1", price=99.0, orderQty=2))
+
+        self.assertEqual(0, len(self.events))
+        self.assertIsNotNone(self.ob.get_order("b1"))
+        self.assertRaises(ValueError, self.ob.unsubscribe, self.events)
+
+        self.ob.unsubscribe(failed)
+        self.assertNotIn("add_order", vars(self.ob))
+
+    def test_conflate(self):
+        ring = EventRing(capacity=2, conflate=True)
+        self.ob.subscribe(ring)
+
+        for idx in range(3):
+            self.ob.add_order(Order(orderID="b{}".format(idx + 1),
+                                    price=100.0, orderQty=1))
+
+        self.assertEqual(6, len(self.events.drain()))
+        self.assertEqual([
+            BookEvent(EventType.LevelChanged, Direction.Buy, 100.0, 4, 4),
+            BookEvent(EventType.BestChanged, Direction.Buy, 100.0, 4, 4)
+        ], ring.drain())
+
+        self.ob.add_order(Order(orderID="b4", price=99.0, orderQty=1))
+        self.ob.add_order(Order(orderID="b5", price=98.0, orderQty=1))
+        self.ob.add_order(Order(orderID="b6", price=97.0, orderQty=1))
+
+        self.assertEqual([98.0, 97.0], [e.price for e in ring.drain()])
+        self.assertEqual(1, ring.dropped)
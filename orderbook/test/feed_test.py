@@ -0,0 +1,111 @@
+# coding: utf-8
+import sys
+import threading
+import unittest
+
+from ..const import Direction
+from ..feed import L2BookFeed
+
+
+class L2BookFeedTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.feed = L2BookFeed(
+            tick_price=lambda symbol: 0.5 if symbol == "XBTUSD" else None)
+
+        self.feed.apply("partial", [
+            {"symbol": "XBTUSD", "id": 1, "side": "Sell", "size": 5,
+             "price": 101.0},
+            {"symbol": "XBTUSD", "id": 2, "side": "Buy", "size": 3,
+             "price": 100.0},
+            {"symbol": "XBTUSD", "id": 3, "side": "Buy", "size": 4,
+             "price": 99.5},
+            {"symbol": "ETHUSD", "id": 7, "side": "Buy", "size": 1,
+             "price": 10.05}])
+
+    def test_partial(self):
+        book = self.feed.book("XBTUSD")
+
+        self.assertEqual(0.5, book.tick_price)
+        self.assertEqual(([(100.0, 3, 1), (99.5, 4, 1)], [(101.0, 5, 1)]),
+                         book.top_levels())
+        self.assertEqual([(10.05, 1, 1)],
+                         self.feed.book("ETHUSD").top_levels().bids)
+        self.assertIsNone(self.feed.book("LTCUSD"))
+
+        self.feed.apply("partial", [
+            {"symbol": "XBTUSD", "id": 4, "side": "Sell", "size": 1,
+             "price": 102.0}])
+        self.assertEqual(([], [(102.0, 1, 1)]), book.top_levels())
+
+        # empty partial of a symbol, e.g. on resubscribe
+        self.assertEqual(0, self.feed.apply("partial", [], "ETHUSD"))
+        self.assertEqual(([], []), self.feed.book("ETHUSD").top_levels())
+        self.assertEqual(([], [(102.0, 1, 1)]), book.top_levels())
+
+    def test_integral_tick_price(self):
+        feed = L2BookFeed(tick_price=lambda symbol: 1)
+
+        feed.apply("partial", [{"symbol": "XBTUSD", "id": 1, "side": "Buy",
+                                "size": 5, "price": 100}])
+
+        self.assertEqual(1.0, feed.book("XBTUSD").tick_price)
+        self.assertEqual([(100.0, 5, 1)],
+                         feed.book("XBTUSD").top_levels().bids)
+
+    def test_actions(self):
+        feed = self.feed
+        book = feed.book("XBTUSD")
+
+        self.assertEqual(2, feed.apply("insert", [
+            {"symbol": "XBTUSD", "id": 5, "side": "Sell", "size": 2,
+             "price": 100.5},
+            {"symbol": "XBTUSD", "id": 2, "side": "Buy", "size": 6,
+             "price": 100.0}]))
+        self.assertEqual(1, feed.apply("update", [
+            {"symbol": "XBTUSD", "id": 1, "side": "Sell", "size": 8},
+            {"symbol": "XBTUSD", "id": 9, "side": "Sell", "size": 8}]))
+        self.assertEqual(1, feed.apply("delete", [
+            {"symbol": "XBTUSD", "id": 3, "side": "Buy"},
+            {"symbol": "LTCUSD", "id": 3, "side": "Buy"}]))
+
+        self.assertEqual(([(100.0, 6, 1)], [(100.5, 2, 1), (101.0, 8, 1)]),
+                         book.top_levels())
+
+        # level switched side
+        feed.apply("update", [
+            {"symbol": "XBTUSD", "id": 5, "side": "Buy", "size": 1}])
+        self.assertEqual(Direction.Buy, book.get_order("5").side)
+        self.assertEqual(([(100.5, 1, 1), (100.0, 6, 1)], [(101.0, 8, 1)]),
+                         book.top_levels())
+
+        self.assertRaises(ValueError, feed.apply, "foo", [])
+
+    def test_concurrent_read(self):
+        feed = self.feed
+        stop = threading.Event()
+
+        def churn():
+            rows = [{"symbol": "XBTUSD", "id": 100 + idx, "side": "Buy",
+                     "size": 1, "price": 90.0 - idx} for idx in range(20)]
+
+            while not stop.is_set():
+                feed.apply("insert", rows)
+                feed.apply("delete", rows)
+
+        # switch threads as often as possible
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+
+        thread = threading.Thread(target=churn)
+        thread.start()
+
+        try:
+            for _ in range(2000):
+                top = feed.top_levels("XBTUSD", 50)
+                self.assertEqual((100.0, 3, 1), top.bids[0])
+        finally:
+            stop.set()
+            thread.join()
+            sys.setswitchinterval(interval)
+
+        self.assertIsNone(feed.top_levels("LTCUSD"))
@@ -0,0 +1,187 @@
+# coding: utf-8
+import os
+import shutil
+import tempfile
+import unittest
+
+from ..persist import (write_snapshot, SnapshotReader, Journal,
+                       JournaledOrderBook)
+from ..core import OrderBook, PriceLevel
+from ..const import Direction
+from ..structure import Order
+
+
+class PersistTest(unittest.TestCase):
+    _SYMBOL = "XBTUSD"
+    _TICK_PRICE = 0.5
+
+    def setUp(self) -> None:
+        self.path = tempfile.mkdtemp()
+        self.snapshot_path = os.path.join(self.path, "book.snap")
+        self.journal_path = os.path.join(self.path, "book.journal")
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.path)
+
+    def fill_book(self, book):
+        for idx in range(1, 11):
+            book.add_order(Order(orderID="s{}".format(idx),
+                                 price=100.0 + (idx % 4) * 0.5,
+                                 orderQty=-idx))
+            book.add_order(Order(orderID="b{}".format(idx),
+                                 price=99.5 - (idx % 3) * 0.5,
+                                 orderQty=idx))
+
+    def assertBookEqual(self, book, other):
+        for side in (Direction.Buy, Direction.Sell):
+            self.assertEqual(book[side].depth_snapshot(),
+                             other[side].depth_snapshot())
+
+            self.assertEqual(
+                [[(o.orderID, o.leavesQty) for o in level]
+                 for level in book[side].iter_levels()],
+                [[(o.orderID, o.leavesQty) for o in level]
+                 for level in other[side].iter_levels()])
+
+    def test_snapshot(self):
+        book = OrderBook(symbol=self._SYMBOL, tick_price=self._TICK_PRICE)
+        self.fill_book(book)
+
+        write_snapshot(book, self.snapshot_path, sequence=7)
+
+        with SnapshotReader(self.snapshot_path) as reader:
+            self.assertEqual(self._SYMBOL, reader.symbol)
+            self.assertEqual(7, reader.sequence)
+            self.assertEqual(3, reader.depth(Direction.Buy))
+            self.assertEqual(book.sell_mbl.depth_snapshot(2),
+                             reader.levels(Direction.Sell, 2))
+            self.assertEqual(
+                [o.orderID for o in book.buy_mbl.best_level],
+                [o.orderID for o in reader.level_orders(Direction.Buy, 0)])
+
+            self.assertRaises(IndexError, reader.level_orders,
+                              Direction.Buy, 3)
+
+            self.assertBookEqual(book, reader.restore())
+
+        with open(self.journal_path, "wb") as f:
+            f.write(b"foo")
+
+        self.assertRaises(ValueError, SnapshotReader, self.journal_path)
+
+    def test_lazy_restore(self):
+        book = OrderBook(symbol=self._SYMBOL, tick_price=self._TICK_PRICE)
+        self.fill_book(book)
+
+        write_snapshot(book, self.snapshot_path)
+
+        with SnapshotReader(self.snapshot_path) as reader:
+            restored = reader.restore()
+
+        levels = list(restored.buy_mbl.iter_levels())
+
+        # aggregated reads decode nothing
+        self.assertEqual(book.top_levels(), restored.top_levels())
+        self.assertEqual(book.sell_mbl.depth_snapshot(),
+                         restored.sell_mbl.depth_snapshot())
+        self.assertEqual([book.buy_mbl[level.level_price].size
+                          for level in levels],
+                         [level.size for level in levels])
+        self.assertFalse(any(type(level) is PriceLevel
+                             for level in levels))
+
+        # order access decodes the level only
+        self.assertEqual(99.0, restored.get_order("b1").price)
+        self.assertIs(PriceLevel, type(restored.buy_mbl[99.0]))
+        self.assertIsNot(PriceLevel, type(restored.buy_mbl[99.5]))
+
+        restored.cancel("b3")
+        restored.add_order(Order(orderID="b11", price=98.5, orderQty=1))
+        self.assertEqual(1, restored.buy_mbl[98.5].position_of("b5"))
+
+        book.cancel("b3")
+        book.add_order(Order(orderID="b11", price=98.5, orderQty=1))
+        self.assertBookEqual(book, restored)
+
+        restored.clear()
+        self.assertIsNone(restored.get_order("b2"))
+
+    def test_journal(self):
+        book = JournaledOrderBook(symbol=self._SYMBOL,
+                                  tick_price=self._TICK_PRICE,
+                                  journal=Journal(self.journal_path))
+        self.fill_book(book)
+        book.checkpoint(self.snapshot_path)
+
+        book.cancel("b1")
+        book.amend("s2", qty=1)
+        book.submit(Order(orderID="t1", price=100.5, orderQty=5))
+        book.add_order(Order(orderID="b11", price=99.0, orderQty=3))
+        book.journal.flush()
+
+        restored = JournaledOrderBook.restore(self.snapshot_path,
+                                              self.journal_path)
+        self.assertBookEqual(book, restored)
+
+        # sequence continues after checkpoint and restart
+        restored.checkpoint(self.snapshot_path)
+        restored.cancel("b2")
+        restored.journal.close()
+
+        again = JournaledOrderBook.restore(self.snapshot_path,
+                                           self.journal_path)
+        self.assertIsNone(again.get_order("b2"))
+        self.assertIsNotNone(again.get_order("b3"))
+
+    def test_journal_levels(self):
+        book = JournaledOrderBook(symbol=self._SYMBOL,
+                                  tick_price=self._TICK_PRICE,
+                                  journal=Journal(self.journal_path))
+        book.checkpoint(self.snapshot_path)
+
+        book.load_snapshot([{"id": 1, "side": "Buy", "size": 1,
+                             "price": 100.0}])
+        for price in (100.0, 99.0, 98.0):
+            book.add_order(Order(orderID=str(price), price=price,
+                                 orderQty=1))
+
+        self.assertEqual(2, len(book.overlap_levels(98.5)[1]))
+        book.journal.close()
+
+        # snapshot clears book itself, no separate CLEAR record
+        journal = Journal(self.journal_path)
+        self.assertEqual(
+            [Journal.SNAPSHOT, Journal.ADD, Journal.ADD, Journal.ADD,
+             Journal.OVERLAP],
+            [op for _, op, _ in journal.records()])
+        journal.close()
+
+        restored = JournaledOrderBook.restore(self.snapshot_path,
+                                              self.journal_path)
+        self.assertBookEqual(book, restored)
+        self.assertEqual([(98.0, 1, 1)], restored.top_levels().bids)
+        restored.journal.close()
+
+    def test_journal_flush(self):
+        journal = Journal(self.journal_path)
+        journal.append(Journal.CANCEL, "foo")
+
+        # visible to another reader without explicit flush
+        reader = Journal(self.journal_path)
+        self.assertEqual([(1, Journal.CANCEL, "foo")],
+                         list(reader.records()))
+
+        reader.close()
+        journal.close()
+
+    def test_incomplete_journal(self):
+        journal = Journal(self.journal_path)
+        journal.append(Journal.CANCEL, "foo")
+        journal.append(Journal.CANCEL, "bar")
+        journal.close()
+
+        with open(self.journal_path, "r+b") as f:
+            f.truncate(os.path.getsize(self.journal_path) - 1)
+
+        self.assertEqual([(1, Journal.CANCEL, "foo")],
+                         list(Journal(self.journal_path).records()))
@@ -0,0 +1,204 @@
+# coding: utf-8
+import os
+import time
+import unittest
+
+from datetime import datetime
+
+from ..store import ColumnarOrderStore, ColumnarPriceLevel
+from ..structure import Order, use_epoch_timestamp
+from ..const import Direction, OrderStatus
+
+
+class ColumnarOrderStoreTest(unittest.TestCase):
+    def test_insert(self):
+        store = ColumnarOrderStore(tick_price=0.5)
+
+        row = store.insert_order(Order(orderID="1", orderQty=-10,
+                                       price=100.5))
+        view = store["1"]
+
+        self.assertEqual(row, view.row)
+        self.assertEqual(Direction.Sell, view.side)
+        self.assertEqual(100.5, view["price"])
+        self.assertEqual(201, view["priceTicks"])
+        self.assertEqual(10, view["leavesQty"])
+        self.assertEqual(OrderStatus.New, view.ordStatus)
+
+        order = view.to_order()
+        self.assertEqual("1", order.orderID)
+        self.assertEqual(Direction.Sell, order.side)
+        self.assertEqual(10, order.orderQty)
+
+        with self.assertRaisesRegex(ValueError, "already exists"):
+            store.insert_order(Order(orderID="1", orderQty=1, price=1))
+
+        with self.assertRaises(KeyError):
+            view["foo"]
+
+    def test_timestamp(self):
+        tz = os.environ.get("TZ")
+        os.environ["TZ"] = "Asia/Shanghai"
+        time.tzset()
+
+        try:
+            store = ColumnarOrderStore(tick_price=1)
+
+            store.insert_order(Order(orderID="1", orderQty=1, price=1,
+                                     timestamp="2019-05-24T17:07:16.123Z"))
+            # view reads timestamp as Order does
+            self.assertEqual(datetime(2019, 5, 24, 17, 7, 16, 123000),
+                             store["1"].timestamp)
+            self.assertEqual(store["1"].timestamp,
+                             store["1"].to_order().timestamp)
+
+            use_epoch_timestamp()
+
+            try:
+                store.insert_order(Order(
+                    orderID="2", orderQty=1, price=1,
+                    timestamp="2019-05-24T17:07:16.123Z"))
+
+                self.assertEqual(1558717636123000000, store["2"].timestamp)
+                self.assertEqual(1558717636123000000,
+                                 store["2"].to_order().timestamp)
+            finally:
+                use_epoch_timestamp(False)
+        finally:
+            if tz is None:
+                del os.environ["TZ"]
+            else:
+                os.environ["TZ"] = tz
+            time.tzset()
+
+    def test_free_list(self):
+        store = ColumnarOrderStore(tick_price=1)
+
+        for idx in range(3):
+            store.insert(str(idx), Direction.Buy, 100, 10)
+
+        row = store.release("1")
+
+        self.assertNotIn("1", store)
+        self.assertEqual(2, len(store))
+        self.assertEqual(row, store.insert("4", Direction.Sell, 101, 5))
+        self.assertEqual(3, store.capacity)
+
+        with self.assertRaisesRegex(ValueError, "not exists"):
+            store.release("1")
+
+    def test_total_leaves(self):
+        store = ColumnarOrderStore(tick_price=1)
+
+        store.insert("1", Direction.Buy, 100, 10)
+        store.insert("2", Direction.Buy, 99, 20, leaves_qty=5)
+        store.insert("3", Direction.Buy, 99, 7)
+        store.insert("4", Direction.Sell, 101, 30)
+
+        self.assertEqual(22, store.total_leaves(Direction.Buy))
+        self.assertEqual(30, store.total_leaves("Sell"))
+        self.assertEqual({100: 10, 99: 12}, store.leaves_by_price("Buy"))
+
+        store.release("1")
+        self.assertEqual(12, store.total_leaves(Direction.Buy))
+
+
+class ColumnarPriceLevelTest(unittest.TestCase):
+    def test_match(self):
+        store = ColumnarOrderStore(tick_price=1)
+        level = ColumnarPriceLevel(store, 100)
+
+        for idx in range(1, 4):
+            level.push_order(Order(orderID=str(idx), orderQty=idx * 10,
+                                   price=100))
+
+        self.assertEqual(60, level.leaves_size)
+        self.assertEqual(20, level.remove("2"))
+        self.assertEqual(2, len(level))
+
+        remained, fills = level.match_volume(25)
+
+        self.assertEqual(0, remained)
+        self.assertEqual([(store.row_of("1"), 10), (store.row_of("3"), 15)],
+                         fills)
+        self.assertEqual(OrderStatus.Filled, store["1"].ordStatus)
+        self.assertEqual(OrderStatus.PartiallyFilled, store["3"].ordStatus)
+        self.assertEqual(1, len(level))
+        self.assertEqual("3", level[0]["orderID"])
+        self.assertEqual(15, level.leaves_size)
+
+        remained, fills = level.match_volume(20)
+        self.assertEqual(5, remained)
+        self.assertEqual(0, len(level))
+
+        with self.assertRaisesRegex(ValueError, "not exists"):
+            level.remove("2")
+
+    def test_store_changes(self):
+        store = ColumnarOrderStore(tick_price=1)
+        level = ColumnarPriceLevel(store, 100)
+        other = ColumnarPriceLevel(store, 101)
+
+        for idx in range(1, 4):
+            level.push_order(Order(orderID=str(idx), orderQty=10,
+                                   price=100))
+
+        self.assertEqual(10, store.cancel("1"))
+        self.assertEqual(20, level.leaves_size)
+
+        # released row reused by order of another level
+        row = store.release("2")
+        self.assertEqual(row, other.push_order(Order(
+            orderID="4", orderQty=-10, price=101)))
+        self.assertIs(other, store.level_of(row))
+        self.assertEqual(10, level.leaves_size)
+        # canceled and released rows are skipped
+        self.assertEqual(1, len(level))
+        self.assertEqual(["3"], [view.orderID for view in level])
+        self.assertEqual("3", level[-1].orderID)
+
+        with self.assertRaisesRegex(ValueError, "not exists"):
+            level.remove("4")
+        with self.assertRaisesRegex(ValueError, "already queued"):
+            level.push(row)
+
+        remained, fills = level.match_volume(15)
+
+        self.assertEqual(5, remained)
+        self.assertEqual([(store.row_of("3"), 10)], fills)
+        self.assertEqual(0, level.leaves_size)
+        self.assertEqual(10, store["4"].leavesQty)
+        self.assertEqual(10, other.leaves_size)
+        self.assertIsNone(store.level_of(store.row_of("3")))
+
+    def test_remove(self):
+        store = ColumnarOrderStore(tick_price=1)
+        level = ColumnarPriceLevel(store, 100)
+        level.COMPACT_THRESHOLD = 4
+
+        for idx in range(20):
+            level.push_order(Order(orderID=str(idx), orderQty=1,
+                                   price=100))
+
+        for idx in range(0, 20, 2):
+            self.assertEqual(1, level.remove(str(idx)))
+
+        store.cancel("1")
+
+        self.assertEqual(9, len(level))
+        self.assertEqual(9, level.leaves_size)
+        self.assertEqual([str(idx) for idx in range(3, 20, 2)],
+                         [view.orderID for view in level])
+        self.assertEqual(1, level[1].leavesQty)
+
+        remained, fills = level.match_volume(3)
+        self.assertEqual([store.row_of(str(idx)) for idx in (3, 5, 7)],
+                         [row for row, _ in fills])
+        self.assertEqual(6, len(level))
+
+        # dead slots are compacted
+        self.assertEqual(6, len(level._rows))
+        self.assertEqual("9", level[0].orderID)
+        self.assertEqual(1, level.remove("19"))
+        self.assertEqual(["9", "11", "13", "15", "17"],
+                         [view.orderID for view in level])
@@ -4,8 +4,8 @@ import time
 
 from datetime import datetime
 
-from ..structure import Order
-from ..const import OrderType, TimeCondition, Direction
+from ..structure import Order, LazyOrder, Trade, use_epoch_timestamp
+from ..const import OrderType, TimeCondition, Direction, OrderStatus
 
 
 class OrderTest(unittest.TestCase):
@@ -39,3 +39,151 @@ class OrderTest(unittest.TestCase):
 
         with self.assertRaisesRegex(ValueError, "mis-match with order side"):
             Order(orderID="foo", orderQty=10, side="Sell")
+
+    def test_defaults(self):
+        order = Order(orderID="foo", orderQty=10)
+
+        self.assertFalse(hasattr(order, "__dict__"))
+        self.assertEqual(10, order["leavesQty"])
+        self.assertEqual(0, order["cumQty"])
+        self.assertEqual(OrderType.Limit, order.ordType)
+
+        with self.assertRaises(KeyError):
+            order["foo"]
+
+        with self.assertRaises(AttributeError):
+            order.foo = "bar"
+
+    def test_from_dict(self):
+        row = {"orderID": "foo", "side": "Sell", "orderQty": -10,
+               "leavesQty": 5, "timeInForce": "ImmediateOrCancel"}
+
+        order = Order.from_dict(row)
+
+        self.assertEqual(Direction.Sell, order.side)
+        self.assertEqual(10, order.orderQty)
+        self.assertEqual(5, order.leavesQty)
+        self.assertEqual(TimeCondition.ImmediateOrCancel, order.timeInForce)
+        self.assertEqual("foo", row["orderID"])
+
+        self.assertRaises(AttributeError, Order.from_dict, {"orderQty": 1})
+
+    def test_decode(self):
+        order = Order(orderID="foo", side=-1, ordStatus="PartiallyFilled",
+                      ordType=OrderType.Market, timeInForce=3)
+
+        self.assertIs(Direction.Sell, order.side)
+        self.assertIs(OrderStatus.PartiallyFilled, order.ordStatus)
+        self.assertIs(OrderType.Market, order.ordType)
+        self.assertIs(TimeCondition.ImmediateOrCancel, order.timeInForce)
+
+        self.assertRaises(ValueError, Order, orderID="foo", side="buy")
+        self.assertRaises(ValueError, Order, orderID="foo", ordType=0)
+
+    def test_trusted(self):
+        row = {"orderID": "foo", "side": Direction.Sell, "orderQty": -10,
+               "ordStatus": OrderStatus.New}
+
+        order = Order.from_dict(row, trusted=True)
+
+        self.assertIs(Direction.Sell, order.side)
+        self.assertEqual(10, order.orderQty)
+        self.assertEqual(10, order.leavesQty)
+
+        # mappers are skipped
+        order = Order.from_dict({"orderID": "foo", "ordType": "Market"},
+                                trusted=True)
+        self.assertEqual("Market", order.ordType)
+
+        self.assertRaises(AttributeError, Order.from_dict,
+                          {"side": Direction.Buy}, trusted=True)
+
+    def test_epoch_timestamp(self):
+        use_epoch_timestamp()
+
+        try:
+            order = Order(orderID="foo",
+                          transactTime="2019-05-24T17:07:16.123Z")
+            trade = Trade(symbol="XBTUSD", timestamp=1558717636123)
+
+            self.assertEqual(1558717636123000000, order.transactTime)
+            self.assertEqual(1558717636123000000, trade.timestamp)
+        finally:
+            use_epoch_timestamp(False)
+
+        self.assertIsInstance(
+            Order(orderID="foo", timestamp=1558717636123).timestamp,
+            datetime)
+
+    def test_lazy(self):
+        row = {"orderID": "foo", "side": "Sell", "orderQty": -10,
+               "price": 100.5, "ordType": "Market",
+               "transactTime": "2019-05-24T17:07:16.123Z",
+               "timestamp": "foo"}
+
+        order = Order.lazy(row)
+
+        self.assertIsInstance(order, LazyOrder)
+        self.assertIs(Direction.Sell, order.side)
+        self.assertEqual(10, order["orderQty"])
+        self.assertEqual(10, order["leavesQty"])
+        self.assertEqual(100.5, order.price)
+        self.assertEqual(0, order.cumQty)
+        self.assertIs(OrderType.Market, order.ordType)
+        self.assertEqual(datetime(2019, 5, 24, 17, 7, 16, 123000),
+                         order.transactTime)
+
+        # decode error raised on first access
+        with self.assertRaises(ValueError):
+            order.timestamp
+
+        with self.assertRaisesRegex(ValueError, "mis-match with order side"):
+            Order.lazy({"orderID": "foo", "orderQty": 10, "side": "Sell"})
+
+        self.assertRaises(AttributeError, Order.lazy, {"orderQty": 10})
+        self.assertRaises((TypeError, AttributeError), Order.lazy,
+                          {"orderID": "foo", "bar": 1})
+
+    def test_lazy_resolve(self):
+        row = {"orderID": "foo", "orderQty": 10, "leavesQty": 5,
+               "ordStatus": "PartiallyFilled"}
+
+        order = Order.lazy(row).resolve()
+        row["ordStatus"] = "Filled"
+
+        self.assertEqual(Direction.Buy, order.side)
+        self.assertEqual(5, order.leavesQty)
+        self.assertIs(OrderStatus.PartiallyFilled, order.ordStatus)
+        self.assertEqual(Order(**row)["orderQty"], order["orderQty"])
+
+    def test_bytes(self):
+        order = Order(orderID="foo", side="Sell", orderQty=-10,
+                      price=100.5, ordType="Market", leavesQty=4,
+                      timeInForce="FillOrKill",
+                      transactTime="2019-05-24T17:07:16.123Z")
+
+        for tick_price in (None, 0.5):
+            restored = Order.from_bytes(order.to_bytes(tick_price))
+
+            for column in ("orderID", "side", "orderQty", "price",
+                           "ordType", "leavesQty", "timeInForce",
+                           "transactTime", "timestamp"):
+                self.assertEqual(order[column], restored[column])
+
+            self.assertIs(OrderType.Market, restored.ordType)
+
+        self.assertIsInstance(order.to_bytes(0.5), bytes)
+        self.assertLess(len(order.to_bytes(0.5)), 100)
+
+        self.assertRaisesRegex(ValueError, "schema version",
+                               Order.from_bytes, b"\x93\x00\xc0\x00")
+
+        trade = Trade(symbol="XBTUSD", side="Buy", size=10, price=100.5,
+                      timestamp="2019-05-24T17:07:16.123Z")
+        restored = Trade.from_bytes(trade.to_bytes(0.5))
+
+        self.assertEqual(trade.timestamp, restored.timestamp)
+        self.assertEqual(100.5, restored.price)
+        self.assertIs(Direction.Buy, restored.side)
+
+        self.assertRaises(ValueError, Trade.from_bytes, order.to_bytes())
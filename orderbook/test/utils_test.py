@@ -2,7 +2,11 @@
 
 import unittest
 
-from ..utils import normalize_price
+from datetime import datetime
+
+from ..utils import (normalize_price, price_to_ticks, ticks_to_price,
+                     PriceNormalizer, make_datetime, make_epoch_ns,
+                     TIMESTAMP_FORMAT)
 
 
 class UtilsTests(unittest.TestCase):
@@ -12,3 +16,57 @@ class UtilsTests(unittest.TestCase):
         self.assertEqual(
             normalize_price(15.486765123653, 0.00000000001),
             15.48676512365)
+
+    def test_ticks(self):
+        self.assertEqual(price_to_ticks(15.486, 0.01), 1549)
+        self.assertEqual(ticks_to_price(1549, 0.01), 15.49)
+
+        for price, tick_price in ((15.486765123653, 0.00000000001),
+                                  (90402.350529, 0.00000000001),
+                                  (9.9996, 0.001), (256.3, 0.5)):
+            self.assertEqual(
+                normalize_price(price, tick_price),
+                ticks_to_price(price_to_ticks(price, tick_price),
+                               tick_price))
+
+    def test_normalizer(self):
+        normalizer = PriceNormalizer(0.01, cache_size=2)
+
+        self.assertEqual(2, normalizer.precision)
+        self.assertEqual(15.49, normalizer(15.486))
+        self.assertEqual(15.49, normalizer.normalize(15.486))
+        self.assertEqual(1549, normalizer.ticks(15.486))
+        self.assertEqual(15.49, normalizer.price(1549))
+
+        for price in (1.001, 2.002, 3.003, 15.486):
+            self.assertEqual(normalize_price(price, 0.01), normalizer(price))
+
+        self.assertEqual(2, normalizer.normalize.cache_info().currsize)
+
+        normalizer.cache_clear()
+        self.assertEqual(0, normalizer.normalize.cache_info().currsize)
+
+    def test_make_datetime(self):
+        for value in ("2019-05-24T17:07:16.123Z", "2019-05-24T17:07:16.1Z",
+                      "2019-05-24T17:07:16.123456Z",
+                      "2019-12-31T23:59:59.999Z"):
+            self.assertEqual(datetime.strptime(value, TIMESTAMP_FORMAT),
+                             make_datetime(value))
+
+        self.assertEqual(datetime(2019, 5, 24, 17, 7, 16, 123000),
+                         make_datetime(1558717636123))
+
+        for value in ("2019-05-24T17:07:16Z", "2019-05-24 17:07:16.123Z",
+                      "2019-05-24T17:07:16.1234567Z", "foo", None):
+            self.assertRaises(ValueError, make_datetime, value)
+
+    def test_make_epoch_ns(self):
+        expected = 1558717636123000000
+
+        self.assertEqual(expected, make_epoch_ns("2019-05-24T17:07:16.123Z"))
+        self.assertEqual(expected, make_epoch_ns(1558717636123))
+        self.assertEqual(expected, make_epoch_ns(1558717636123.0))
+        self.assertEqual(expected, make_epoch_ns(
+            datetime(2019, 5, 24, 17, 7, 16, 123000)))
+
+        self.assertRaises(ValueError, make_epoch_ns, "2019-05-24")
@@ -1,45 +1,246 @@
 # coding: utf-8
-from decimal import Decimal, Context
-from datetime import datetime
+import logging
+
+from decimal import Decimal
+from datetime import datetime, timedelta
+from functools import lru_cache
 
 from orderbook import logger
 
 
+def price_precision(tick_price: float) -> int:
+    """
+    Get decimal places of tick price
+    :param tick_price: tick price
+    :return: decimal places count
+    """
+
+    # 超过6位小数，float -> str 将使用科学计数法
+    prec_str = str(tick_price).rstrip("0")
+    if "." in prec_str:
+        return len(prec_str.split(".")[-1])
+
+    return abs(int(prec_str.split("e")[-1]))
+
+
+class PriceNormalizer(object):
+    """
+    Price normalizer bound to one tick price.
+    Tick precision is parsed once on creation, and results are kept in
+    LRU caches bounded by cache_size, as a book sees a small set of
+    distinct prices repeatedly.
+    """
+
+    DEFAULT_CACHE_SIZE = 1 << 16
+
+    _FLOAT_EXACT_TICKS = 10 ** 15
+
+    def __init__(self, tick_price: float,
+                 cache_size: int = DEFAULT_CACHE_SIZE):
+        self._tick_price = tick_price
+        self._decimal_tick = Decimal(tick_price)
+        self._precision = price_precision(tick_price)
+
+        self.normalize = lru_cache(maxsize=cache_size)(self._normalize)
+        self.ticks = lru_cache(maxsize=cache_size)(self._ticks)
+        self.price = lru_cache(maxsize=cache_size)(self._price)
+
+    @property
+    def tick_price(self) -> float:
+        return self._tick_price
+
+    @property
+    def precision(self) -> int:
+        return self._precision
+
+    def _ticks(self, price: float) -> int:
+        # float quotient rounds the same as Decimal unless it lies
+        # within float error of a half tick
+        quotient = price / self._tick_price
+        ticks = round(quotient)
+
+        if 0.5 - abs(quotient - ticks) > abs(quotient) * 1e-12:
+            return ticks
+
+        return int(round(Decimal(price) / self._decimal_tick))
+
+    def _price(self, ticks: int) -> float:
+        # float product is exact enough to round correctly
+        # while it has no more than 15 significant digits
+        if -self._FLOAT_EXACT_TICKS < ticks < self._FLOAT_EXACT_TICKS:
+            return round(ticks * self._tick_price, self._precision)
+
+        return float(round(Decimal(ticks) * self._decimal_tick,
+                           self._precision))
+
+    def _normalize(self, price: float) -> float:
+        converted = self._price(self._ticks(price))
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "normalize price: origin[%s], tick_price[%s], "
+                "normalized[%s].", price, self._tick_price, converted)
+
+        return converted
+
+    def cache_clear(self):
+        self.normalize.cache_clear()
+        self.ticks.cache_clear()
+        self.price.cache_clear()
+
+    def __call__(self, price: float) -> float:
+        return self.normalize(price)
+
+
+_normalizers = dict()
+
+
+def get_normalizer(tick_price: float) -> PriceNormalizer:
+    """
+    Get shared normalizer for tick price, create it if not exists
+    :param tick_price: tick price
+    :return: price normalizer
+    """
+
+    try:
+        return _normalizers[tick_price]
+    except KeyError:
+        return _normalizers.setdefault(tick_price,
+                                       PriceNormalizer(tick_price))
+
+
 # noinspection SpellCheckingInspection
 def normalize_price(price: float, tick_price: float) -> float:
-    decimal_origin = Decimal(price)
+    return get_normalizer(tick_price).normalize(price)
 
-    decimal_tick = Decimal(tick_price)
 
-    # 获取 price 整数位数
-    int_len = len("{:f}".format(price).split(".")[0])
+def price_to_ticks(price: float, tick_price: float) -> int:
+    """
+    Convert price to integer tick count, rounding as normalize_price does
+    :param price: origin price
+    :param tick_price: tick price
+    :return: tick count
+    """
 
-    # 获取 tick_price 小数位数
-    # 超过6位小数，float -> str 将使用科学计数法
-    prec_str = str(tick_price).rstrip("0")
-    if "." in prec_str:
-        prec_len = len(prec_str.split(".")[-1])
+    return get_normalizer(tick_price).ticks(price)
+
+
+def ticks_to_price(ticks: int, tick_price: float) -> float:
+    """
+    Convert integer tick count back to float price
+    :param ticks: tick count
+    :param tick_price: tick price
+    :return: price, equal to normalize_price's output for the same level
+    """
+
+    return get_normalizer(tick_price).price(ticks)
+
+
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+
+_EPOCH = datetime(1970, 1, 1)
+_SECOND = timedelta(seconds=1)
+
+# microseconds scale of fraction part by its digits count
+_FRACTION_SCALE = (0, 100000, 10000, 1000, 100, 10, 1)
+
+
+@lru_cache(maxsize=4096)
+def _parse_seconds(prefix: str) -> tuple:
+    """
+    Parse seconds prefix of timestamp, feed timestamps share the same
+    prefix within one second, so results are cached.
+    :param prefix: e.g. 2019-05-24T17:07:16
+    :return: (year, month, day, hour, minute, second)
+    """
+    # fromisoformat is much faster than strptime, but also accepts other
+    # layouts, so separators are checked first
+    if (prefix[4] == prefix[7] == "-" and prefix[10] == "T" and
+            prefix[13] == prefix[16] == ":"):
+        ts = datetime.fromisoformat(prefix)
     else:
-        prec_len = abs(int(prec_str.split("e")[-1]))
+        ts = datetime.strptime(prefix, "%Y-%m-%dT%H:%M:%S")
+
+    return ts.timetuple()[:6]
+
 
-    ticks = round(decimal_origin / decimal_tick)
+@lru_cache(maxsize=4096)
+def _parse_epoch_seconds(prefix: str) -> int:
+    return (datetime(*_parse_seconds(prefix)) - _EPOCH) // _SECOND
 
-    normalized = ticks * Decimal(tick_price)
 
-    converted = float(normalized.normalize(Context(prec=int_len+prec_len)))
+def _microseconds(value: str) -> int:
+    """
+    Get microseconds of timestamp in TIMESTAMP_FORMAT
+    :param value: timestamp string, e.g. 2019-05-24T17:07:16.123Z
+    :return: microseconds, -1 if value is not in TIMESTAMP_FORMAT
+    """
+    if len(value) > 20 and value[19] == "." and value[-1] == "Z":
+        fraction = value[20:-1]
 
-    logger.debug(
-        "normalize price: origin[{}], tick_price[{}], normalized[{}].".format(
-            price, tick_price, converted))
+        if len(fraction) <= 6 and fraction.isdigit():
+            return int(fraction) * _FRACTION_SCALE[len(fraction)]
 
-    return converted
+    return -1
 
 
 def make_datetime(value) -> datetime:
+    """
+    Create naive UTC datetime from epoch milliseconds or timestamp string
+    :param value: epoch ms or string in TIMESTAMP_FORMAT
+    :return: datetime
+    :raise ValueError
+    """
+    if isinstance(value, str):
+        microsecond = _microseconds(value)
+
+        if microsecond < 0:
+            return datetime.strptime(value, TIMESTAMP_FORMAT)
+
+        return datetime(*_parse_seconds(value[:19]), microsecond)
+
     if isinstance(value, (int, float)):
         return datetime.utcfromtimestamp(value / 1000)
 
+    raise ValueError("invalid timestamp: {}".format(value))
+
+
+def make_epoch_ns(value) -> int:
+    """
+    Create integer epoch nanoseconds, skipping datetime creation
+    :param value: epoch ms, timestamp string in TIMESTAMP_FORMAT or naive
+    UTC datetime
+    :return: epoch ns
+    :raise ValueError
+    """
     if isinstance(value, str):
-        return datetime.strptime(value, "%Y-%m-%dT%H:%M:%S.%fZ")
+        microsecond = _microseconds(value)
+
+        if microsecond < 0:
+            return make_epoch_ns(datetime.strptime(value, TIMESTAMP_FORMAT))
+
+        return (_parse_epoch_seconds(value[:19]) * 1000000000 +
+                microsecond * 1000)
+
+    if isinstance(value, datetime):
+        delta = value - _EPOCH
+
+        return ((delta.days * 86400 + delta.seconds) * 1000000000 +
+                delta.microseconds * 1000)
+
+    if isinstance(value, int):
+        return value * 1000000
+
+    if isinstance(value, float):
+        return round(value * 1000) * 1000
 
     raise ValueError("invalid timestamp: {}".format(value))
+
+
+def epoch_ns_to_datetime(value: int) -> datetime:
+    """
+    Create naive UTC datetime from epoch nanoseconds
+    :param value: epoch ns
+    :return: datetime
+    """
+    return _EPOCH + timedelta(microseconds=value // 1000)
@@ -0,0 +1,171 @@
+# coding: utf-8
+
+import asyncio
+import json
+import unittest
+
+from clients.nge_async_websocket import AsyncNGEWebsocket
+
+
+class MemoryConnection(object):
+    """
+    In memory websocket connection, frames are fed by test.
+    """
+
+    def __init__(self):
+        self.frames = asyncio.Queue()
+        self.sent = list()
+
+    def feed(self, **message):
+        self.frames.put_nowait(json.dumps(message))
+
+    async def send(self, frame):
+        self.sent.append(json.loads(frame))
+
+    async def close(self):
+        self.frames.put_nowait(None)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        frame = await self.frames.get()
+
+        if frame is None:
+            raise StopAsyncIteration
+
+        return frame
+
+
+def l2_row(idx, side="Buy", size=10):
+    return {"symbol": "XBTUSD", "id": idx, "side": side, "size": size,
+            "price": 100.0 - idx}
+
+
+class AsyncWebsocketTests(unittest.TestCase):
+    def test_tables(self):
+        async def run():
+            conn = MemoryConnection()
+            ws = AsyncNGEWebsocket("https://localhost/api/v1", "XBTUSD")
+
+            await ws.connect(conn)
+
+            self.assertEqual("subscribe", conn.sent[0]["op"])
+            self.assertIn("orderBookL2:XBTUSD", conn.sent[0]["args"])
+
+            conn.feed(subscribe="orderBookL2:XBTUSD", success=True)
+            conn.feed(table="orderBookL2", action="partial",
+                      keys=["symbol", "id", "side"],
+                      data=[l2_row(idx) for idx in range(3)])
+            conn.feed(table="orderBookL2", action="update",
+                      data=[l2_row(1, size=20)])
+
+            await ws.wait_for_partial("orderBookL2", timeout=1)
+            await ws.close()
+
+            self.assertTrue(ws.exited)
+            self.assertEqual([10, 20, 10],
+                             [row["size"] for row in ws.market_depth()])
+            self.assertEqual([(100.0, 10, 1), (99.0, 20, 1)],
+                             ws.order_book().top_levels(2).bids)
+
+            with self.assertRaises(asyncio.TimeoutError):
+                await ws.wait_for_partial("trade", timeout=0.01)
+
+        asyncio.run(run())
+
+    def test_subscribe_symbol(self):
+        async def run():
+            conn = MemoryConnection()
+            ws = AsyncNGEWebsocket("https://localhost/api/v1")
+
+            await ws.connect(conn)
+            await ws.subscribe_symbol("ETHUSD", ("orderBookL2", "trade"))
+
+            self.assertEqual({"op": "subscribe",
+                              "args": ["orderBookL2:ETHUSD", "trade:ETHUSD"]},
+                             conn.sent[0])
+
+            conn.feed(table="orderBookL2", action="partial",
+                      keys=["symbol", "id", "side"],
+                      data=[l2_row(idx) for idx in range(2)])
+            await ws.wait_for_partial("orderBookL2", symbol="XBTUSD",
+                                      timeout=1)
+
+            # partial of another symbol does not count
+            with self.assertRaises(asyncio.TimeoutError):
+                await ws.wait_for_partial("orderBookL2", symbol="ETHUSD",
+                                          timeout=0.01)
+
+            conn.feed(table="orderBookL2", action="partial",
+                      keys=["symbol", "id", "side"],
+                      filter={"symbol": "ETHUSD"},
+                      data=[dict(l2_row(idx), symbol="ETHUSD")
+                            for idx in range(2)])
+            await ws.wait_for_partial("orderBookL2", symbol="ETHUSD",
+                                      timeout=1)
+
+            self.assertEqual(2, len(ws.market_depth("ETHUSD")))
+
+            await ws.unsubscribe_symbol("ETHUSD", ("orderBookL2", "trade"))
+
+            with self.assertRaises(asyncio.TimeoutError):
+                await ws.wait_for_partial("orderBookL2", symbol="ETHUSD",
+                                          timeout=0.01)
+
+            # task waiting across unsubscribe is released by partial after
+            # resubscribe
+            waiting = asyncio.ensure_future(ws.wait_for_partial(
+                "orderBookL2", symbol="ETHUSD", timeout=1))
+            await asyncio.sleep(0)
+            await ws.unsubscribe_symbol("ETHUSD", ("orderBookL2",))
+            await ws.subscribe_symbol("ETHUSD", ("orderBookL2",))
+            conn.feed(table="orderBookL2", action="partial",
+                      keys=["symbol", "id", "side"],
+                      filter={"symbol": "ETHUSD"},
+                      data=[dict(l2_row(idx), symbol="ETHUSD")
+                            for idx in range(2)])
+            await waiting
+
+            await ws.unsubscribe_symbol("ETHUSD", ("orderBookL2", "trade"))
+            await ws.close()
+
+            self.assertEqual("unsubscribe", conn.sent[1]["op"])
+            self.assertEqual({"XBTUSD"}, ws.symbols)
+            self.assertIsNone(ws.order_book("ETHUSD"))
+
+        asyncio.run(run())
+
+    def test_updates(self):
+        async def run():
+            conn = MemoryConnection()
+            ws = AsyncNGEWebsocket("https://localhost/api/v1", queue_size=2)
+
+            await ws.connect(conn)
+            self.assertEqual([], conn.sent)
+
+            conn.feed(table="trade", action="partial", keys=[], data=[])
+            for idx in range(5):
+                conn.feed(table="trade", action="insert",
+                          data=[{"price": idx}])
+
+            consumed = list()
+
+            async for table, action, rows in ws.updates():
+                consumed.append((table, action, rows))
+
+                if action == "partial":
+                    # reader waits for consumer: one item dequeued, two
+                    # queued and the one blocked on put applied
+                    await asyncio.sleep(0.01)
+                    self.assertEqual(3, len(ws.recent_trades()))
+
+                if len(consumed) == 4:
+                    await ws.close()
+
+            self.assertEqual(("trade", "partial", []), consumed[0])
+            # items queued before close are still delivered
+            self.assertEqual([[{"price": idx}] for idx in range(4)],
+                             [rows for _, _, rows in consumed[1:]])
+
+        asyncio.run(run())
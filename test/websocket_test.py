@@ -0,0 +1,219 @@
+# coding: utf-8
+
+import json
+import logging
+import unittest
+
+from unittest import mock
+
+from clients import nge_websocket
+from clients.nge_websocket import NGEWebsocket, KeyedTable, json_decoder
+from orderbook.feed import L2BookFeed
+
+
+class WebsocketTableTests(unittest.TestCase):
+    def setUp(self):
+        # handlers only, without connecting
+        self.ws = NGEWebsocket.__new__(NGEWebsocket)
+        self.ws.logger = logging.getLogger(__name__)
+        self.ws.symbol = "XBTUSD"
+        self.ws.init_tables()
+        self.ws.l2_feed = None
+
+    def test_keyed_table(self):
+        table = KeyedTable(["symbol", "id"], [
+            {"symbol": "XBTUSD", "id": idx, "size": idx} for idx in range(5)])
+
+        self.assertEqual(5, len(table))
+        self.assertEqual(0, table[0]["id"])
+        self.assertEqual(4, table[-1]["id"])
+        self.assertEqual(3, table[-2]["id"])
+        self.assertEqual([1, 2], [row["id"] for row in table[1:3]])
+        self.assertEqual([4, 3, 2, 1, 0], [row["id"] for row in
+                                           reversed(table)])
+        self.assertRaises(IndexError, table.__getitem__, 5)
+
+        self.assertEqual(10, table.update(
+            {"symbol": "XBTUSD", "id": 2, "size": 10})["size"])
+        self.assertIsNone(table.update({"symbol": "ETHUSD", "id": 2}))
+
+        table.trim(2)
+        self.assertEqual([3, 4], [row["id"] for row in table])
+
+        # iteration reads a snapshot, table may change meanwhile
+        for row in table:
+            table.remove(row)
+            table.extend([{"symbol": "ETHUSD", "id": row["id"]}])
+        self.assertEqual(["ETHUSD", "ETHUSD"],
+                         [row["symbol"] for row in table])
+
+        trades = KeyedTable()
+        trades.extend([{"price": 1}, {"price": 1}])
+        self.assertEqual(2, len(trades))
+        self.assertIsNone(trades.remove({"price": 1}))
+
+    def test_order_book(self):
+        ws = self.ws
+
+        ws.partial_handler("orderBookL2", {
+            "table": "orderBookL2", "action": "partial",
+            "keys": ["symbol", "id", "side"],
+            "data": [{"symbol": "XBTUSD", "id": idx, "side": "Buy",
+                      "size": 10, "price": 100 - idx} for idx in range(3)]})
+
+        ws.insert_handler("orderBookL2", {"data": [
+            {"symbol": "XBTUSD", "id": 3, "side": "Sell", "size": 5,
+             "price": 101}]})
+        ws.update_handler("orderBookL2", {"data": [
+            {"symbol": "XBTUSD", "id": 9, "side": "Buy", "size": 1},
+            {"symbol": "XBTUSD", "id": 1, "side": "Buy", "size": 20}]})
+        ws.delete_handler("orderBookL2", {"data": [
+            {"symbol": "XBTUSD", "id": 0, "side": "Buy"}]})
+
+        self.assertEqual([(1, 20), (2, 10), (3, 5)],
+                         [(row["id"], row["size"])
+                          for row in ws.market_depth()])
+
+    def test_order(self):
+        ws = self.ws
+
+        ws.partial_handler("order", {
+            "keys": ["orderID"],
+            "data": [{"orderID": "1", "clOrdID": "mm_1", "leavesQty": 5},
+                     {"orderID": "2", "clOrdID": "mm_2", "leavesQty": 5}]})
+
+        ws.update_handler("order", {"data": [
+            {"orderID": "1", "leavesQty": 0}]})
+
+        self.assertEqual(["2"], [o["orderID"] for o in
+                                 ws.open_orders("mm_")])
+
+    def test_trade(self):
+        ws = self.ws
+
+        ws.partial_handler("trade", {"keys": [], "data": [{"price": 1}]})
+
+        for idx in range(NGEWebsocket.MAX_TABLE_LEN):
+            ws.insert_handler("trade", {"data": [{"price": idx}]})
+
+        trades = ws.recent_trades()
+        self.assertEqual(NGEWebsocket.MAX_TABLE_LEN // 2, len(trades))
+        self.assertEqual(NGEWebsocket.MAX_TABLE_LEN - 1, trades[-1]["price"])
+
+    def test_order_book_feed(self):
+        ws = self.ws
+        self.assertIsNone(ws.order_book())
+        self.assertIsNone(ws.top_levels())
+
+        ws.l2_feed = L2BookFeed(tick_price=0.5)
+
+        ws.partial_handler("orderBookL2", {
+            "keys": ["symbol", "id", "side"],
+            "data": [{"symbol": "XBTUSD", "id": idx, "side": "Buy",
+                      "size": 10, "price": 100 - idx} for idx in range(3)]})
+        ws.insert_handler("orderBookL2", {"data": [
+            {"symbol": "XBTUSD", "id": 3, "side": "Sell", "size": 5,
+             "price": 101}]})
+        ws.update_handler("orderBookL2", {"data": [
+            {"symbol": "XBTUSD", "id": 1, "side": "Buy", "size": 20}]})
+        ws.delete_handler("orderBookL2", {"data": [
+            {"symbol": "XBTUSD", "id": 0, "side": "Buy"}]})
+
+        self.assertEqual(([(99, 20, 1), (98, 10, 1)], [(101, 5, 1)]),
+                         ws.order_book().top_levels())
+        self.assertEqual(([(99, 20, 1)], [(101, 5, 1)]), ws.top_levels(n=1))
+
+    def test_order_book_tick_size(self):
+        ws = self.ws
+        ws.init_tables()
+
+        ws.partial_handler("instrument", {
+            "keys": ["symbol"], "data": [{"symbol": "XBTUSD", "tickSize": 1}]})
+        ws.partial_handler("orderBookL2", {
+            "keys": ["symbol", "id", "side"], "filter": {"symbol": "XBTUSD"},
+            "data": [{"symbol": "XBTUSD", "id": 1, "side": "Buy", "size": 1,
+                      "price": 100}]})
+
+        self.assertEqual(1.0, ws.order_book().tick_price)
+        self.assertEqual([(100.0, 1, 1)], ws.order_book().top_levels().bids)
+
+        # empty partial on resubscribe clears the book
+        ws.partial_handler("orderBookL2", {
+            "keys": ["symbol", "id", "side"], "filter": {"symbol": "XBTUSD"},
+            "data": []})
+
+        self.assertEqual(0, len(ws.market_depth()))
+        self.assertEqual(([], []), ws.order_book().top_levels())
+
+        # feed errors never block table updates
+        with self.assertLogs(ws.logger, logging.ERROR):
+            ws.insert_handler("orderBookL2", {"data": [
+                {"symbol": "XBTUSD", "id": 2, "side": "Foo", "size": 1,
+                 "price": 100}]})
+
+        self.assertEqual(1, len(ws.market_depth()))
+
+    def test_symbols(self):
+        ws = self.ws
+        ws.l2_feed = L2BookFeed(tick_price=0.5)
+
+        ws.partial_handler("orderBookL2", {
+            "keys": ["symbol", "id", "side"],
+            "data": [{"symbol": symbol, "id": idx, "side": "Buy",
+                      "size": 10, "price": 100 - idx}
+                     for symbol in ("XBTUSD", "ETHUSD") for idx in range(2)]})
+        ws.partial_handler("trade", {
+            "keys": [], "filter": {"symbol": "ETHUSD"}, "data": []})
+        ws.partial_handler("margin", {
+            "keys": ["account"], "data": [{"account": 1, "amount": 5}]})
+
+        ws.insert_handler("trade", {"data": [
+            {"symbol": "ETHUSD", "price": 1}, {"symbol": "XBTUSD",
+                                               "price": 2}]})
+        ws.update_handler("orderBookL2", {"data": [
+            {"symbol": "ETHUSD", "id": 1, "side": "Buy", "size": 20}]})
+
+        self.assertEqual({"XBTUSD", "ETHUSD"}, ws.symbols)
+        # primary symbol tables are kept in data as well
+        self.assertEqual([10, 10], [row["size"] for row in
+                                    ws.market_depth()])
+        self.assertEqual([10, 20], [row["size"] for row in
+                                    ws.market_depth("ETHUSD")])
+        self.assertEqual([1], [row["price"] for row in
+                               ws.recent_trades("ETHUSD")])
+        self.assertEqual([2], [row["price"] for row in ws.recent_trades()])
+        # tables without symbol are not copied per symbol
+        self.assertEqual(5, ws.data["margin"][0]["amount"])
+        self.assertNotIn("margin", ws.symbol_data["ETHUSD"])
+        self.assertEqual([(100, 10, 1), (99, 20, 1)],
+                         ws.order_book("ETHUSD").top_levels().bids)
+
+        ws.drop_symbol("ETHUSD")
+
+        self.assertEqual({"XBTUSD"}, ws.symbols)
+        self.assertEqual(0, len(ws.market_depth("ETHUSD")))
+        self.assertIsNone(ws.order_book("ETHUSD"))
+        self.assertEqual(2, len(ws.market_depth()))
+
+    def test_handle_message(self):
+        ws = self.ws
+
+        frames = [
+            {"subscribe": "trade:XBTUSD", "success": True},
+            {"table": "trade", "action": "partial", "keys": [], "data": []},
+            {"table": "trade", "action": "insert", "data": [{"price": 1}]},
+            {"table": "trade", "action": "unknown", "data": []}]
+
+        self.assertEqual([None, "partial", "insert", None],
+                         [ws.handle_message(ws.decode(json.dumps(frame)))
+                          for frame in frames])
+        self.assertEqual([{"price": 1}], list(ws.recent_trades()))
+
+    def test_json_decoder(self):
+        with mock.patch.object(nge_websocket, "orjson", None):
+            with mock.patch.object(nge_websocket, "simplejson", None):
+                self.assertIs(json.loads, json_decoder())
+
+        self.assertEqual({"a": [1.5]}, json_decoder()('{"a": [1.5]}'))
+        self.assertEqual({"a": 1}, json_decoder()(b'{"a": 1}'))
+        self.assertRaises(ValueError, json_decoder(), "{")
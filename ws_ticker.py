@@ -1,26 +1,21 @@
 # coding: utf-8
 
-import arrow
-
 # noinspection PyUnresolvedReferences
 from os import environ
-from time import time, mktime, sleep
+from time import time, sleep
 from datetime import datetime
 from collections import defaultdict, Counter
 from threading import Thread
 
 from clients.nge_websocket import NGEWebsocket
+from orderbook.utils import make_epoch_ns
 
 
 def convert_timestamp(value):
     if isinstance(value, int):
         return value
 
-    # ts = datetime.strptime(value, "%Y-%m-%dT%H:%M:%S.%fZ")
-    ts = arrow.get(value)
-
-    # return mktime(ts.timetuple()) * 1000
-    return ts.float_timestamp * 1000
+    return make_epoch_ns(value) / 1000000
 
 
 class MarketTicker(NGEWebsocket):